@@ -0,0 +1,298 @@
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from functools import lru_cache
+from storage import get_storage, STORAGE_ERRORS
+
+# Retention for the tables that only ever grow. Rows older than a table's retention are moved,
+# a whole calendar month at a time, into gzip-compressed JSON Lines files:
+#
+#   archive/index.json                       archived months with row counts and id ranges
+#   archive/chat_log-2024-03.jsonl.gz        one month of one table, one JSON object per row
+#
+# The hot tables keep only recent rows, so inserts, index maintenance and backups stay cheap.
+# Readers that want older rows ask for them explicitly:
+#
+#     get_chat_history(before_id, limit)     # hot rows first, then the archive, same paging
+#     ArchiveStore().read('exercise_feedback', since=date(2024, 1, 1))
+#
+# MySQL partitioning was not an option: InnoDB cannot partition tables with foreign keys or
+# FULLTEXT indexes, and chat_log has both.
+
+ARCHIVE_DIR = "archive"
+ARCHIVE_INTERVAL = 6 * 3600  # Seconds between archive runs while the app is open
+ARCHIVE_START_DELAY = 120.0  # Seconds after startup before the first run, so it does not compete with it
+
+
+class ArchivedTable:
+    def __init__(self, name, database, time_column, columns, retention_days, datetime_column=False):
+        self.name = name
+        self.database = database
+        self.time_column = time_column
+        self.columns = columns
+        self.retention_days = retention_days
+        self.datetime_column = datetime_column  # DATETIME rather than DATE
+
+    def bound(self, day):
+        # Month boundaries compared against the time column; DATETIME text must not be compared to a bare date
+        return datetime.combine(day, time.min) if self.datetime_column else day
+
+    def decode(self, record):
+        value = record.get(self.time_column)
+        if value is not None:
+            record[self.time_column] = datetime.fromisoformat(value) if self.datetime_column else date.fromisoformat(value)
+        return record
+
+
+ARCHIVE_TABLES = {
+    'chat_log': ArchivedTable('chat_log', 'workout_assistant', 'timestamp',
+                              ('id', 'session_id', 'timestamp', 'sender', 'message'),
+                              retention_days=int(os.environ.get('WORKOUT_CHAT_RETENTION_DAYS', 180)),
+                              datetime_column=True),
+    'exercise_feedback': ArchivedTable('exercise_feedback', 'exercise_tracker', 'feedback_date',
+                                       ('id', 'user_id', 'exercise_name', 'reps_completed', 'mistakes', 'score',
+                                        'feedback_date'),
+                                       retention_days=int(os.environ.get('WORKOUT_FEEDBACK_RETENTION_DAYS', 365))),
+}
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat(' ') if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode()
+    raise TypeError(f"Cannot archive value of type {type(value).__name__}")
+
+
+@lru_cache(maxsize=8)
+def _load_month_file(path, mtime):
+    # Decoded rows of one archive file, cached while the file is unchanged; paging through
+    # history reads the same month several times
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return tuple(json.loads(line) for line in f)
+
+
+class ArchiveStore:
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self._lock = threading.Lock()  # Serializes index updates within the process
+
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return {'months': []}
+        with open(self.index_path, 'r') as f:
+            return json.load(f)
+
+    def _save_index(self, index):
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(temp_path, self.index_path)
+
+    def months(self, table):
+        # Index entries for one table, oldest month first
+        return sorted((entry for entry in self.load_index()['months'] if entry['table'] == table),
+                      key=lambda entry: entry['month'])
+
+    def _read_file(self, name):
+        path = os.path.join(self.directory, name)
+        return [dict(record) for record in _load_month_file(path, os.path.getmtime(path))]
+
+    def write_month(self, table, month, rows):
+        # Merges rows into the month's file by id, so re-archiving a month after an interrupted
+        # run never duplicates rows. The file is complete on disk before the index points at it.
+        columns = ARCHIVE_TABLES[table].columns
+        name = f"{table}-{month:%Y-%m}.jsonl.gz"
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            index = self.load_index()
+            existing = [entry for entry in index['months'] if entry['file'] == name]
+            records = {record['id']: record for record in self._read_file(name)} if existing else {}
+            for row in rows:
+                records[row[0]] = json.loads(json.dumps(dict(zip(columns, row)), default=_json_value))
+
+            temp_path = os.path.join(self.directory, f"{name}.tmp")
+            with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+                for record_id in sorted(records):
+                    f.write(json.dumps(records[record_id], ensure_ascii=False) + '\n')
+            os.replace(temp_path, os.path.join(self.directory, name))
+
+            index['months'] = [entry for entry in index['months'] if entry['file'] != name] + [{
+                'table': table,
+                'month': f"{month:%Y-%m}",
+                'file': name,
+                'rows': len(records),
+                'min_id': min(records),
+                'max_id': max(records),
+            }]
+            self._save_index(index)
+
+    def read(self, table, since=None, until=None):
+        # Archived rows as dicts, oldest first, optionally limited to [since, until) by the time column
+        archived = ARCHIVE_TABLES[table]
+        rows = []
+        for entry in self.months(table):
+            month = date.fromisoformat(f"{entry['month']}-01")
+            if since is not None and next_month(month) <= since:
+                continue
+            if until is not None and month >= until:
+                continue
+            for record in self._read_file(entry['file']):
+                record = archived.decode(record)
+                value = record[archived.time_column]
+                if since is not None and value < archived.bound(since):
+                    continue
+                if until is not None and value >= archived.bound(until):
+                    continue
+                rows.append(record)
+        return rows
+
+    def read_before(self, table, before_id=None, limit=50, match=None):
+        # The newest `limit` archived rows with id below before_id (and match(record) true),
+        # newest first; reads only as many monthly files as it needs
+        archived = ARCHIVE_TABLES[table]
+        rows = []
+        for entry in reversed(self.months(table)):
+            if before_id is not None and entry['min_id'] >= before_id:
+                continue
+            for record in reversed(self._read_file(entry['file'])):
+                if before_id is not None and record['id'] >= before_id:
+                    continue
+                if match is None or match(record):
+                    rows.append(archived.decode(record))
+                    if len(rows) == limit:
+                        return rows
+        return rows
+
+
+def _chat_row(record):
+    return record['id'], record['timestamp'], record['sender'], record['message']
+
+
+def get_chat_history(before_id=None, limit=50, session_id=None, store=None):
+    # storage.get_chat_history(), continuing into the archive once the hot rows run out
+    rows = get_storage().get_chat_history(before_id=before_id, limit=limit, session_id=session_id)
+    if len(rows) == limit:
+        return rows
+    store = store or ArchiveStore()
+    match = None if session_id is None else (lambda record: record['session_id'] == session_id)
+    older = store.read_before('chat_log', rows[0][0] if rows else before_id, limit - len(rows), match)
+    return [_chat_row(record) for record in reversed(older)] + list(rows)
+
+
+def search_chat(text, before_id=None, limit=50, store=None):
+    # storage.search_chat(), continuing into the archive with the same every-word, last-word-prefix rule
+    rows = get_storage().search_chat(text, before_id=before_id, limit=limit)
+    words = [word.lower() for word in re.findall(r"\w+", text)]
+    if len(rows) == limit or not words:
+        return rows
+
+    def match(record):
+        message_words = re.findall(r"\w+", (record['message'] or '').lower())
+        return (all(word in message_words for word in words[:-1])
+                and any(message_word.startswith(words[-1]) for message_word in message_words))
+
+    store = store or ArchiveStore()
+    older = store.read_before('chat_log', rows[0][0] if rows else before_id, limit - len(rows), match)
+    return [_chat_row(record) for record in reversed(older)] + list(rows)
+
+
+class Archiver(threading.Thread):
+    # Moves rows past their table's retention into the archive, oldest month first
+    def __init__(self, storage=None, store=None, interval=ARCHIVE_INTERVAL, start_delay=ARCHIVE_START_DELAY):
+        super().__init__(daemon=True, name="Archiver")
+        self.storage = storage
+        self.store = store if store is not None else ArchiveStore()
+        self.interval = interval
+        self.start_delay = start_delay
+        self._stop_event = threading.Event()
+
+    def archive_table(self, archived, today=None):
+        storage = self.storage or get_storage()
+        # Only whole months entirely past the retention period
+        cutoff = month_start((today or date.today()) - timedelta(days=archived.retention_days))
+        oldest = storage.oldest_row_time(archived.database, archived.name, archived.time_column)
+        if oldest is None:
+            return 0
+
+        moved = 0
+        month = month_start(oldest.date() if isinstance(oldest, datetime) else oldest)
+        while month < cutoff and not self._stop_event.is_set():
+            start, end = archived.bound(month), archived.bound(next_month(month))
+            rows = storage.rows_between(archived.database, archived.name, archived.columns,
+                                        archived.time_column, start, end)
+            if rows:
+                # Archive file first: a crash in between leaves rows in both places, never in neither
+                self.store.write_month(archived.name, month, rows)
+                with storage.transaction(archived.database) as tx:
+                    storage.delete_rows_between(tx, archived.name, archived.time_column, start, end,
+                                                max(row[0] for row in rows))
+                moved += len(rows)
+                logging.info(f"Archived {len(rows)} {archived.name} rows from {month:%Y-%m}")
+            month = next_month(month)
+        return moved
+
+    def run_once(self, today=None):
+        moved = {}
+        for archived in ARCHIVE_TABLES.values():
+            try:
+                moved[archived.name] = self.archive_table(archived, today)
+            except (STORAGE_ERRORS + (OSError, ValueError)) as e:
+                logging.error(f"Archiving {archived.name} failed, will retry next run: {e}")
+        return moved
+
+    def run(self):
+        if self._stop_event.wait(self.start_delay):
+            return
+        while True:
+            self.run_once()
+            if self._stop_event.wait(self.interval):
+                return
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self.join(timeout)
+
+
+_archiver = None
+_archiver_lock = threading.Lock()
+
+
+def get_archiver():
+    global _archiver
+    with _archiver_lock:
+        if _archiver is None or not _archiver.is_alive():
+            _archiver = Archiver()
+            _archiver.start()
+        return _archiver
+
+
+def stop_archiver(timeout=5.0):
+    global _archiver
+    with _archiver_lock:
+        archiver, _archiver = _archiver, None
+    if archiver is not None and archiver.is_alive():
+        archiver.stop(timeout)
+
+
+if __name__ == "__main__":
+    # One archive run now, e.g. from a scheduled task when the app is not open
+    logging.basicConfig(level=logging.INFO)
+    moved = Archiver().run_once()
+    print(', '.join(f"{count} {table} rows archived" for table, count in moved.items()))
@@ -0,0 +1,143 @@
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from landmark_session import load_session
+from offline_analysis import FORM_RULES, compute_features, rep_statistics, evaluate_rule, segment_exercise
+from threshold_store import ThresholdStore, profile_path
+
+# Offline threshold calibration from recorded landmark sessions with labelled reps.
+# Usage: python calibrate_thresholds.py --user alice sessions/*.npz
+#
+# Recording a labelled session:
+#   1. During an exercise in the app, press Ctrl+Shift+R to start recording its landmarks and
+#      again to stop (finishing the exercise also stops it); the session lands in sessions/.
+#   2. python offline_analysis.py sessions/squat-<time>.npz lists the reps it detects.
+#   3. python landmark_session.py sessions/squat-<time>.npz --rep 2 --codes SQUAT_TOO_DEEP
+#      labels a rep with the mistakes it really had; label correct reps with no --codes.
+# The profile is saved to threshold_profiles/ and replaces thresholds.json for that member once
+# they sign in; the app watches it and saves their later threshold adjustments back to it.
+# Rules are fitted to the same frames the live counter judges, e.g. the knee angle at the
+# squat hold frame, so calibrated thresholds behave the same once loaded into the app.
+
+
+def extract_labelled_reps(path):
+    session = load_session(path)
+    if not session.labels:
+        logging.warning(f"{path} has no labelled reps, skipping")
+        return session.exercise, {}, []
+
+    features = compute_features(session.landmarks)
+    segments = None
+    starts, ends, bottoms, holds = [], [], [], []
+    for label in session.labels:
+        if 'rep' in label:
+            # Label refers to the n-th rep found by the live state machine
+            if segments is None:
+                segments = segment_exercise(features, session.exercise)
+            if label['rep'] >= len(segments['start']):
+                logging.warning(f"{path}: labelled rep {label['rep']} was not detected")
+                continue
+            rep = label['rep']
+            starts.append(segments['start'][rep])
+            ends.append(segments['end'][rep])
+            bottoms.append(segments['bottom'][rep])
+            holds.append(segments['hold'][rep])
+        else:
+            starts.append(label['start'])
+            ends.append(label['end'])
+            bottoms.append(None)
+            holds.append(None)
+    if None in holds:
+        # Hand-marked frame ranges: find the bottom and hold frames inside each range
+        bottoms, holds = None, None
+    stats = rep_statistics(features, session.exercise, starts, ends, bottoms, holds)
+    codes = [set(label['codes']) for label in session.labels
+             if 'rep' not in label or label['rep'] < len(segments['start'])]
+    return session.exercise, stats, codes
+
+
+def candidate_thresholds(statistic, current):
+    # The score only changes between observed values, so midpoints cover every distinct outcome
+    values = np.unique(statistic[~np.isnan(statistic)])
+    if len(values) == 0:
+        return np.array([current], dtype=np.float64)
+    midpoints = (values[:-1] + values[1:]) / 2
+    return np.unique(np.concatenate((midpoints, values[:1] - 1, values[-1:] + 1, [current])))
+
+
+def sweep_threshold(job):
+    key, statistic, labels, current = job
+    candidates = candidate_thresholds(statistic, current)
+
+    # reps x candidates in one shot
+    predicted = evaluate_rule(key, statistic[:, None], candidates[None, :])
+    expected = labels[:, None]
+    true_positives = (predicted & expected).sum(axis=0)
+    true_negatives = (~predicted & ~expected).sum(axis=0)
+
+    # Balanced accuracy, so a mistake that shows up in few reps still counts
+    positives = labels.sum()
+    negatives = len(labels) - positives
+    scores = []
+    if positives:
+        scores.append(true_positives / positives)
+    if negatives:
+        scores.append(true_negatives / negatives)
+    score = np.mean(scores, axis=0)
+
+    # Among equally good thresholds prefer the one closest to the current value
+    best = np.flatnonzero(score == score.max())
+    choice = best[np.argmin(np.abs(candidates[best] - current))]
+    return key, round(float(candidates[choice]), 1), float(score[choice]), len(labels)
+
+
+def calibrate(paths, base_thresholds, workers=None):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        extracted = [item for item in executor.map(extract_labelled_reps, paths) if item[1]]
+
+        jobs = []
+        for key, (exercise, code, stat_name, _) in FORM_RULES.items():
+            sessions = [(stats, codes) for session_exercise, stats, codes in extracted if session_exercise == exercise]
+            if not sessions:
+                continue
+            statistic = np.concatenate([stats[stat_name] for stats, _ in sessions])
+            labels = np.array([int(code) in rep_codes for _, codes in sessions for rep_codes in codes], dtype=bool)
+            jobs.append((key, statistic, labels, base_thresholds[key]))
+
+        return list(executor.map(sweep_threshold, jobs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate form thresholds from labelled landmark sessions")
+    parser.add_argument("sessions", nargs="+", help="Recorded .npz landmark sessions")
+    parser.add_argument("--user", required=True, help="Member the profile is written for, as they sign in (e.g. their email)")
+    parser.add_argument("--base", default="thresholds.json", help="Thresholds to start from")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    store = ThresholdStore()
+    if os.path.exists(args.base):
+        store.load(args.base)
+    base_thresholds = store.current
+
+    results = calibrate(args.sessions, base_thresholds, args.workers)
+    if not results:
+        print("No labelled reps found, nothing to calibrate.")
+        return
+
+    for key, value, score, reps in results:
+        print(f"{key}: {base_thresholds[key]} -> {value} (balanced accuracy {score:.2f} over {reps} reps)")
+    store.update({key: value for key, value, _, _ in results})
+
+    output = profile_path(args.user)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    store.save(output)
+    print(f"Threshold profile saved to {output}; the app uses it when {args.user} signs in")
+
+
+if __name__ == "__main__":
+    main()
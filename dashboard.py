@@ -1,9 +1,13 @@
 import sys
+from datetime import datetime
 from PyQt6.QtWidgets import QFrame, QVBoxLayout, QLabel,QWidget,QMainWindow,QHBoxLayout,QListWidget,QApplication, QPushButton,QScrollArea,QGridLayout,QLineEdit,QListWidgetItem
 from PyQt6.QtCharts import QChart, QChartView, QBarSet, QStackedBarSeries, QBarCategoryAxis, QValueAxis
 from PyQt6.QtCore import Qt, QMargins,QRectF,QPointF
 from PyQt6.QtGui import QColor, QPainter, QFont, QPen
-from db_manager import setup_database, get_score_data
+from db_manager import setup_database, get_score_data, get_leaderboard, get_current_user_id, get_streak, get_rollups
+
+DASHBOARD_DAYS = 30  # Longest window any dashboard widget shows
+LEADERBOARD_ROWS = 3  # Top members listed; the current user is added below them when outside
 class CustomChartView(QChartView):
     def __init__(self, chart, parent=None):
         super().__init__(chart, parent)
@@ -189,14 +193,17 @@ class Dashboard(QMainWindow):
         # Add the top bar
         content_layout.addLayout(self.create_top_bar())
 
+        # One cached snapshot feeds every widget on the page
+        score_data, total_points = get_score_data(days=DASHBOARD_DAYS)
+
         # Add the main metric section
-        content_layout.addWidget(self.create_main_metric())
+        content_layout.addWidget(self.create_main_metric(score_data))
 
         # Create and add the grid layout for the four widgets
         grid_layout = QGridLayout()
-        grid_layout.addWidget(self.create_leaderboard(), 0, 0)
-        grid_layout.addWidget(self.create_activeness_rate(), 0, 1)
-        grid_layout.addWidget(self.create_recent_activities(), 1, 0)
+        grid_layout.addWidget(self.create_leaderboard(total_points), 0, 0)
+        grid_layout.addWidget(self.create_activeness_rate(score_data), 0, 1)
+        grid_layout.addWidget(self.create_recent_activities(score_data), 1, 0)
         grid_layout.addWidget(self.create_ai_coach(), 1, 1)
         content_layout.addLayout(grid_layout)
 
@@ -217,7 +224,7 @@ class Dashboard(QMainWindow):
         top_bar.addWidget(start_workout_btn)
         return top_bar
     
-    def create_main_metric(self):
+    def create_main_metric(self, chart_data):
         frame = QFrame()
         frame.setObjectName("mainMetric")
         frame.setStyleSheet("background-color: #1e1e1e; color: #ffffff;")
@@ -236,9 +243,6 @@ class Dashboard(QMainWindow):
 
         layout.addWidget(header_container)
 
-        # Fetch data from the database
-        chart_data, _ = get_score_data()
-
         if not chart_data:
             # No data available
             no_data_label = QLabel("No exercise data available. Start working out to see your progress!")
@@ -336,16 +340,18 @@ class Dashboard(QMainWindow):
 
         return frame, layout
 
-    def create_leaderboard(self):
+    def create_leaderboard(self, total_points):
         frame, layout = self.create_widget_frame("Leaderboard")
 
-        _, total_points = get_score_data()
-
-        leaderboard_data = [
-            (1, "You", total_points),
-            (2, "Michael", 450),
-            (3, "David", 400)
-        ]
+        top, own = get_leaderboard(LEADERBOARD_ROWS)
+        current_user_id = get_current_user_id()
+        leaderboard_data = [(rank, "You" if user_id == current_user_id else name, points)
+                            for rank, user_id, name, points in top]
+        if own is not None and all(user_id != current_user_id for _, user_id, _, _ in top):
+            # Outside the top rows; show where the user stands underneath them
+            leaderboard_data.append((own[0], "You", own[1]))
+        elif own is None:
+            leaderboard_data.append(("-", "You", total_points))
 
         for rank, name, points in leaderboard_data:
             item = LeaderboardItem(rank, name, points)
@@ -354,14 +360,14 @@ class Dashboard(QMainWindow):
         layout.addStretch()
         return frame
 
-    def create_activeness_rate(self):
+    def create_activeness_rate(self, score_data):
         frame, layout = self.create_widget_frame("Workout Plan Complete Rate")
         
-        score_data, _ = get_score_data()
-        days_considered = min(30, len(score_data))
-        recent_data = score_data[:days_considered]
+        days_considered = min(DASHBOARD_DAYS, len(score_data))
+        recent_data = score_data[-days_considered:]
         
-        active_days = sum(1 for day in recent_data if day['total_points'] >= 40)
+        # goal_met is kept by the daily rollups, set when the day reached ACTIVE_DAY_POINTS
+        active_days = sum(1 for day in recent_data if day['goal_met'])
         activeness_rate = round((active_days / days_considered) * 100)
 
         gauge = ActivenessGauge()
@@ -374,11 +380,22 @@ class Dashboard(QMainWindow):
         container_layout.setContentsMargins(0, 0, 0, 0)
 
         layout.addWidget(container)
+
+        # Streak and this month's totals come straight from the streak and monthly rollup rows
+        current_streak, longest_streak = get_streak()
+        month = get_rollups('month', since=datetime.now().date().replace(day=1))
+        workouts = month[0]['workout_days'] if month else 0
+        reps = month[0]['reps'] if month else 0
+        summary_label = QLabel(f"Streak: {current_streak} days (best {longest_streak})\n"
+                               f"This month: {workouts} workouts, {reps} reps")
+        summary_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        summary_label.setStyleSheet("font-size: 14px; color: #aaaaaa;")
+        layout.addWidget(summary_label)
         layout.addStretch()
         
         return frame
 
-    def create_recent_activities(self):
+    def create_recent_activities(self, data):
         frame, layout = self.create_widget_frame("Recent Activities")
 
         activities_list = QListWidget()
@@ -394,8 +411,6 @@ class Dashboard(QMainWindow):
             }
         """)
 
-        data, _ = get_score_data()
-        
         recent_data = sorted(data, key=lambda x: x['score_date'], reverse=True)[:4]
 
         for row in recent_data:
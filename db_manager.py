@@ -1,210 +1,118 @@
-import mysql.connector
-from mysql.connector import Error
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
 import logging
+import threading
+from feedback_codes import encode_mistakes
+from storage import get_storage, STORAGE_ERRORS, LOCAL_USER_ID
+from db_writer import submit_write
+
+LEADERBOARD_SIZE = 10
+
+# Scores and feedback are recorded for the signed-in member; before sign-in that is the local user
+_current_user_id = LOCAL_USER_ID
+_current_user_name = None  # Also names the member's calibrated threshold profile
+
+# Everything the dashboard shows comes from one query, cached per user and date range until a write invalidates it
+_dashboard_snapshots = {}
+_snapshot_generation = 0
+_snapshot_lock = threading.Lock()
+
 def setup_database():
-    conn = None
+    # Schema changes are versioned migrations run by the storage backend; this only does work on its first call
+    get_storage()
+    print("Database setup completed successfully.")
+
+def set_current_user(name):
+    global _current_user_id, _current_user_name
     try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password=""
-        )
-        cursor = conn.cursor()
-
-        cursor.execute("CREATE DATABASE IF NOT EXISTS exercise_tracker")
-        cursor.execute("USE exercise_tracker")
-
-        # Create user_score table with DECIMAL for total_points
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_score (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                total_points DECIMAL(5,1) NOT NULL,
-                score_date DATE NOT NULL
-            )
-        """)
-
-        # Create exercise table with DECIMAL for points
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS exercise (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_score_id INT,
-                exercise_type ENUM('squat', 'bicep_curl', 'push_up') NOT NULL,
-                points DECIMAL(4,1) NOT NULL,
-                FOREIGN KEY (user_score_id) REFERENCES user_score(id)
-            )
-        """)
-
-        # Create exercise_feedback table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS exercise_feedback (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                exercise_name VARCHAR(50) NOT NULL,
-                reps_completed INT NOT NULL,
-                mistakes TEXT,
-                score DECIMAL(4,1) NOT NULL,
-                feedback_date DATE NOT NULL
-            )
-        """)
-
-        # Populate tables with sample data
-        cursor.execute("SELECT COUNT(*) FROM user_score")
-        if cursor.fetchone()[0] == 0:
-            for i in range(30):
-                date = (datetime.now() - timedelta(days=29-i)).date()
-                
-                # Insert into user_score table
-                cursor.execute(
-                    "INSERT INTO user_score (total_points, score_date) VALUES (%s, %s)",
-                    (0, date)
-                )
-                user_score_id = cursor.lastrowid
-
-                # Insert exercises
-                total_points = 0
-                for exercise_type in ['squat', 'bicep_curl', 'push_up']:
-                    points = round(random.uniform(0.1, 10.0), 1)  # Random decimal between 0.1 and 10.0
-                    total_points += points
-                    cursor.execute(
-                        "INSERT INTO exercise (user_score_id, exercise_type, points) VALUES (%s, %s, %s)",
-                        (user_score_id, exercise_type, points)
-                    )
-
-                # Update total points in user_score table
-                cursor.execute(
-                    "UPDATE user_score SET total_points = %s WHERE id = %s",
-                    (round(total_points, 1), user_score_id)
-                )
-
-        conn.commit()
-        print("Database setup completed successfully.")
-    except Error as e:
-        print(f"Error setting up database: {e}")
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
-
-def get_score_data():
-    conn = None
+        _current_user_id = get_storage().get_or_create_user(name)
+    except STORAGE_ERRORS as e:
+        print(f"Error signing in {name}: {e}")
+        return None
+    _current_user_name = name
+    return _current_user_id
+
+def get_current_user_id():
+    return _current_user_id
+
+def get_current_user_name():
+    return _current_user_name
+
+def invalidate_dashboard_snapshot():
+    global _snapshot_generation
+    with _snapshot_lock:
+        _dashboard_snapshots.clear()
+        _snapshot_generation += 1
+
+def get_score_data(days=None):
+    # Returns the current user's (daily rows, grand total); rows are shared between callers, do not modify them.
+    # With days set only the last `days` days are read; the grand total always covers all history.
+    key = (_current_user_id, days)
+    with _snapshot_lock:
+        snapshot = _dashboard_snapshots.get(key)
+        if snapshot is not None:
+            return snapshot
+        generation = _snapshot_generation
+
     try:
-        setup_database()
-
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="exercise_tracker"
-        )
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("""
-            SELECT 
-                us.score_date,
-                us.total_points,
-                MAX(CASE WHEN e.exercise_type = 'squat' THEN e.points ELSE 0 END) as squat_points,
-                MAX(CASE WHEN e.exercise_type = 'bicep_curl' THEN e.points ELSE 0 END) as bicep_curl_points,
-                MAX(CASE WHEN e.exercise_type = 'push_up' THEN e.points ELSE 0 END) as push_up_points
-            FROM user_score us
-            LEFT JOIN exercise e ON us.id = e.user_score_id
-            GROUP BY us.id, us.score_date, us.total_points
-            ORDER BY us.score_date
-        """)
-        data = cursor.fetchall()
-
-        cursor.execute("SELECT SUM(total_points) AS grand_total FROM user_score")
-        grand_total = cursor.fetchone()['grand_total']
-
-        return data, grand_total
-    except Error as e:
+        data, grand_total = get_storage().get_score_data(key[0], days)
+    except STORAGE_ERRORS as e:
         print(f"Error fetching data from database: {e}")
         return [], 0
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
 
-def update_exercise_score(exercise_name, score, date=None):
-    conn = None
+    snapshot = (data, grand_total)
+    with _snapshot_lock:
+        # A write that landed while we were querying makes this result stale; do not cache it
+        if generation == _snapshot_generation:
+            _dashboard_snapshots[key] = snapshot
+    return snapshot
+
+def get_streak():
+    # (current, longest) run of consecutive workout days for the current user
+    try:
+        return get_storage().get_streak(_current_user_id)
+    except STORAGE_ERRORS as e:
+        print(f"Error fetching streak: {e}")
+        return 0, 0
+
+def get_rollups(period, since=None):
+    # The current user's all-exercise rollups for 'day', 'week' or 'month' periods, oldest first
     try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="exercise_tracker"
-        )
-        cursor = conn.cursor()
-
-        # If no date is provided, use today's date
-        if date is None:
-            date = datetime.now().date()
-
-        # Check if there's already a user_score entry for this date
-        cursor.execute("SELECT id FROM user_score WHERE score_date = %s", (date,))
-        result = cursor.fetchone()
-
-        if result:
-            user_score_id = result[0]
-        else:
-            # Create a new user_score entry for this date
-            cursor.execute("INSERT INTO user_score (total_points, score_date) VALUES (0, %s)", (date,))
-            user_score_id = cursor.lastrowid
-
-        # Update or insert the exercise score
-        cursor.execute("""
-            INSERT INTO exercise (user_score_id, exercise_type, points)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE points = VALUES(points)
-        """, (user_score_id, exercise_name, score))
-
-        # Update the total points in user_score
-        cursor.execute("""
-            UPDATE user_score 
-            SET total_points = (
-                SELECT SUM(points) 
-                FROM exercise 
-                WHERE user_score_id = %s
-            )
-            WHERE id = %s
-        """, (user_score_id, user_score_id))
-
-        conn.commit()
+        return get_storage().get_rollups(_current_user_id, period, since)
+    except STORAGE_ERRORS as e:
+        print(f"Error fetching {period} rollups: {e}")
+        return []
+
+def get_leaderboard(limit=LEADERBOARD_SIZE):
+    # Returns (top rows as (rank, user_id, name, total), (rank, total) for the current user or None)
+    try:
+        return get_storage().get_leaderboard(_current_user_id, limit)
+    except STORAGE_ERRORS as e:
+        print(f"Error fetching leaderboard: {e}")
+        return [], None
+
+def update_exercise_score(exercise_name, score, date=None):
+    # Queued for the background writer; returns before the row is written
+    # If no date is provided, use today's date
+    if date is None:
+        date = datetime.now().date()
+
+    def score_committed():
+        invalidate_dashboard_snapshot()
         print(f"Score updated successfully for {exercise_name}: {score}")
-    except Error as e:
-        print(f"Error updating exercise score: {e}")
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
+
+    submit_write('write_exercise_score', _current_user_id, exercise_name, score, date, after_commit=score_committed)
 
 def save_exercise_feedback(exercise_name, reps_completed, mistakes, score):
-    conn = None
-    try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="exercise_tracker"
-        )
-        cursor = conn.cursor()
-
-        # Insert into exercise_feedback table
-        query = """
-        INSERT INTO exercise_feedback 
-        (exercise_name, reps_completed, mistakes, score, feedback_date) 
-        VALUES (%s, %s, %s, %s, %s)
-        """
-        mistakes_str = '; '.join(mistakes) if mistakes else "No mistakes"  # Convert list of mistakes to a string
-        values = (exercise_name, reps_completed, mistakes_str, score, datetime.now().date())
-        
-        cursor.execute(query, values)
-        conn.commit()
+    # Queued for the background writer; returns before the row is written
+    mistakes_str = encode_mistakes(mistakes)  # Feedback codes, e.g. "11,13"; empty when there were no mistakes
+
+    def feedback_committed():
+        invalidate_dashboard_snapshot()
         logging.info(f"Exercise feedback saved successfully for {exercise_name}")
         logging.info(f"Mistakes saved: {mistakes_str}")
-    except Error as e:
-        logging.error(f"Error saving exercise feedback: {e}")
-    finally:
-        if conn and conn.is_connected():
-            cursor.close()
-            conn.close()
+
+    submit_write('write_exercise_feedback', _current_user_id, exercise_name, reps_completed, mistakes_str, score,
+                 datetime.now().date(), after_commit=feedback_committed)
 
 
 if __name__ == "__main__":
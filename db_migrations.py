@@ -0,0 +1,413 @@
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+from mysql.connector import Error
+from db_pool import pooled_connection
+from archive import ArchiveStore
+from storage import build_initial_rollups, merge_duplicate_score_days
+
+# Versioned schema migrations, applied once per process instead of running DDL on every read.
+# Each database keeps a schema_version table with one row per applied migration.
+# MySQL commits DDL implicitly, so every step must be safe to run again if a migration
+# is interrupted before its version row is written.
+
+LOCAL_USER_ID = 1  # Same id as storage.LOCAL_USER_ID; owns everything recorded before anyone signs in
+MIGRATION_LOCK_TIMEOUT = 10  # Seconds to wait for another process that is migrating the same database
+
+
+def _seed_sample_scores(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_score")
+    count = cursor.fetchone()[0]
+    cursor.close()
+    if count:
+        return
+
+    for i in range(30):
+        date = (datetime.now() - timedelta(days=29-i)).date()
+
+        # Insert into user_score table
+        user_score_id = conn.execute_prepared(
+            "INSERT INTO user_score (total_points, score_date) VALUES (%s, %s)", (0, date)
+        ).lastrowid
+
+        # Insert exercises
+        total_points = 0
+        for exercise_type in ['squat', 'bicep_curl', 'push_up']:
+            points = round(random.uniform(0.1, 10.0), 1)  # Random decimal between 0.1 and 10.0
+            total_points += points
+            conn.execute_prepared(
+                "INSERT INTO exercise (user_score_id, exercise_type, points) VALUES (%s, %s, %s)",
+                (user_score_id, exercise_type, points)
+            )
+
+        # Update total points in user_score table
+        conn.execute_prepared(
+            "UPDATE user_score SET total_points = %s WHERE id = %s",
+            (round(total_points, 1), user_score_id)
+        )
+
+
+def _index_exists(conn, table, index):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, index))
+    exists = cursor.fetchone()[0] > 0
+    cursor.close()
+    return exists
+
+
+def add_column(table, column, definition):
+    def step(conn):
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (table, column))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        cursor.close()
+    return step
+
+
+def drop_index(table, index):
+    def step(conn):
+        if not _index_exists(conn, table, index):
+            return
+        cursor = conn.cursor()
+        cursor.execute(f"ALTER TABLE {table} DROP INDEX {index}")
+        cursor.close()
+    return step
+
+
+def _merge_duplicate_score_days(conn):
+    def execute(sql, params):
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall() if cursor.with_rows else []
+        cursor.close()
+        return rows
+    merge_duplicate_score_days(execute)
+
+
+def _build_initial_rollups(conn):
+    def execute(sql, params):
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall() if cursor.with_rows else []
+        cursor.close()
+        return rows
+
+    def executemany(sql, rows):
+        cursor = conn.cursor()
+        cursor.executemany(sql, rows)
+        cursor.close()
+    build_initial_rollups(execute, executemany, ArchiveStore().read('exercise_feedback'))
+
+
+def add_index(table, index, columns, unique=False, fulltext=False):
+    # MySQL has no ADD INDEX IF NOT EXISTS, so check information_schema first
+    kind = 'UNIQUE ' if unique else 'FULLTEXT ' if fulltext else ''
+    def step(conn):
+        if _index_exists(conn, table, index):
+            return
+        cursor = conn.cursor()
+        cursor.execute(f"ALTER TABLE {table} ADD {kind}INDEX {index} ({columns})")
+        cursor.close()
+    return step
+
+
+# database -> ordered list of (version, description, steps); a step is SQL or a callable taking the connection.
+# Never edit a migration that has shipped, append a new one instead.
+MIGRATIONS = {
+    'exercise_tracker': [
+        (1, "create score tables", [
+            """
+            CREATE TABLE IF NOT EXISTS user_score (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                total_points DECIMAL(5,1) NOT NULL,
+                score_date DATE NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS exercise (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_score_id INT,
+                exercise_type ENUM('squat', 'bicep_curl', 'push_up') NOT NULL,
+                points DECIMAL(4,1) NOT NULL,
+                FOREIGN KEY (user_score_id) REFERENCES user_score(id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS exercise_feedback (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                exercise_name VARCHAR(50) NOT NULL,
+                reps_completed INT NOT NULL,
+                mistakes TEXT,
+                score DECIMAL(4,1) NOT NULL,
+                feedback_date DATE NOT NULL
+            )
+            """
+        ]),
+        (2, "seed sample scores", [_seed_sample_scores]),
+        (3, "deduplicate exercise rows and add keys", [
+            # Without a unique key ON DUPLICATE KEY UPDATE never fired and every score update
+            # added a row; keep the newest row per day and exercise
+            """
+            DELETE older FROM exercise older
+            JOIN exercise newer
+              ON newer.user_score_id = older.user_score_id
+             AND newer.exercise_type = older.exercise_type
+             AND newer.id > older.id
+            """,
+            """
+            UPDATE user_score us
+            SET total_points = COALESCE((SELECT SUM(points) FROM exercise WHERE user_score_id = us.id), 0)
+            """,
+            add_index('exercise', 'uq_exercise_score_type', 'user_score_id, exercise_type', unique=True),
+            add_index('user_score', 'idx_user_score_date', 'score_date'),
+            add_index('exercise_feedback', 'idx_exercise_feedback_date', 'feedback_date'),
+        ]),
+        (4, "users and per-user totals", [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL UNIQUE,
+                created_at DATETIME NOT NULL
+            )
+            """,
+            f"INSERT IGNORE INTO users (id, name, created_at) VALUES ({LOCAL_USER_ID}, 'local', NOW())",
+            # Existing rows belong to the local user
+            add_column('user_score', 'user_id', f"INT NOT NULL DEFAULT {LOCAL_USER_ID}"),
+            add_column('exercise_feedback', 'user_id', f"INT NOT NULL DEFAULT {LOCAL_USER_ID}"),
+            add_index('user_score', 'idx_user_score_user_date', 'user_id, score_date'),
+            add_index('exercise_feedback', 'idx_exercise_feedback_user_date', 'user_id, feedback_date'),
+            """
+            CREATE TABLE IF NOT EXISTS user_totals (
+                user_id INT PRIMARY KEY,
+                total_points DECIMAL(12,1) NOT NULL,
+                INDEX idx_user_totals_rank (total_points DESC, user_id)
+            )
+            """,
+            """
+            INSERT INTO user_totals (user_id, total_points)
+            SELECT user_id, SUM(total_points) FROM user_score GROUP BY user_id
+            ON DUPLICATE KEY UPDATE total_points = VALUES(total_points)
+            """,
+        ]),
+        (5, "one score row per user and day, atomic score writes", [
+            _merge_duplicate_score_days,
+            add_index('user_score', 'uq_user_score_user_date', 'user_id, score_date', unique=True),
+            # Covered by the unique key now
+            drop_index('user_score', 'idx_user_score_user_date'),
+            "DROP PROCEDURE IF EXISTS record_exercise_score",
+            # Called by MySQLStorage.write_exercise_score. Locking the day row first queues
+            # concurrent writers for the same day, and every writer takes user_score before
+            # user_totals, so they cannot deadlock on each other.
+            """
+            CREATE PROCEDURE record_exercise_score(
+                IN p_user_id INT, IN p_date DATE, IN p_type VARCHAR(20), IN p_points DECIMAL(4,1))
+            BEGIN
+                DECLARE v_score_id INT;
+                DECLARE v_old DECIMAL(4,1);
+                DECLARE v_delta DECIMAL(5,1);
+
+                INSERT INTO user_score (user_id, total_points, score_date) VALUES (p_user_id, 0, p_date)
+                ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id);
+                SET v_score_id = LAST_INSERT_ID();
+
+                SELECT COALESCE(MAX(points), 0) INTO v_old
+                FROM exercise WHERE user_score_id = v_score_id AND exercise_type = p_type;
+
+                INSERT INTO exercise (user_score_id, exercise_type, points) VALUES (v_score_id, p_type, p_points)
+                ON DUPLICATE KEY UPDATE points = VALUES(points);
+
+                SET v_delta = p_points - v_old;
+                IF v_delta <> 0 THEN
+                    UPDATE user_score SET total_points = total_points + v_delta WHERE id = v_score_id;
+                    INSERT INTO user_totals (user_id, total_points) VALUES (p_user_id, v_delta)
+                    ON DUPLICATE KEY UPDATE total_points = total_points + VALUES(total_points);
+                END IF;
+            END
+            """,
+        ]),
+        (6, "daily, weekly and monthly rollups and streaks", [
+            """
+            CREATE TABLE IF NOT EXISTS score_rollup (
+                user_id INT NOT NULL,
+                period ENUM('day', 'week', 'month') NOT NULL,
+                period_start DATE NOT NULL,
+                exercise_type VARCHAR(50) NOT NULL,
+                points DECIMAL(12,1) NOT NULL DEFAULT 0,
+                reps INT NOT NULL DEFAULT 0,
+                mistakes INT NOT NULL DEFAULT 0,
+                workout_days INT NOT NULL DEFAULT 0,
+                goal_days INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, period, period_start, exercise_type)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS user_streaks (
+                user_id INT PRIMARY KEY,
+                current_streak INT NOT NULL,
+                longest_streak INT NOT NULL,
+                last_day DATE NOT NULL
+            )
+            """,
+            # Same as version 5, but reporting the previous exercise points and day total so the
+            # caller can update the rollups and streak
+            "DROP PROCEDURE IF EXISTS record_exercise_score",
+            """
+            CREATE PROCEDURE record_exercise_score(
+                IN p_user_id INT, IN p_date DATE, IN p_type VARCHAR(20), IN p_points DECIMAL(4,1),
+                OUT p_old_points DECIMAL(4,1), OUT p_old_total DECIMAL(5,1))
+            BEGIN
+                DECLARE v_score_id INT;
+                DECLARE v_delta DECIMAL(5,1);
+
+                INSERT INTO user_score (user_id, total_points, score_date) VALUES (p_user_id, 0, p_date)
+                ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id);
+                SET v_score_id = LAST_INSERT_ID();
+
+                SELECT total_points INTO p_old_total FROM user_score WHERE id = v_score_id;
+                SELECT COALESCE(MAX(points), 0) INTO p_old_points
+                FROM exercise WHERE user_score_id = v_score_id AND exercise_type = p_type;
+
+                INSERT INTO exercise (user_score_id, exercise_type, points) VALUES (v_score_id, p_type, p_points)
+                ON DUPLICATE KEY UPDATE points = VALUES(points);
+
+                SET v_delta = p_points - p_old_points;
+                IF v_delta <> 0 THEN
+                    UPDATE user_score SET total_points = total_points + v_delta WHERE id = v_score_id;
+                    INSERT INTO user_totals (user_id, total_points) VALUES (p_user_id, v_delta)
+                    ON DUPLICATE KEY UPDATE total_points = total_points + VALUES(total_points);
+                END IF;
+            END
+            """,
+            _build_initial_rollups,
+        ]),
+    ],
+    'workout_assistant': [
+        (1, "create chat tables", [
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                start_time DATETIME
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS chat_log (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                session_id INT,
+                timestamp DATETIME,
+                sender VARCHAR(255),
+                message TEXT,
+                FOREIGN KEY (session_id) REFERENCES sessions(id)
+            )
+            """
+        ]),
+        (2, "index chat_log by time", [
+            add_index('chat_log', 'idx_chat_log_timestamp', 'timestamp'),
+            add_index('chat_log', 'idx_chat_log_session_time', 'session_id, timestamp'),
+        ]),
+        (3, "full-text index over chat messages", [
+            add_index('chat_log', 'ft_chat_log_message', 'message', fulltext=True),
+        ]),
+    ],
+    'hackkathon2024': [
+        # Same table as user_information.sql, for installs that never imported the dump
+        (1, "create user_information table", [
+            """
+            CREATE TABLE IF NOT EXISTS user_information (
+                id INT(11) NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                weight FLOAT NOT NULL,
+                height FLOAT NOT NULL,
+                gender VARCHAR(10) NOT NULL,
+                activity VARCHAR(50) NOT NULL,
+                goal VARCHAR(50) NOT NULL,
+                intensity VARCHAR(50) NOT NULL,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        ]),
+        (2, "owner of each survey answer", [
+            add_column('user_information', 'user_id', f"INT NOT NULL DEFAULT {LOCAL_USER_ID}"),
+        ]),
+    ],
+}
+
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def _apply_pending(conn, database):
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL
+        )
+    """)
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    current = cursor.fetchone()[0]
+
+    for version, description, steps in MIGRATIONS[database]:
+        if version <= current:
+            continue
+        logging.info(f"Applying {database} migration {version}: {description}")
+        for step in steps:
+            if callable(step):
+                step(conn)
+            else:
+                cursor.execute(step)
+        cursor.execute(
+            "INSERT INTO schema_version (version, description, applied_at) VALUES (%s, %s, %s)",
+            (version, description, datetime.now())
+        )
+        conn.commit()
+    cursor.close()
+
+
+def run_migrations(database):
+    # Cheap after the first successful call; a failed run is retried on the next call
+    if database in _migrated:
+        return True
+    with _migrate_lock:
+        if database in _migrated:
+            return True
+        try:
+            with pooled_connection(None) as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+                cursor.close()
+
+            with pooled_connection(database) as conn:
+                # Serialize with other processes starting at the same time
+                cursor = conn.cursor()
+                cursor.execute("SELECT GET_LOCK(%s, %s)", (f"schema_migration_{database}", MIGRATION_LOCK_TIMEOUT))
+                locked = cursor.fetchone()[0] == 1
+                try:
+                    _apply_pending(conn, database)
+                finally:
+                    if locked:
+                        cursor.execute("SELECT RELEASE_LOCK(%s)", (f"schema_migration_{database}",))
+                        cursor.fetchall()
+                    cursor.close()
+        except Error as e:
+            print(f"Error migrating database {database}: {e}")
+            return False
+        _migrated.add(database)
+        return True
+
+
+def run_all_migrations():
+    return all([run_migrations(database) for database in MIGRATIONS])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print("Migrations complete." if run_all_migrations() else "Some migrations failed, see errors above.")
@@ -0,0 +1,276 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import mysql.connector
+from mysql.connector import Error
+from mysql.connector import errorcode
+from mysql.connector.errors import InterfaceError, OperationalError, PoolError
+
+# Shared MySQL connections for every module that talks to the database.
+# Connections are opened lazily, kept per database and handed out with pooled_connection():
+#
+#     with pooled_connection('exercise_tracker') as conn:
+#         conn.execute_prepared("INSERT ... VALUES (%s, %s)", (a, b))
+#         conn.commit()
+
+CONNECT_TIMEOUT = 3  # Seconds a connection attempt may take before the server counts as down
+
+CONNECTION_SETTINGS = {
+    'user': 'root',
+    'password': '',  # Default password for XAMPP is empty
+    'connection_timeout': CONNECT_TIMEOUT,
+}
+
+# database name -> host; None is a server-level connection with no default database
+DATABASE_HOSTS = {
+    None: 'localhost',
+    'exercise_tracker': 'localhost',
+    'workout_assistant': 'localhost',
+    'hackkathon2024': '127.0.0.1'
+}
+
+POOL_SIZE = 4
+ACQUIRE_TIMEOUT = 5.0  # Seconds to wait for a free connection before giving up
+HEALTH_CHECK_INTERVAL = 30.0  # Connections idle longer than this are pinged before reuse
+RECONNECT_ATTEMPTS = 3
+RECONNECT_DELAY = 0.5
+BREAKER_RESET_TIMEOUT = 10.0  # Seconds a down server is failed fast before one connection attempt is let through
+
+# Errors worth retrying: the server went away or another transaction held a lock
+TRANSIENT_ERRNOS = {
+    errorcode.ER_LOCK_DEADLOCK,
+    errorcode.ER_LOCK_WAIT_TIMEOUT,
+    errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST,
+    errorcode.CR_CONN_HOST_ERROR,
+}
+
+
+# Errors meaning the server cannot be reached at all
+UNAVAILABLE_ERRNOS = {
+    errorcode.CR_CONNECTION_ERROR,
+    errorcode.CR_CONN_HOST_ERROR,
+    errorcode.CR_UNKNOWN_HOST,
+    errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST,
+}
+
+
+class DatabaseUnavailable(InterfaceError):
+    # Raised without touching the network while a host's circuit breaker is open
+    pass
+
+
+def is_transient(error):
+    return isinstance(error, (InterfaceError, OperationalError, PoolError)) or error.errno in TRANSIENT_ERRNOS
+
+
+def is_unavailable(error):
+    return isinstance(error, DatabaseUnavailable) or getattr(error, 'errno', None) in UNAVAILABLE_ERRNOS
+
+
+class CircuitBreaker:
+    # One per host. Closed: connect as usual. After a failure to reach the server it opens and
+    # every caller fails fast with DatabaseUnavailable instead of waiting on a connection timeout.
+    # Every reset_timeout seconds one caller is let through to try again; success closes it.
+    def __init__(self, host, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.host = host
+        self.reset_timeout = reset_timeout
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def before_connect(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            waited = time.monotonic() - self._opened_at
+            if waited < self.reset_timeout:
+                raise DatabaseUnavailable(msg=f"MySQL server at {self.host} is unavailable, "
+                                              f"next attempt in {self.reset_timeout - waited:.0f}s")
+            # This caller probes the server; everyone else keeps failing fast meanwhile
+            self._opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logging.info(f"MySQL server at {self.host} is reachable again")
+            self._opened_at = None
+
+    def record_failure(self, error):
+        with self._lock:
+            if self._opened_at is None:
+                logging.warning(f"MySQL server at {self.host} is unavailable, failing fast for "
+                                f"{self.reset_timeout:.0f}s at a time: {error}")
+            self._opened_at = time.monotonic()
+
+    def record(self, error):
+        # Any answer from the server, even an error, shows it is up
+        if is_unavailable(error):
+            self.record_failure(error)
+        else:
+            self.record_success()
+
+
+class PooledConnection:
+    def __init__(self, connection):
+        self.connection = connection
+        self.last_used = time.monotonic()
+        self._statements = {}
+
+    def execute_prepared(self, sql, params=()):
+        # One server-side prepared statement per SQL string and connection. The
+        # connector only skips re-preparing when it gets the identical string object
+        # it prepared last time, so the cached copy is what gets executed.
+        entry = self._statements.get(sql)
+        if entry is None:
+            entry = self._statements[sql] = (sql, self.connection.cursor(prepared=True))
+        sql, cursor = entry
+        cursor.execute(sql, params)
+        return cursor
+
+    def cursor(self, *args, **kwargs):
+        return self.connection.cursor(*args, **kwargs)
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def is_connected(self):
+        return self.connection.is_connected()
+
+    def check_health(self):
+        if time.monotonic() - self.last_used < HEALTH_CHECK_INTERVAL:
+            return
+        try:
+            self.connection.ping(reconnect=False)
+        except Error:
+            logging.warning("Pooled MySQL connection went away, reconnecting")
+            # Prepared statements die with the old session
+            self._statements.clear()
+            self.connection.reconnect(attempts=RECONNECT_ATTEMPTS, delay=RECONNECT_DELAY)
+
+    def close(self):
+        self._statements.clear()
+        try:
+            self.connection.close()
+        except Error:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, database, size=POOL_SIZE):
+        self.database = database
+        self.config = dict(CONNECTION_SETTINGS, host=DATABASE_HOSTS.get(database, 'localhost'))
+        if database is not None:
+            self.config['database'] = database
+        self._idle = queue.LifoQueue()  # Most recently used first, so idle extras age out
+        self._slots = threading.BoundedSemaphore(size)
+        self.breaker = get_breaker(self.config['host'])
+
+    def _connect(self):
+        return PooledConnection(mysql.connector.connect(**self.config))
+
+    def acquire(self, timeout=ACQUIRE_TIMEOUT):
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolError(f"No free connection for database '{self.database}' after {timeout}s")
+        try:
+            self.breaker.before_connect()
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            else:
+                conn.check_health()
+        except Error as e:
+            self._slots.release()
+            if not isinstance(e, DatabaseUnavailable):
+                self.breaker.record(e)
+            raise
+        except BaseException:
+            self._slots.release()
+            raise
+        self.breaker.record_success()
+        return conn
+
+    def release(self, conn, discard=False):
+        try:
+            if discard:
+                conn.close()
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(host):
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
+
+
+def get_pool(database):
+    with _pools_lock:
+        pool = _pools.get(database)
+        if pool is None:
+            pool = _pools[database] = ConnectionPool(database)
+        return pool
+
+
+@contextmanager
+def pooled_connection(database):
+    pool = get_pool(database)
+    conn = pool.acquire()
+    discard = False
+    try:
+        yield conn
+    except BaseException as e:
+        if isinstance(e, Error) and is_unavailable(e):
+            # The server went away mid-transaction
+            pool.breaker.record_failure(e)
+        # Never hand a connection with a half-finished transaction to the next caller
+        try:
+            conn.rollback()
+        except Error:
+            discard = True
+        raise
+    finally:
+        pool.release(conn, discard)
+
+
+def close_pool(database):
+    with _pools_lock:
+        pool = _pools.pop(database, None)
+    if pool is not None:
+        pool.close()
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
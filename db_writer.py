@@ -0,0 +1,245 @@
+import logging
+import queue
+import threading
+import time
+import query_stats
+from storage import get_storage
+from write_journal import WriteJournal
+
+# Write-behind queue: callers hand over a write and return immediately, a single background
+# thread runs the writes in order. Consecutive writes with the same storage batch key (the
+# database, for MySQL) share one transaction (group commit), so a burst of chat messages or
+# a score + feedback pair costs one commit instead of one per row.
+#
+#     submit_write('write_exercise_feedback', name, reps, mistakes, score, day)   # storage.write_exercise_feedback(tx, ...)
+#
+# Writes the database cannot take right now (server down, locks that outlast the retries) are
+# kept in write_journal.py's journal instead of being dropped, and replayed in order later.
+
+MAX_BATCH = 64
+MAX_RETRIES = 3
+RETRY_DELAY = 0.5  # Seconds, doubled on every retry
+JOURNAL_RETRY_INTERVAL = 10.0  # Seconds between replay attempts while journaled writes are waiting
+
+_STOP = object()
+
+
+class WriteJob:
+    __slots__ = ('method', 'args', 'key', 'after_commit', 'site')
+
+    def __init__(self, method, args, key, after_commit, site):
+        self.method = method
+        self.args = args
+        self.key = key
+        self.after_commit = after_commit
+        self.site = site  # Caller of submit_write, so query statistics name the UI code and not this thread
+
+
+class DatabaseWriter(threading.Thread):
+    def __init__(self, storage, max_batch=MAX_BATCH, max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY,
+                 journal=None, journal_retry_interval=JOURNAL_RETRY_INTERVAL):
+        super().__init__(daemon=True, name="DatabaseWriter")
+        self.storage = storage
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.journal = journal if journal is not None else WriteJournal()
+        self.journal_retry_interval = journal_retry_interval
+        self._queue = queue.Queue()
+        self._held = None  # First job of the next batch, taken off the queue while filling this one
+        self._callbacks = {}  # Journal seq -> after_commit of a write journaled by this process
+
+    def submit(self, method, *args, after_commit=None):
+        # storage.<method>(tx, *args) runs on the writer thread; after_commit() runs once it has committed
+        if not callable(getattr(self.storage, method, None)):
+            raise AttributeError(f"Storage has no write method '{method}'")
+        self._queue.put(WriteJob(method, args, self.storage.batch_key(method), after_commit, query_stats.call_site()))
+
+    def _next_batch(self):
+        # Returns an empty batch when journaled writes are waiting and nothing arrived for a while
+        if self._held is not None:
+            first, self._held = self._held, None
+        else:
+            try:
+                first = self._queue.get(timeout=self.journal_retry_interval if len(self.journal) else None)
+            except queue.Empty:
+                return []
+        if first is _STOP:
+            return None
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is _STOP or job.key != first.key:
+                self._held = job
+                break
+            batch.append(job)
+        return batch
+
+    def _commit(self, key, jobs):
+        with query_stats.attributed(f"group commit of {len(jobs)} writes"), self.storage.transaction(key) as tx:
+            for job in jobs:
+                with query_stats.attributed(job.site):
+                    getattr(self.storage, job.method)(tx, *job.args)
+
+    def _write(self, key, jobs):
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._commit(key, jobs)
+                return True
+            except self.storage.errors as e:
+                # No point waiting on a server that is down; the journal keeps the write
+                if self.storage.is_unavailable(e) or not self.storage.is_transient(e) or attempt == self.max_retries:
+                    raise
+                logging.warning(f"Transient error in {jobs[0].method}, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                delay *= 2
+
+    def _deferrable(self, error):
+        # Worth keeping for later rather than dropping: the database is down or stayed locked
+        return self.storage.is_unavailable(error) or self.storage.is_transient(error)
+
+    def _commit_jobs(self, key, jobs):
+        # Returns (committed jobs, jobs to keep for later); writes that fail for good are dropped
+        try:
+            self._write(key, jobs)
+            return jobs, []
+        except self.storage.errors as e:
+            if self._deferrable(e):
+                return [], jobs
+            if len(jobs) == 1:
+                logging.error(f"Dropping {jobs[0].method} after error: {e}")
+                return [], []
+            # Find the bad write instead of losing the whole batch with it
+            logging.warning(f"Group commit of {len(jobs)} writes failed ({e}), retrying writes one by one")
+
+        committed = []
+        for index, job in enumerate(jobs):
+            try:
+                self._write(key, [job])
+                committed.append(job)
+            except self.storage.errors as job_error:
+                if self._deferrable(job_error):
+                    return committed, jobs[index:]
+                logging.error(f"Dropping {job.method} after error: {job_error}")
+        return committed, []
+
+    def _after_commit(self, jobs):
+        for job in jobs:
+            if job.after_commit is not None:
+                try:
+                    job.after_commit()
+                except Exception as e:
+                    logging.error(f"Error in after-commit callback: {e}")
+
+    def _journal(self, jobs):
+        waiting = len(self.journal)
+        try:
+            seqs = self.journal.append([(job.method, job.args) for job in jobs])
+        except (OSError, TypeError, ValueError) as e:
+            for job in jobs:
+                logging.error(f"Dropping {job.method}, the write journal failed: {e}")
+            return
+        for seq, job in zip(seqs, jobs):
+            if job.after_commit is not None:
+                self._callbacks[seq] = job.after_commit
+        if not waiting:
+            logging.warning(f"Database unavailable, journaling writes for replay from {self.journal.path}")
+
+    def _replay_journal(self):
+        # Replays journaled writes oldest first, grouped like live writes; stops at the first
+        # one the database still cannot take. Returns True once the journal is empty.
+        entries = self.journal.pending()
+        start = 0
+        while start < len(entries):
+            key = self.storage.batch_key(entries[start][1])
+            end = start + 1
+            while (end < len(entries) and end - start < self.max_batch
+                   and self.storage.batch_key(entries[end][1]) == key):
+                end += 1
+            group = entries[start:end]
+            jobs = [WriteJob(method, args, key, self._callbacks.get(seq), "journal replay")
+                    for seq, method, args in group]
+            committed, deferred = self._commit_jobs(key, jobs)
+            done = len(group) - len(deferred)
+            if done:
+                self.journal.mark_replayed(group[done - 1][0])
+                for seq, _, _ in group[:done]:
+                    self._callbacks.pop(seq, None)
+            self._after_commit(committed)
+            if deferred:
+                return False
+            start = end
+        if entries:
+            logging.info(f"Replayed {len(entries)} journaled writes")
+        return True
+
+    def _run_batch(self, batch):
+        if len(self.journal):
+            # Older writes are still waiting; queue behind them so the order is kept
+            self._journal(batch)
+            self._replay_journal()
+            return
+        committed, deferred = self._commit_jobs(batch[0].key, batch)
+        if deferred:
+            self._journal(deferred)
+        self._after_commit(committed)
+
+    def run(self):
+        batch = []  # Journaled writes left over from the last run are replayed first
+        while True:
+            try:
+                if batch:
+                    self._run_batch(batch)
+                elif len(self.journal):
+                    # Nothing new arrived for a while; see whether the database is back
+                    self._replay_journal()
+            except Exception as e:
+                logging.error(f"Unexpected error in database writer: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            batch = self._next_batch()
+            if batch is None:
+                self._queue.task_done()
+                return
+
+    def flush(self, timeout=None):
+        # Wait until everything submitted so far has been written (or dropped)
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def stop(self, timeout=None):
+        self._queue.put(_STOP)
+        self.join(timeout)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = DatabaseWriter(get_storage())
+            _writer.start()
+        return _writer
+
+
+def submit_write(method, *args, after_commit=None):
+    get_writer().submit(method, *args, after_commit=after_commit)
+
+
+def stop_writer(timeout=10.0):
+    # Flushes pending writes; called when the application closes
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None and writer.is_alive():
+        writer.stop(timeout)
+        if writer.is_alive():
+            logging.warning(f"Database writer did not finish within {timeout:.0f}s, pending writes are lost")
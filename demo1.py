@@ -1,63 +1,14 @@
 import cv2
 import numpy as np
 import mediapipe as mp
-import math as m
-from enum import Enum
-from collections import deque
-import heapq
+from exercise_analysis import (
+    SquatState, BicepCurlState, FeedbackPriority, FeedbackManager, AngleCalculator,
+    ExerciseCounter, BicepCurlAnalyzer, PostureAnalyzer, FrameAnalyzer, POSE_LANDMARKS
+)
+from threshold_store import ThresholdStore
+from landmark_session import LandmarkRecorder
+from telemetry_store import RepTelemetry, get_telemetry_writer
 
-class SquatState(Enum):
-    IDLE = 0
-    SQUAT_START = 1
-    SQUAT_DOWN = 2
-    SQUAT_HOLD = 3
-    SQUAT_UP = 4
-
-class BicepCurlState(Enum):
-    IDLE = 0
-    CURL_START = 1
-    CURL_UP = 2
-    CURL_HOLD = 3  
-    CURL_DOWN = 4
-
-class FeedbackPriority(Enum):
-    LOW = 1
-    MEDIUM = 2
-    HIGH = 3
-
-class FeedbackManager:
-    def __init__(self, window_size=5):
-        self.feedback_window = deque(maxlen=window_size)
-        self.current_feedback = []
-        self.priority_queue = []
-
-    def add_feedback(self, feedback, priority):
-        heapq.heappush(self.priority_queue, (-priority.value, feedback))
-        self.feedback_window.append((feedback, priority))
-        self._process_feedback()
-
-    def _process_feedback(self):
-        feedback_count = {}
-        for feedback, priority in self.feedback_window:
-            if feedback in feedback_count:
-                feedback_count[feedback] += 1
-            else:
-                feedback_count[feedback] = 1
-
-        threshold = len(self.feedback_window) // 2
-        self.current_feedback = [fb for fb, count in feedback_count.items() if count > threshold]
-
-    def get_feedback(self):
-        if self.priority_queue:
-            _, top_feedback = self.priority_queue[0]
-            return [top_feedback]
-        return []
-
-    def clear_feedback(self):
-        self.feedback_window.clear()
-        self.current_feedback = []
-        self.priority_queue = []
-    
 class PoseDetector:
     def __init__(self):
         self.mp_drawing = mp.solutions.drawing_utils
@@ -83,455 +34,26 @@ class PoseDetector:
             self.mp_drawing.DrawingSpec(color=(255, 0, 0), thickness=2, circle_radius=2)
         )
 
-class AngleCalculator:
-    @staticmethod
-    def calculate_angle(a, b, c):
-        a = np.array(a)
-        b = np.array(b)
-        c = np.array(c)
-        
-        radians = np.arctan2(c[1] - b[1], c[0] - b[0]) - np.arctan2(a[1] - b[1], a[0] - b[0])
-        angle = np.abs(radians * 180.0 / np.pi)
-        
-        return angle if angle <= 180.0 else 360 - angle
-
-
-    @staticmethod
-    def calculate_vertical_angle(point1, point2):
-        x1, y1 = point1
-        x2, y2 = point2
-        dx = x2 - x1
-        dy = y2 - y1
-        angle = np.abs(np.arctan2(dx, -dy) * 180.0 / np.pi)
-        return angle        
-    
-    @staticmethod
-    def findDistance(x1, y1, x2, y2):
-        dist = m.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-        return dist
-
-    @staticmethod
-    def findAngle(x1, y1, x2, y2):
-        theta = m.acos((y2 - y1) * (-y1) / (m.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2) * y1))
-        degree = int(180 / m.pi) * theta
-        return degree
-    
-    @staticmethod
-    def angle_deg(p1, pref, p2):
-            # Ensure all points are 2D
-            p1 = np.array(p1[:2])
-            pref = np.array(pref[:2])
-            p2 = np.array(p2[:2])
-            
-            p1ref = p1 - pref
-            p2ref = p2 - pref
-            
-            dot_product = np.dot(p1ref, p2ref)
-            magnitude_p1ref = np.linalg.norm(p1ref)
-            magnitude_p2ref = np.linalg.norm(p2ref)
-            
-            cos_theta = dot_product / (magnitude_p1ref * magnitude_p2ref)
-            angle_rad = np.arccos(np.clip(cos_theta, -1.0, 1.0))
-            angle_deg = np.degrees(angle_rad)
-            
-            return angle_deg
-    
-    @staticmethod
-    def calculate_elbow_torso_angle(left_hip, left_shoulder, left_elbow, 
-                                    right_hip, right_shoulder, right_elbow, 
-                                    visibility_threshold=0.6):
-        def is_visible(points):
-            return all(point[2] > visibility_threshold for point in points)
-
-        left_visible = is_visible([left_hip, left_shoulder, left_elbow])
-        right_visible = is_visible([right_hip, right_shoulder, right_elbow])
-
-        if left_visible and right_visible:
-            # Front view - calculate both angles
-            left_angle = AngleCalculator.angle_deg(left_hip, left_shoulder, left_elbow)
-            right_angle = AngleCalculator.angle_deg(right_hip, right_shoulder, right_elbow)
-            return left_angle, right_angle, (left_angle + right_angle) / 2, "front"
-        elif left_visible:
-            # Left side view
-            left_angle = AngleCalculator.angle_deg(left_hip, left_shoulder, left_elbow)
-            return left_angle, None, left_angle, "left_side"
-        elif right_visible:
-            # Right side view
-            right_angle = AngleCalculator.angle_deg(right_hip, right_shoulder, right_elbow)
-            return None, right_angle, right_angle, "right_side"
-        else:
-            # No clear view
-            return None, None, None, "unclear"
-        
-    @staticmethod
-    def calculate_hip_shoulder_angle(hip, shoulder, visibility_threshold=0.6):
-        if hip[2] > visibility_threshold and shoulder[2] > visibility_threshold:
-            return AngleCalculator.findAngle(hip[0], hip[1], shoulder[0], shoulder[1])
-        else:
-            return None
-
-class ExerciseCounter:
-    def __init__(self, analyze_squat_form_callback, thresholds):
-        self.curl_counter = 0
-        self.bicep_curl_state = BicepCurlState.IDLE
-        self.prev_bicep_angle = 180
-        self.curl_start_threshold = 160
-        self.curl_up_threshold = 90
-        self.curl_down_threshold = 150
-        self.curl_feedback = []
-
-        self.squat_counter = 0  
-        self.squat_state = SquatState.IDLE
-        self.squat_feedback = []
-        self.prev_knee_angle = 180  # Initialize with a straight leg angle
-        self.squat_threshold = 80  # Adjust this value based on your needs
-        self.start_threshold = 160  # Threshold to detect the start of a squat
-
-        self.thresholds = thresholds
-        self.bicep_curl_analyzer = BicepCurlAnalyzer(thresholds)
-
-        self.is_curling = False
-        self.curl_start_detected = False
-
-        self.current_exercise = None
-        self.total_reps = 0
-
-        self.analyze_squat_form_callback = analyze_squat_form_callback
-
-        #feedback 
-        self.bicep_curl_feedback_manager = FeedbackManager()
-        self.squat_feedback_manager = FeedbackManager()
-        self.rep_error = False
-
-    def reset_counter(self):
-        self.bicep_curl_state = BicepCurlState.IDLE
-        self.squat_state = SquatState.IDLE
-
-    def process_bicep_curl(self, shoulder, elbow, wrist, hip, bicep_angle, elbow_torso_angle, hip_shoulder_angle):
-        is_start = False
-
-        if self.bicep_curl_state == BicepCurlState.IDLE:
-            if bicep_angle < self.curl_start_threshold:
-                self.bicep_curl_state = BicepCurlState.CURL_START
-                is_start = True
-                self.bicep_curl_feedback_manager.clear_feedback()
-                self.rep_error = False
-
-        elif self.bicep_curl_state == BicepCurlState.CURL_START:
-            if bicep_angle < self.curl_up_threshold:
-                self.bicep_curl_state = BicepCurlState.CURL_UP
-            elif bicep_angle > self.prev_bicep_angle:
-                self.bicep_curl_state = BicepCurlState.IDLE
-
-        elif self.bicep_curl_state == BicepCurlState.CURL_UP:
-            if bicep_angle <= self.prev_bicep_angle:
-                self.bicep_curl_state = BicepCurlState.CURL_HOLD
-
-        elif self.bicep_curl_state == BicepCurlState.CURL_HOLD:
-            if bicep_angle > self.prev_bicep_angle:
-                self.bicep_curl_state = BicepCurlState.CURL_DOWN
-
-        elif self.bicep_curl_state == BicepCurlState.CURL_DOWN:
-            if bicep_angle >= self.curl_down_threshold:
-                self.bicep_curl_state = BicepCurlState.IDLE
-                self.curl_counter += 1
-
-        self.prev_bicep_angle = bicep_angle
-
-        # Analyze curl and add feedback
-        curl_feedback = self.bicep_curl_analyzer.analyze_curl(
-            shoulder, elbow, wrist, hip, bicep_angle, elbow_torso_angle, hip_shoulder_angle, is_start, self.bicep_curl_state
-        )
-        
-        for feedback in curl_feedback:
-            if "Correct form" not in feedback:
-                self.rep_error = True
-                self.bicep_curl_feedback_manager.add_feedback(feedback, FeedbackPriority.HIGH)
-            elif not self.rep_error:
-                self.bicep_curl_feedback_manager.add_feedback(feedback, FeedbackPriority.LOW)
-
-        return self.bicep_curl_state, self.bicep_curl_feedback_manager.get_feedback()
-    
-    def get_bicep_curl_feedback(self):
-        return self.bicep_curl_feedback_manager.get_feedback()
-
-    def get_bicep_curl_state(self):
-        return self.bicep_curl_state.name
-
-    def process_squat(self, knee_angle, back_angle):
-        if self.squat_state == SquatState.IDLE:
-            if knee_angle < self.start_threshold:
-                self.squat_state = SquatState.SQUAT_START
-                self.squat_feedback_manager.clear_feedback()
-            else:
-                # Clear feedback when in IDLE state
-                self.squat_feedback_manager.clear_feedback()
-                return self.squat_state, []  # Return empty feedback list when IDLE
-
-        elif self.squat_state == SquatState.SQUAT_START:
-            if knee_angle < self.squat_threshold:
-                self.squat_state = SquatState.SQUAT_DOWN
-            elif knee_angle > self.prev_knee_angle:
-                self.squat_state = SquatState.IDLE
-                self.squat_feedback_manager.clear_feedback()
-                return self.squat_state, []  # Return empty feedback list when returning to IDLE
-
-        elif self.squat_state == SquatState.SQUAT_DOWN:
-            if knee_angle <= self.prev_knee_angle:
-                self.squat_state = SquatState.SQUAT_HOLD
-                # Generate feedback when reaching the bottom of the squat
-                squat_feedback = self.analyze_squat_form_callback(back_angle, knee_angle)
-                for feedback in squat_feedback:
-                    if "Correct form" not in feedback:
-                        self.squat_feedback_manager.add_feedback(feedback, FeedbackPriority.HIGH)
-                    else:
-                        self.squat_feedback_manager.add_feedback(feedback, FeedbackPriority.LOW)
-
-        elif self.squat_state == SquatState.SQUAT_HOLD:
-            if knee_angle > self.prev_knee_angle:
-                self.squat_state = SquatState.SQUAT_UP
-
-        elif self.squat_state == SquatState.SQUAT_UP:
-            if knee_angle >= self.start_threshold:
-                self.squat_state = SquatState.IDLE
-                self.squat_counter += 1
-                # Generate feedback at the end of the squat
-                squat_feedback = self.analyze_squat_form_callback(back_angle, knee_angle)
-                for feedback in squat_feedback:
-                    if "Correct form" not in feedback:
-                        self.squat_feedback_manager.add_feedback(feedback, FeedbackPriority.HIGH)
-                    else:
-                        self.squat_feedback_manager.add_feedback(feedback, FeedbackPriority.LOW)
-
-        self.prev_knee_angle = knee_angle
-
-        return self.squat_state, self.squat_feedback_manager.get_feedback()
-
-    def get_squat_feedback(self):
-        return self.squat_feedback_manager.get_feedback()
-
-    def get_squat_state(self):
-        return self.squat_state.name
-    
-    def reset_counters(self):
-        self.curl_counter = 0
-        self.squat_counter = 0
-        self.bicep_curl_state = BicepCurlState.IDLE
-        self.squat_state = SquatState.IDLE
-
-    def is_exercise_completed(self, exercise_name, target_reps):
-        if exercise_name.lower() == 'bicep curl' or exercise_name.lower() == 'curl':
-            return self.curl_counter >= target_reps
-        elif exercise_name.lower() == 'squat':
-            return self.squat_counter >= target_reps
-        return False
-
-    def set_total_reps(self, total_reps):
-        self.total_reps = total_reps
-
-class BicepCurlAnalyzer:
-    def __init__(self, thresholds):
-        self.thresholds = thresholds
-        self.start_shoulder_pos = None
-        self.start_hip_pos = None
-        self.start_elbow_pos = None
-        self.start_time = None
-        self.rep_start_time = None
-        self.last_angle = None
-        self.max_angle = 0
-        self.min_angle = 180
-        self.feedback = []
-        self.fully_extended = False
-        self.curled_high_enough = False
-        self.body_swing_threshold = 0.625
-        self.shoulder_movement_threshold = 0.5
-        self.elbow_movement_threshold = 0.5
-        self.curl_completion_threshold = 65 # Minimum angle change for a complete curl
-        self.max_elbow_angle = 0
-        self.start_hip_shoulder_angle = None
-        self.body_swing_angle_threshold = 18  # Adjust this value based on testing
-        self.max_swing_angle = 0
-        self.elbow_angle_buffer = []
-        self.elbow_detection_confidence = 1.0
-        self.confidence_threshold = 0.7
-        self.low_confidence_count = 0
-        self.max_low_confidence_frames = 8
-        self.angle_calculator = AngleCalculator()  
-
-
-    def reset(self):
-        self.start_shoulder_pos = None
-        self.start_hip_pos = None
-        self.start_elbow_pos = None
-        self.start_time = None
-        self.rep_start_time = None
-        self.last_angle = None
-        self.max_angle = 0
-        self.min_angle = 180
-        self.feedback = []
-        self.fully_extended = False
-        self.curled_high_enough = False
-        self.max_elbow_angle = 0
-        self.start_hip_shoulder_angle = None
-        self.max_swing_angle = 0
-
-    def detect_body_swing(self, hip_shoulder_angle):
-        if self.start_hip_shoulder_angle is None or hip_shoulder_angle is None:
-            return False
-        
-        angle_diff = abs(hip_shoulder_angle - self.start_hip_shoulder_angle)
-        self.max_swing_angle = max(self.max_swing_angle, angle_diff)
-        return angle_diff > self.body_swing_angle_threshold
-
-    def is_curl_completed(self):
-        return self.max_angle - self.min_angle > self.curl_completion_threshold
-
-    def calculate_elbow_confidence(self, shoulder, elbow, wrist):
-        # Check if visibility data is available
-        if len(shoulder) > 2 and len(elbow) > 2 and len(wrist) > 2:
-            visibility = min(shoulder[2], elbow[2], wrist[2])
-        else:
-            visibility = 1.0  # Assume full visibility if data is not available
-
-        # Calculate distances
-        shoulder_elbow_dist = self.angle_calculator.findDistance(shoulder[0], shoulder[1], elbow[0], elbow[1])
-        shoulder_wrist_dist = self.angle_calculator.findDistance(shoulder[0], shoulder[1], wrist[0], wrist[1])
-        
-        # Avoid division by zero
-        if shoulder_wrist_dist == 0:
-            distance_confidence = 0
-        else:
-            distance_confidence = 1.0 - (shoulder_elbow_dist / shoulder_wrist_dist)
-
-        return visibility * max(0, min(1, distance_confidence))
-
-    def update_elbow_angle(self, elbow_torso_angle):
-        self.elbow_angle_buffer.append(elbow_torso_angle)
-        if len(self.elbow_angle_buffer) > 5:
-            self.elbow_angle_buffer.pop(0)
-        return sum(self.elbow_angle_buffer) / len(self.elbow_angle_buffer)
-    
-    def analyze_curl(self, shoulder, elbow, wrist, hip, bicep_angle, elbow_torso_angle, hip_shoulder_angle, is_start, current_state):
-        if is_start or self.start_shoulder_pos is None:
-            self.reset()
-            self.start_shoulder_pos = shoulder
-            self.start_hip_pos = hip
-            self.start_elbow_pos = elbow
-            self.start_hip_shoulder_angle = hip_shoulder_angle
-            self.last_angle = bicep_angle
-            return []
-
-        self.feedback = []
-        has_issues = False
-
-        # Check for full extension
-        if bicep_angle > self.thresholds['bicep_curl_not_low_enough']:
-            self.feedback.append("Extend your arm fully at the bottom")
-            has_issues = True
-
-        # Check for full curl
-        if bicep_angle > self.thresholds['bicep_curl_not_high_enough'] and current_state == BicepCurlState.CURL_UP:
-            self.feedback.append("Curl the weight higher")
-            has_issues = True
-
-        # Check elbow movement
-        elbow_movement = ((elbow[0] - self.start_elbow_pos[0])**2 + 
-                        (elbow[1] - self.start_elbow_pos[1])**2)**0.5
-        if elbow_movement > self.thresholds['bicep_curl_elbow_movement']:
-            self.feedback.append("Keep your elbow still")
-            has_issues = True
-
-        # Check for body swinging
-        if self.detect_body_swing(hip_shoulder_angle):
-            swing_severity = "slightly" if self.max_swing_angle <= self.thresholds['bicep_curl_body_swing'] else "excessively"
-            self.feedback.append(f"Your body is {swing_severity} swinging. Keep your body stable.")
-            has_issues = True
-        # Check for excessive elbow movement
-        if elbow_torso_angle is not None:
-            smoothed_elbow_angle = self.update_elbow_angle(elbow_torso_angle)
-            self.max_elbow_angle = max(self.max_elbow_angle, smoothed_elbow_angle)
-            if self.max_elbow_angle > 35 and self.elbow_detection_confidence > self.confidence_threshold:
-                self.feedback.append("Keep your upper arm still, excessive elbow movement")
-                has_issues = True
-            self.low_confidence_count = 0
-        else:
-            self.low_confidence_count += 1
-            if self.low_confidence_count >= self.max_low_confidence_frames:
-                self.feedback.append("Unable to detect elbow movement accurately")
-                self.low_confidence_count = 0
-
-        # Update max and min angles
-        self.max_angle = max(self.max_angle, bicep_angle)
-        self.min_angle = min(self.min_angle, bicep_angle)
-
-        # Check for full rep and reset if necessary
-        if self.last_angle < 90 and bicep_angle > 160:
-            self.max_angle = bicep_angle
-            self.min_angle = bicep_angle
-            self.fully_extended = False
-            self.curled_high_enough = False
-
-        self.last_angle = bicep_angle
-
-        # If no issues were detected and the curl is completed, add positive feedback
-        if not has_issues and self.is_curl_completed():
-            self.feedback.append("Correct form, keep it up")
-
-        return self.feedback  # Always return the feedback list
-    
-class PostureAnalyzer:
-    def __init__(self, fps):
-        self.fps = fps
-        self.bad_frames = 0
-        self.good_frames = 0
-
-    def analyze_posture(self, left_neck_inclination, right_neck_inclination, left_torso_inclination, right_torso_inclination):
-        # Use the worse angle for each measurement
-        neck_inclination = max(left_neck_inclination, right_neck_inclination)
-        torso_inclination = max(left_torso_inclination, right_torso_inclination)
-
-        if neck_inclination < 40 and torso_inclination < 10:
-            self.good_frames += 1
-            self.bad_frames = 0
-            return True
-        else:
-            self.good_frames = 0
-            self.bad_frames += 1
-            return False
-
-    def get_posture_times(self):
-        good_time = (1 / self.fps) * self.good_frames
-        bad_time = (1 / self.fps) * self.bad_frames
-        return good_time, bad_time
-
 class VideoProcessor:
     def __init__(self, visibility_threshold=0.6):
         self.pose_detector = PoseDetector()
-        self.angle_calculator = AngleCalculator()
         self.cap = cv2.VideoCapture(0)
         self.fps = self.cap.get(cv2.CAP_PROP_FPS)
-        self.posture_analyzer = PostureAnalyzer(self.fps)
         self.visibility_threshold = visibility_threshold
         
-        # Define thresholds first
-        self.thresholds = {
-            'squat_too_deep': 68,
-            'squat_not_deep_enough': 91,
-            'squat_forward_bend_too_little': 19,
-            'squat_forward_bend_too_much': 50,
-            'bicep_curl_not_low_enough': 160,
-            'bicep_curl_not_high_enough': 90,
-            'bicep_curl_elbow_movement': 5,
-            'bicep_curl_body_swing': 10
-        }
+        # Define thresholds first; components share the store and read its current snapshot
+        self.threshold_store = ThresholdStore()
         
-        # Initialize components that require thresholds
-        self.bicep_curl_analyzer = BicepCurlAnalyzer(self.thresholds)
-        self.exercise_counter = ExerciseCounter(self.analyze_squat_form, self.thresholds)
+        # All per-frame analysis lives in FrameAnalyzer so it can be replayed without a camera
+        # and reps go to the telemetry store from a background thread
+        self.frame_analyzer = FrameAnalyzer(self.fps, self.threshold_store, visibility_threshold,
+                                            RepTelemetry(self.fps, get_telemetry_writer()))
+        self.angle_calculator = self.frame_analyzer.angle_calculator
+        self.posture_analyzer = self.frame_analyzer.posture_analyzer
+        self.exercise_counter = self.frame_analyzer.exercise_counter
         
-        self.squat_feedback = []
-        self.bicep_curl_feedback = []
         self.current_exercise = None
+        self.recorder = None  # Set by start_recording to capture landmark sessions for calibration
 
         self.exercise_data = {
             'curl_counter': 0,
@@ -544,28 +66,15 @@ class VideoProcessor:
         }
         
     def analyze_squat_form(self, back_angle, knee_angle):
-        feedback = []
-        
-        if knee_angle < self.exercise_counter.start_threshold:
-            if back_angle < self.thresholds['squat_forward_bend_too_little']:
-                feedback.append("Bend forward more")
-            elif back_angle > self.thresholds['squat_forward_bend_too_much']:
-                feedback.append("Forward bending too much")
-            
-            if knee_angle < self.thresholds['squat_too_deep']:
-                feedback.append("Don't squat too deep")
-            elif knee_angle >= self.thresholds['squat_not_deep_enough']:
-                feedback.append("Lower your hips")
-            
-            if not feedback:
-                feedback.append("Correct form")
-        
-        return feedback
+        return self.frame_analyzer.analyze_squat_form(back_angle, knee_angle)
     
+    @property
+    def thresholds(self):
+        return self.threshold_store.current
+
     def update_threshold(self, exercise, feedback_condition, new_threshold):
         threshold_key = f"{exercise}_{feedback_condition}"
-        if threshold_key in self.thresholds:
-            self.thresholds[threshold_key] = new_threshold
+        self.threshold_store.update({threshold_key: new_threshold})
     
 
     def process_frame(self, frame, current_exercise):
@@ -573,6 +82,8 @@ class VideoProcessor:
         
         if results.pose_landmarks:
             landmarks = results.pose_landmarks.landmark
+            if self.recorder is not None:
+                self.recorder.add_frame(landmarks)
             landmark_data = self.process_landmarks(frame, landmarks, current_exercise)
             if landmark_data:
                 self.exercise_data.update(landmark_data)
@@ -582,128 +93,24 @@ class VideoProcessor:
         return frame, self.exercise_data
 
     def process_landmarks(self, frame, landmarks, current_exercise):
-        mp_pose = self.pose_detector.mp_pose
-        h, w, _ = frame.shape
-        
         # Extract coordinates and visibility for both left and right sides
-        left_shoulder = [landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].x, 
-                        landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].y,
-                        landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].visibility]
-        right_shoulder = [landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].x, 
-                        landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].y,
-                        landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].visibility]
-        left_elbow = [landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value].x, 
-                    landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value].y,
-                    landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value].visibility]
-        right_elbow = [landmarks[mp_pose.PoseLandmark.RIGHT_ELBOW.value].x, 
-                    landmarks[mp_pose.PoseLandmark.RIGHT_ELBOW.value].y,
-                    landmarks[mp_pose.PoseLandmark.RIGHT_ELBOW.value].visibility]
-        left_wrist = [landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value].x, 
-                    landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value].y,
-                    landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value].visibility]
-        right_wrist = [landmarks[mp_pose.PoseLandmark.RIGHT_WRIST.value].x, 
-                    landmarks[mp_pose.PoseLandmark.RIGHT_WRIST.value].y,
-                    landmarks[mp_pose.PoseLandmark.RIGHT_WRIST.value].visibility]
-        left_hip = [landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].x, 
-                    landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].y,
-                    landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].visibility]
-        right_hip = [landmarks[mp_pose.PoseLandmark.RIGHT_HIP.value].x, 
-                    landmarks[mp_pose.PoseLandmark.RIGHT_HIP.value].y,
-                    landmarks[mp_pose.PoseLandmark.RIGHT_HIP.value].visibility]
-        left_knee = [landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].x, 
-                    landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].y,
-                    landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].visibility]
-        right_knee = [landmarks[mp_pose.PoseLandmark.RIGHT_KNEE.value].x, 
-                    landmarks[mp_pose.PoseLandmark.RIGHT_KNEE.value].y,
-                    landmarks[mp_pose.PoseLandmark.RIGHT_KNEE.value].visibility]
-        left_ankle = [landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value].x, 
-                    landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value].y,
-                    landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value].visibility]
-        right_ankle = [landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE.value].x, 
-                    landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE.value].y,
-                    landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE.value].visibility]
-        left_ear = [landmarks[mp_pose.PoseLandmark.LEFT_EAR.value].x, 
-                    landmarks[mp_pose.PoseLandmark.LEFT_EAR.value].y,
-                    landmarks[mp_pose.PoseLandmark.LEFT_EAR.value].visibility]
-        right_ear = [landmarks[mp_pose.PoseLandmark.RIGHT_EAR.value].x, 
-                    landmarks[mp_pose.PoseLandmark.RIGHT_EAR.value].y,
-                    landmarks[mp_pose.PoseLandmark.RIGHT_EAR.value].visibility]
+        points = {name: [landmarks[index].x, landmarks[index].y, landmarks[index].visibility]
+                  for name, index in POSE_LANDMARKS.items()}
 
-        # Calculate angles for both sides
-        offset = self.angle_calculator.findDistance(left_shoulder[0], left_shoulder[1], right_shoulder[0], right_shoulder[1])
-        left_neck_inclination = self.angle_calculator.findAngle(left_shoulder[0], left_shoulder[1], left_ear[0], left_ear[1])
-        right_neck_inclination = self.angle_calculator.findAngle(right_shoulder[0], right_shoulder[1], right_ear[0], right_ear[1])
-        left_torso_inclination = self.angle_calculator.findAngle(left_hip[0], left_hip[1], left_shoulder[0], left_shoulder[1])
-        right_torso_inclination = self.angle_calculator.findAngle(right_hip[0], right_hip[1], right_shoulder[0], right_shoulder[1])
-        
-        # Calculate hip-to-shoulder angle
-        left_hip_shoulder_angle = self.angle_calculator.calculate_hip_shoulder_angle(left_hip, left_shoulder, self.visibility_threshold)
-        right_hip_shoulder_angle = self.angle_calculator.calculate_hip_shoulder_angle(right_hip, right_shoulder, self.visibility_threshold)
-
-        # Use the angle from the side that's more visible
-        hip_shoulder_angle = left_hip_shoulder_angle if left_hip_shoulder_angle is not None else right_hip_shoulder_angle
-
-        # Calculate bicep curl angles
-        left_bicep_angle = self.angle_calculator.angle_deg(left_shoulder[:2], left_elbow[:2], left_wrist[:2])
-        right_bicep_angle = self.angle_calculator.angle_deg(right_shoulder[:2], right_elbow[:2], right_wrist[:2])
-
-        # Calculate squat angles for both legs
-        left_squat_angle = self.angle_calculator.angle_deg(left_hip[:2], left_knee[:2], left_ankle[:2])
-        right_squat_angle = self.angle_calculator.angle_deg(right_hip[:2], right_knee[:2], right_ankle[:2])
-
-        # Calculate elbow-torso angles
-        left_elbow_torso_angle, right_elbow_torso_angle, avg_elbow_torso_angle, view = self.angle_calculator.calculate_elbow_torso_angle(
-                left_hip, left_shoulder, left_elbow,
-                right_hip, right_shoulder, right_elbow,
-                visibility_threshold=self.visibility_threshold
-            )
-        
-        # Calculate knee angle and back angle
-        knee_angle = (left_squat_angle + right_squat_angle) / 2
-        back_angle = (self.angle_calculator.angle_deg(left_hip[:2], left_shoulder[:2], [left_shoulder[0], left_hip[1]]) +
-                    self.angle_calculator.angle_deg(right_hip[:2], right_shoulder[:2], [right_shoulder[0], right_hip[1]])) / 2
-
-        # Process exercises
-        if current_exercise:
-            if current_exercise['name'].lower() in ['bicep curl', 'curl']:
-                if left_bicep_angle < right_bicep_angle:
-                    self.bicep_curl_state, self.bicep_curl_feedback = self.exercise_counter.process_bicep_curl(
-                        left_shoulder, left_elbow, left_wrist, left_hip, left_bicep_angle, left_elbow_torso_angle, hip_shoulder_angle
-                    )
-                else:
-                    self.bicep_curl_state, self.bicep_curl_feedback = self.exercise_counter.process_bicep_curl(
-                        right_shoulder, right_elbow, right_wrist, right_hip, right_bicep_angle, right_elbow_torso_angle, hip_shoulder_angle
-                    )
-            elif current_exercise['name'].lower() == 'squat':
-                self.squat_state, self.squat_feedback = self.exercise_counter.process_squat(knee_angle, back_angle)
-
-
-
-        # Analyze posture
-        good_posture = self.posture_analyzer.analyze_posture(
-            left_neck_inclination, right_neck_inclination, 
-            left_torso_inclination, right_torso_inclination
-        )
-        # Analyze squat form
-        self.squat_feedback = self.analyze_squat_form(back_angle, knee_angle)
+        angles = self.frame_analyzer.analyze(points, current_exercise)
 
         # Visualize
-        self.visualize_posture(frame, left_shoulder, right_shoulder, left_ear, right_ear, left_hip, right_hip, 
-                            left_neck_inclination, right_neck_inclination, 
-                            left_torso_inclination, right_torso_inclination, good_posture, offset)
-        self.visualize_angles(frame, left_elbow, right_elbow, left_knee, right_knee, 
-                            left_bicep_angle, right_bicep_angle, left_squat_angle, right_squat_angle, back_angle, knee_angle)
+        self.visualize_posture(frame, points['left_shoulder'], points['right_shoulder'], points['left_ear'],
+                            points['right_ear'], points['left_hip'], points['right_hip'],
+                            angles['left_neck_inclination'], angles['right_neck_inclination'],
+                            angles['left_torso_inclination'], angles['right_torso_inclination'],
+                            angles['good_posture'], angles['offset'])
+        self.visualize_angles(frame, points['left_elbow'], points['right_elbow'], points['left_knee'], points['right_knee'],
+                            angles['left_bicep_angle'], angles['right_bicep_angle'], angles['left_squat_angle'],
+                            angles['right_squat_angle'], angles['back_angle'], angles['knee_angle'])
 
         # Return processed data
-        return {
-            'curl_counter': self.exercise_counter.curl_counter,
-            'squat_counter': self.exercise_counter.squat_counter,
-            'curl_state': self.exercise_counter.bicep_curl_state.name if self.exercise_counter.bicep_curl_state else '',
-            'squat_state': self.exercise_counter.squat_state.name if self.exercise_counter.squat_state else '',
-            'bicep_curl_feedback': self.exercise_counter.get_bicep_curl_feedback(),
-            'squat_feedback': self.exercise_counter.get_squat_feedback(),
-            'total_reps': self.exercise_counter.total_reps
-        }
+        return self.frame_analyzer.exercise_data()
 
     def visualize_posture(self, frame, left_shoulder, right_shoulder, left_ear, right_ear, left_hip, right_hip,
                           left_neck_inclination, right_neck_inclination,
@@ -763,6 +170,15 @@ class VideoProcessor:
                     (10, frame.shape[0] - 30), 
                     cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
     
+    def start_recording(self, exercise):
+        self.recorder = LandmarkRecorder(exercise, self.fps)
+
+    def stop_recording(self, path):
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None and recorder.frames:
+            recorder.save(path)
+        return recorder
+
     def set_current_exercise(self, exercise):
             self.current_exercise = exercise
             self.exercise_counter.set_total_reps(exercise['reps'] * exercise['sets'])
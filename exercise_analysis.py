@@ -0,0 +1,645 @@
+import numpy as np
+import math as m
+from enum import Enum
+from collections import deque
+import heapq
+from feedback_codes import FeedbackCode, is_mistake
+from threshold_store import ThresholdStore
+
+# Per-frame exercise analysis, kept free of camera and MediaPipe dependencies so it
+# can be replayed from recorded or synthetic landmarks (see replay_harness.py)
+
+# MediaPipe Pose landmark indices used by the analysis
+POSE_LANDMARKS = {
+    'left_ear': 7,
+    'right_ear': 8,
+    'left_shoulder': 11,
+    'right_shoulder': 12,
+    'left_elbow': 13,
+    'right_elbow': 14,
+    'left_wrist': 15,
+    'right_wrist': 16,
+    'left_hip': 23,
+    'right_hip': 24,
+    'left_knee': 25,
+    'right_knee': 26,
+    'left_ankle': 27,
+    'right_ankle': 28
+}
+
+class SquatState(Enum):
+    IDLE = 0
+    SQUAT_START = 1
+    SQUAT_DOWN = 2
+    SQUAT_HOLD = 3
+    SQUAT_UP = 4
+
+class BicepCurlState(Enum):
+    IDLE = 0
+    CURL_START = 1
+    CURL_UP = 2
+    CURL_HOLD = 3  
+    CURL_DOWN = 4
+
+class FeedbackPriority(Enum):
+    LOW = 1
+    MEDIUM = 2
+    HIGH = 3
+
+class FeedbackManager:
+    def __init__(self, window_size=5):
+        self.feedback_window = deque(maxlen=window_size)
+        self.current_feedback = []
+        self.priority_queue = []
+
+    def add_feedback(self, feedback, priority):
+        heapq.heappush(self.priority_queue, (-priority.value, feedback))
+        self.feedback_window.append((feedback, priority))
+        self._process_feedback()
+
+    def _process_feedback(self):
+        feedback_count = {}
+        for feedback, priority in self.feedback_window:
+            if feedback in feedback_count:
+                feedback_count[feedback] += 1
+            else:
+                feedback_count[feedback] = 1
+
+        threshold = len(self.feedback_window) // 2
+        self.current_feedback = [fb for fb, count in feedback_count.items() if count > threshold]
+
+    def get_feedback(self):
+        if self.priority_queue:
+            _, top_feedback = self.priority_queue[0]
+            return [top_feedback]
+        return []
+
+    def clear_feedback(self):
+        self.feedback_window.clear()
+        self.current_feedback = []
+        self.priority_queue = []
+    
+class AngleCalculator:
+    @staticmethod
+    def calculate_angle(a, b, c):
+        a = np.array(a)
+        b = np.array(b)
+        c = np.array(c)
+        
+        radians = np.arctan2(c[1] - b[1], c[0] - b[0]) - np.arctan2(a[1] - b[1], a[0] - b[0])
+        angle = np.abs(radians * 180.0 / np.pi)
+        
+        return angle if angle <= 180.0 else 360 - angle
+
+
+    @staticmethod
+    def calculate_vertical_angle(point1, point2):
+        x1, y1 = point1
+        x2, y2 = point2
+        dx = x2 - x1
+        dy = y2 - y1
+        angle = np.abs(np.arctan2(dx, -dy) * 180.0 / np.pi)
+        return angle        
+    
+    @staticmethod
+    def findDistance(x1, y1, x2, y2):
+        dist = m.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+        return dist
+
+    @staticmethod
+    def findAngle(x1, y1, x2, y2):
+        theta = m.acos((y2 - y1) * (-y1) / (m.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2) * y1))
+        degree = int(180 / m.pi) * theta
+        return degree
+    
+    @staticmethod
+    def angle_deg(p1, pref, p2):
+            # Ensure all points are 2D
+            p1 = np.array(p1[:2])
+            pref = np.array(pref[:2])
+            p2 = np.array(p2[:2])
+            
+            p1ref = p1 - pref
+            p2ref = p2 - pref
+            
+            dot_product = np.dot(p1ref, p2ref)
+            magnitude_p1ref = np.linalg.norm(p1ref)
+            magnitude_p2ref = np.linalg.norm(p2ref)
+            
+            cos_theta = dot_product / (magnitude_p1ref * magnitude_p2ref)
+            angle_rad = np.arccos(np.clip(cos_theta, -1.0, 1.0))
+            angle_deg = np.degrees(angle_rad)
+            
+            return angle_deg
+    
+    @staticmethod
+    def calculate_elbow_torso_angle(left_hip, left_shoulder, left_elbow, 
+                                    right_hip, right_shoulder, right_elbow, 
+                                    visibility_threshold=0.6):
+        def is_visible(points):
+            return all(point[2] > visibility_threshold for point in points)
+
+        left_visible = is_visible([left_hip, left_shoulder, left_elbow])
+        right_visible = is_visible([right_hip, right_shoulder, right_elbow])
+
+        if left_visible and right_visible:
+            # Front view - calculate both angles
+            left_angle = AngleCalculator.angle_deg(left_hip, left_shoulder, left_elbow)
+            right_angle = AngleCalculator.angle_deg(right_hip, right_shoulder, right_elbow)
+            return left_angle, right_angle, (left_angle + right_angle) / 2, "front"
+        elif left_visible:
+            # Left side view
+            left_angle = AngleCalculator.angle_deg(left_hip, left_shoulder, left_elbow)
+            return left_angle, None, left_angle, "left_side"
+        elif right_visible:
+            # Right side view
+            right_angle = AngleCalculator.angle_deg(right_hip, right_shoulder, right_elbow)
+            return None, right_angle, right_angle, "right_side"
+        else:
+            # No clear view
+            return None, None, None, "unclear"
+        
+    @staticmethod
+    def calculate_hip_shoulder_angle(hip, shoulder, visibility_threshold=0.6):
+        if hip[2] > visibility_threshold and shoulder[2] > visibility_threshold:
+            return AngleCalculator.findAngle(hip[0], hip[1], shoulder[0], shoulder[1])
+        else:
+            return None
+
+class ExerciseCounter:
+    def __init__(self, analyze_squat_form_callback, threshold_store):
+        self.curl_counter = 0
+        self.bicep_curl_state = BicepCurlState.IDLE
+        self.prev_bicep_angle = 180
+        self.curl_start_threshold = 160
+        self.curl_up_threshold = 90
+        self.curl_down_threshold = 150
+        self.curl_feedback = []
+
+        self.squat_counter = 0  
+        self.squat_state = SquatState.IDLE
+        self.squat_feedback = []
+        self.prev_knee_angle = 180  # Initialize with a straight leg angle
+        self.squat_threshold = 80  # Adjust this value based on your needs
+        self.start_threshold = 160  # Threshold to detect the start of a squat
+
+        self.threshold_store = threshold_store
+        self.bicep_curl_analyzer = BicepCurlAnalyzer(threshold_store)
+
+        self.is_curling = False
+        self.curl_start_detected = False
+
+        self.current_exercise = None
+        self.total_reps = 0
+
+        self.analyze_squat_form_callback = analyze_squat_form_callback
+
+        #feedback 
+        self.bicep_curl_feedback_manager = FeedbackManager()
+        self.squat_feedback_manager = FeedbackManager()
+        self.rep_error = False
+
+    def reset_counter(self):
+        self.bicep_curl_state = BicepCurlState.IDLE
+        self.squat_state = SquatState.IDLE
+
+    def process_bicep_curl(self, shoulder, elbow, wrist, hip, bicep_angle, elbow_torso_angle, hip_shoulder_angle):
+        is_start = False
+
+        if self.bicep_curl_state == BicepCurlState.IDLE:
+            if bicep_angle < self.curl_start_threshold:
+                self.bicep_curl_state = BicepCurlState.CURL_START
+                is_start = True
+                self.bicep_curl_feedback_manager.clear_feedback()
+                self.rep_error = False
+
+        elif self.bicep_curl_state == BicepCurlState.CURL_START:
+            if bicep_angle < self.curl_up_threshold:
+                self.bicep_curl_state = BicepCurlState.CURL_UP
+            elif bicep_angle > self.prev_bicep_angle:
+                self.bicep_curl_state = BicepCurlState.IDLE
+
+        elif self.bicep_curl_state == BicepCurlState.CURL_UP:
+            if bicep_angle <= self.prev_bicep_angle:
+                self.bicep_curl_state = BicepCurlState.CURL_HOLD
+
+        elif self.bicep_curl_state == BicepCurlState.CURL_HOLD:
+            if bicep_angle > self.prev_bicep_angle:
+                self.bicep_curl_state = BicepCurlState.CURL_DOWN
+
+        elif self.bicep_curl_state == BicepCurlState.CURL_DOWN:
+            if bicep_angle >= self.curl_down_threshold:
+                self.bicep_curl_state = BicepCurlState.IDLE
+                self.curl_counter += 1
+
+        self.prev_bicep_angle = bicep_angle
+
+        # Analyze curl and add feedback
+        curl_feedback = self.bicep_curl_analyzer.analyze_curl(
+            shoulder, elbow, wrist, hip, bicep_angle, elbow_torso_angle, hip_shoulder_angle, is_start, self.bicep_curl_state
+        )
+        
+        for feedback in curl_feedback:
+            if is_mistake(feedback):
+                self.rep_error = True
+                self.bicep_curl_feedback_manager.add_feedback(feedback, FeedbackPriority.HIGH)
+            elif not self.rep_error:
+                self.bicep_curl_feedback_manager.add_feedback(feedback, FeedbackPriority.LOW)
+
+        return self.bicep_curl_state, self.bicep_curl_feedback_manager.get_feedback()
+    
+    def get_bicep_curl_feedback(self):
+        return self.bicep_curl_feedback_manager.get_feedback()
+
+    def get_bicep_curl_state(self):
+        return self.bicep_curl_state.name
+
+    def process_squat(self, knee_angle, back_angle):
+        if self.squat_state == SquatState.IDLE:
+            if knee_angle < self.start_threshold:
+                self.squat_state = SquatState.SQUAT_START
+                self.squat_feedback_manager.clear_feedback()
+            else:
+                # Clear feedback when in IDLE state
+                self.squat_feedback_manager.clear_feedback()
+                return self.squat_state, []  # Return empty feedback list when IDLE
+
+        elif self.squat_state == SquatState.SQUAT_START:
+            if knee_angle < self.squat_threshold:
+                self.squat_state = SquatState.SQUAT_DOWN
+            elif knee_angle > self.prev_knee_angle:
+                self.squat_state = SquatState.IDLE
+                self.squat_feedback_manager.clear_feedback()
+                return self.squat_state, []  # Return empty feedback list when returning to IDLE
+
+        elif self.squat_state == SquatState.SQUAT_DOWN:
+            if knee_angle <= self.prev_knee_angle:
+                self.squat_state = SquatState.SQUAT_HOLD
+                # Generate feedback when reaching the bottom of the squat
+                squat_feedback = self.analyze_squat_form_callback(back_angle, knee_angle)
+                for feedback in squat_feedback:
+                    if is_mistake(feedback):
+                        self.squat_feedback_manager.add_feedback(feedback, FeedbackPriority.HIGH)
+                    else:
+                        self.squat_feedback_manager.add_feedback(feedback, FeedbackPriority.LOW)
+
+        elif self.squat_state == SquatState.SQUAT_HOLD:
+            if knee_angle > self.prev_knee_angle:
+                self.squat_state = SquatState.SQUAT_UP
+
+        elif self.squat_state == SquatState.SQUAT_UP:
+            if knee_angle >= self.start_threshold:
+                self.squat_state = SquatState.IDLE
+                self.squat_counter += 1
+                # Generate feedback at the end of the squat
+                squat_feedback = self.analyze_squat_form_callback(back_angle, knee_angle)
+                for feedback in squat_feedback:
+                    if is_mistake(feedback):
+                        self.squat_feedback_manager.add_feedback(feedback, FeedbackPriority.HIGH)
+                    else:
+                        self.squat_feedback_manager.add_feedback(feedback, FeedbackPriority.LOW)
+
+        self.prev_knee_angle = knee_angle
+
+        return self.squat_state, self.squat_feedback_manager.get_feedback()
+
+    def get_squat_feedback(self):
+        return self.squat_feedback_manager.get_feedback()
+
+    def get_squat_state(self):
+        return self.squat_state.name
+    
+    def reset_counters(self):
+        self.curl_counter = 0
+        self.squat_counter = 0
+        self.bicep_curl_state = BicepCurlState.IDLE
+        self.squat_state = SquatState.IDLE
+
+    def is_exercise_completed(self, exercise_name, target_reps):
+        if exercise_name.lower() == 'bicep curl' or exercise_name.lower() == 'curl':
+            return self.curl_counter >= target_reps
+        elif exercise_name.lower() == 'squat':
+            return self.squat_counter >= target_reps
+        return False
+
+    def set_total_reps(self, total_reps):
+        self.total_reps = total_reps
+
+class BicepCurlAnalyzer:
+    def __init__(self, threshold_store):
+        self.threshold_store = threshold_store
+        self.start_shoulder_pos = None
+        self.start_hip_pos = None
+        self.start_elbow_pos = None
+        self.start_time = None
+        self.rep_start_time = None
+        self.last_angle = None
+        self.max_angle = 0
+        self.min_angle = 180
+        # Reused every frame so the hot path does not allocate a new list
+        self.feedback = []
+        self.fully_extended = False
+        self.curled_high_enough = False
+        self.body_swing_threshold = 0.625
+        self.shoulder_movement_threshold = 0.5
+        self.elbow_movement_threshold = 0.5
+        self.curl_completion_threshold = 65 # Minimum angle change for a complete curl
+        self.max_elbow_angle = 0
+        self.start_hip_shoulder_angle = None
+        self.body_swing_angle_threshold = 18  # Adjust this value based on testing
+        self.max_swing_angle = 0
+        self.elbow_angle_buffer = []
+        self.elbow_detection_confidence = 1.0
+        self.confidence_threshold = 0.7
+        self.low_confidence_count = 0
+        self.max_low_confidence_frames = 8
+        self.angle_calculator = AngleCalculator()  
+
+
+    def reset(self):
+        self.start_shoulder_pos = None
+        self.start_hip_pos = None
+        self.start_elbow_pos = None
+        self.start_time = None
+        self.rep_start_time = None
+        self.last_angle = None
+        self.max_angle = 0
+        self.min_angle = 180
+        self.feedback.clear()
+        self.fully_extended = False
+        self.curled_high_enough = False
+        self.max_elbow_angle = 0
+        self.start_hip_shoulder_angle = None
+        self.max_swing_angle = 0
+
+    def detect_body_swing(self, hip_shoulder_angle):
+        if self.start_hip_shoulder_angle is None or hip_shoulder_angle is None:
+            return False
+        
+        angle_diff = abs(hip_shoulder_angle - self.start_hip_shoulder_angle)
+        self.max_swing_angle = max(self.max_swing_angle, angle_diff)
+        return angle_diff > self.body_swing_angle_threshold
+
+    def is_curl_completed(self):
+        return self.max_angle - self.min_angle > self.curl_completion_threshold
+
+    def calculate_elbow_confidence(self, shoulder, elbow, wrist):
+        # Check if visibility data is available
+        if len(shoulder) > 2 and len(elbow) > 2 and len(wrist) > 2:
+            visibility = min(shoulder[2], elbow[2], wrist[2])
+        else:
+            visibility = 1.0  # Assume full visibility if data is not available
+
+        # Calculate distances
+        shoulder_elbow_dist = self.angle_calculator.findDistance(shoulder[0], shoulder[1], elbow[0], elbow[1])
+        shoulder_wrist_dist = self.angle_calculator.findDistance(shoulder[0], shoulder[1], wrist[0], wrist[1])
+        
+        # Avoid division by zero
+        if shoulder_wrist_dist == 0:
+            distance_confidence = 0
+        else:
+            distance_confidence = 1.0 - (shoulder_elbow_dist / shoulder_wrist_dist)
+
+        return visibility * max(0, min(1, distance_confidence))
+
+    def update_elbow_angle(self, elbow_torso_angle):
+        self.elbow_angle_buffer.append(elbow_torso_angle)
+        if len(self.elbow_angle_buffer) > 5:
+            self.elbow_angle_buffer.pop(0)
+        return sum(self.elbow_angle_buffer) / len(self.elbow_angle_buffer)
+    
+    def analyze_curl(self, shoulder, elbow, wrist, hip, bicep_angle, elbow_torso_angle, hip_shoulder_angle, is_start, current_state):
+        if is_start or self.start_shoulder_pos is None:
+            self.reset()
+            self.start_shoulder_pos = shoulder
+            self.start_hip_pos = hip
+            self.start_elbow_pos = elbow
+            self.start_hip_shoulder_angle = hip_shoulder_angle
+            self.last_angle = bicep_angle
+            return self.feedback
+
+        self.feedback.clear()
+        has_issues = False
+        thresholds = self.threshold_store.current  # One consistent snapshot for the whole frame
+
+        # Check for full extension
+        if bicep_angle > thresholds['bicep_curl_not_low_enough']:
+            self.feedback.append(FeedbackCode.CURL_EXTEND_ARM)
+            has_issues = True
+
+        # Check for full curl
+        if bicep_angle > thresholds['bicep_curl_not_high_enough'] and current_state == BicepCurlState.CURL_UP:
+            self.feedback.append(FeedbackCode.CURL_HIGHER)
+            has_issues = True
+
+        # Check elbow movement
+        elbow_movement = ((elbow[0] - self.start_elbow_pos[0])**2 + 
+                        (elbow[1] - self.start_elbow_pos[1])**2)**0.5
+        if elbow_movement > thresholds['bicep_curl_elbow_movement']:
+            self.feedback.append(FeedbackCode.CURL_ELBOW_STILL)
+            has_issues = True
+
+        # Check for body swinging
+        if self.detect_body_swing(hip_shoulder_angle):
+            if self.max_swing_angle <= thresholds['bicep_curl_body_swing']:
+                self.feedback.append(FeedbackCode.CURL_BODY_SWING_SLIGHT)
+            else:
+                self.feedback.append(FeedbackCode.CURL_BODY_SWING_EXCESSIVE)
+            has_issues = True
+        # Check for excessive elbow movement
+        if elbow_torso_angle is not None:
+            smoothed_elbow_angle = self.update_elbow_angle(elbow_torso_angle)
+            self.max_elbow_angle = max(self.max_elbow_angle, smoothed_elbow_angle)
+            if self.max_elbow_angle > 35 and self.elbow_detection_confidence > self.confidence_threshold:
+                self.feedback.append(FeedbackCode.CURL_UPPER_ARM_STILL)
+                has_issues = True
+            self.low_confidence_count = 0
+        else:
+            self.low_confidence_count += 1
+            if self.low_confidence_count >= self.max_low_confidence_frames:
+                self.feedback.append(FeedbackCode.CURL_ELBOW_UNDETECTED)
+                self.low_confidence_count = 0
+
+        # Update max and min angles
+        self.max_angle = max(self.max_angle, bicep_angle)
+        self.min_angle = min(self.min_angle, bicep_angle)
+
+        # Check for full rep and reset if necessary
+        if self.last_angle < 90 and bicep_angle > 160:
+            self.max_angle = bicep_angle
+            self.min_angle = bicep_angle
+            self.fully_extended = False
+            self.curled_high_enough = False
+
+        self.last_angle = bicep_angle
+
+        # If no issues were detected and the curl is completed, add positive feedback
+        if not has_issues and self.is_curl_completed():
+            self.feedback.append(FeedbackCode.CURL_CORRECT_FORM)
+
+        return self.feedback  # Always return the feedback list
+    
+class PostureAnalyzer:
+    def __init__(self, fps):
+        self.fps = fps
+        self.bad_frames = 0
+        self.good_frames = 0
+
+    def analyze_posture(self, left_neck_inclination, right_neck_inclination, left_torso_inclination, right_torso_inclination):
+        # Use the worse angle for each measurement
+        neck_inclination = max(left_neck_inclination, right_neck_inclination)
+        torso_inclination = max(left_torso_inclination, right_torso_inclination)
+
+        if neck_inclination < 40 and torso_inclination < 10:
+            self.good_frames += 1
+            self.bad_frames = 0
+            return True
+        else:
+            self.good_frames = 0
+            self.bad_frames += 1
+            return False
+
+    def get_posture_times(self):
+        good_time = (1 / self.fps) * self.good_frames
+        bad_time = (1 / self.fps) * self.bad_frames
+        return good_time, bad_time
+
+
+def analyze_squat_form(thresholds, back_angle, knee_angle, start_threshold, feedback):
+    # Fills and returns `feedback`, so callers can reuse one list across frames
+    feedback.clear()
+
+    if knee_angle < start_threshold:
+        if back_angle < thresholds['squat_forward_bend_too_little']:
+            feedback.append(FeedbackCode.SQUAT_BEND_FORWARD_MORE)
+        elif back_angle > thresholds['squat_forward_bend_too_much']:
+            feedback.append(FeedbackCode.SQUAT_FORWARD_BEND_TOO_MUCH)
+
+        if knee_angle < thresholds['squat_too_deep']:
+            feedback.append(FeedbackCode.SQUAT_TOO_DEEP)
+        elif knee_angle >= thresholds['squat_not_deep_enough']:
+            feedback.append(FeedbackCode.SQUAT_LOWER_HIPS)
+
+        if not feedback:
+            feedback.append(FeedbackCode.SQUAT_CORRECT_FORM)
+
+    return feedback
+
+
+class FrameAnalyzer:
+    # Everything VideoProcessor does with one frame of landmarks, minus drawing
+    def __init__(self, fps, threshold_store=None, visibility_threshold=0.6, telemetry=None):
+        self.angle_calculator = AngleCalculator()
+        self.posture_analyzer = PostureAnalyzer(fps)
+        self.threshold_store = threshold_store if threshold_store is not None else ThresholdStore()
+        self.visibility_threshold = visibility_threshold
+        self.exercise_counter = ExerciseCounter(self.analyze_squat_form, self.threshold_store)
+
+        self.squat_state = None
+        self.squat_feedback = []
+        self.bicep_curl_state = None
+        self.bicep_curl_feedback = []
+        self.squat_form_feedback = []  # Reused by analyze_squat_form on every frame
+        self.telemetry = telemetry  # Optional RepTelemetry that turns frames into per-rep records
+
+    def analyze_squat_form(self, back_angle, knee_angle):
+        return analyze_squat_form(self.threshold_store.current, back_angle, knee_angle,
+                                  self.exercise_counter.start_threshold, self.squat_form_feedback)
+
+    def analyze(self, points, current_exercise):
+        # points maps each POSE_LANDMARKS name to [x, y, visibility]
+        calc = self.angle_calculator
+        left_shoulder, right_shoulder = points['left_shoulder'], points['right_shoulder']
+        left_elbow, right_elbow = points['left_elbow'], points['right_elbow']
+        left_wrist, right_wrist = points['left_wrist'], points['right_wrist']
+        left_hip, right_hip = points['left_hip'], points['right_hip']
+        left_knee, right_knee = points['left_knee'], points['right_knee']
+        left_ankle, right_ankle = points['left_ankle'], points['right_ankle']
+        left_ear, right_ear = points['left_ear'], points['right_ear']
+
+        # Calculate angles for both sides
+        offset = calc.findDistance(left_shoulder[0], left_shoulder[1], right_shoulder[0], right_shoulder[1])
+        left_neck_inclination = calc.findAngle(left_shoulder[0], left_shoulder[1], left_ear[0], left_ear[1])
+        right_neck_inclination = calc.findAngle(right_shoulder[0], right_shoulder[1], right_ear[0], right_ear[1])
+        left_torso_inclination = calc.findAngle(left_hip[0], left_hip[1], left_shoulder[0], left_shoulder[1])
+        right_torso_inclination = calc.findAngle(right_hip[0], right_hip[1], right_shoulder[0], right_shoulder[1])
+
+        # Calculate hip-to-shoulder angle
+        left_hip_shoulder_angle = calc.calculate_hip_shoulder_angle(left_hip, left_shoulder, self.visibility_threshold)
+        right_hip_shoulder_angle = calc.calculate_hip_shoulder_angle(right_hip, right_shoulder, self.visibility_threshold)
+
+        # Use the angle from the side that's more visible
+        hip_shoulder_angle = left_hip_shoulder_angle if left_hip_shoulder_angle is not None else right_hip_shoulder_angle
+
+        # Calculate bicep curl angles
+        left_bicep_angle = calc.angle_deg(left_shoulder[:2], left_elbow[:2], left_wrist[:2])
+        right_bicep_angle = calc.angle_deg(right_shoulder[:2], right_elbow[:2], right_wrist[:2])
+
+        # Calculate squat angles for both legs
+        left_squat_angle = calc.angle_deg(left_hip[:2], left_knee[:2], left_ankle[:2])
+        right_squat_angle = calc.angle_deg(right_hip[:2], right_knee[:2], right_ankle[:2])
+
+        # Calculate elbow-torso angles
+        left_elbow_torso_angle, right_elbow_torso_angle, avg_elbow_torso_angle, view = calc.calculate_elbow_torso_angle(
+                left_hip, left_shoulder, left_elbow,
+                right_hip, right_shoulder, right_elbow,
+                visibility_threshold=self.visibility_threshold
+            )
+
+        # Calculate knee angle and back angle
+        knee_angle = (left_squat_angle + right_squat_angle) / 2
+        back_angle = (calc.angle_deg(left_hip[:2], left_shoulder[:2], [left_shoulder[0], left_hip[1]]) +
+                      calc.angle_deg(right_hip[:2], right_shoulder[:2], [right_shoulder[0], right_hip[1]])) / 2
+
+        # Process exercises
+        if current_exercise:
+            if current_exercise['name'].lower() in ['bicep curl', 'curl']:
+                if left_bicep_angle < right_bicep_angle:
+                    self.bicep_curl_state, self.bicep_curl_feedback = self.exercise_counter.process_bicep_curl(
+                        left_shoulder, left_elbow, left_wrist, left_hip, left_bicep_angle, left_elbow_torso_angle, hip_shoulder_angle
+                    )
+                else:
+                    self.bicep_curl_state, self.bicep_curl_feedback = self.exercise_counter.process_bicep_curl(
+                        right_shoulder, right_elbow, right_wrist, right_hip, right_bicep_angle, right_elbow_torso_angle, hip_shoulder_angle
+                    )
+            elif current_exercise['name'].lower() == 'squat':
+                self.squat_state, self.squat_feedback = self.exercise_counter.process_squat(knee_angle, back_angle)
+
+        # Analyze posture
+        good_posture = self.posture_analyzer.analyze_posture(
+            left_neck_inclination, right_neck_inclination,
+            left_torso_inclination, right_torso_inclination
+        )
+        # Analyze squat form
+        self.squat_feedback = self.analyze_squat_form(back_angle, knee_angle)
+
+        angles = {
+            'offset': offset,
+            'left_neck_inclination': left_neck_inclination,
+            'right_neck_inclination': right_neck_inclination,
+            'left_torso_inclination': left_torso_inclination,
+            'right_torso_inclination': right_torso_inclination,
+            'left_bicep_angle': left_bicep_angle,
+            'right_bicep_angle': right_bicep_angle,
+            'left_squat_angle': left_squat_angle,
+            'right_squat_angle': right_squat_angle,
+            'knee_angle': knee_angle,
+            'back_angle': back_angle,
+            'good_posture': good_posture
+        }
+        if self.telemetry is not None:
+            self.telemetry.add_frame(current_exercise['name'] if current_exercise else None, points, angles,
+                                     self.exercise_counter, self.squat_form_feedback)
+        return angles
+
+    def exercise_data(self):
+        counter = self.exercise_counter
+        return {
+            'curl_counter': counter.curl_counter,
+            'squat_counter': counter.squat_counter,
+            'curl_state': counter.bicep_curl_state.name if counter.bicep_curl_state else '',
+            'squat_state': counter.squat_state.name if counter.squat_state else '',
+            'bicep_curl_feedback': counter.get_bicep_curl_feedback(),
+            'squat_feedback': counter.get_squat_feedback(),
+            'total_reps': counter.total_reps
+        }
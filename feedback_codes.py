@@ -0,0 +1,75 @@
+from enum import IntEnum
+from functools import lru_cache
+
+
+class FeedbackCode(IntEnum):
+    # Values are stored in the database and reports, never renumber them
+    SQUAT_CORRECT_FORM = 0
+    SQUAT_BEND_FORWARD_MORE = 1
+    SQUAT_FORWARD_BEND_TOO_MUCH = 2
+    SQUAT_TOO_DEEP = 3
+    SQUAT_LOWER_HIPS = 4
+
+    CURL_CORRECT_FORM = 10
+    CURL_EXTEND_ARM = 11
+    CURL_HIGHER = 12
+    CURL_ELBOW_STILL = 13
+    CURL_BODY_SWING_SLIGHT = 14
+    CURL_BODY_SWING_EXCESSIVE = 15
+    CURL_UPPER_ARM_STILL = 16
+    CURL_ELBOW_UNDETECTED = 17
+
+
+FEEDBACK_TEXT = {
+    FeedbackCode.SQUAT_CORRECT_FORM: "Correct form",
+    FeedbackCode.SQUAT_BEND_FORWARD_MORE: "Bend forward more",
+    FeedbackCode.SQUAT_FORWARD_BEND_TOO_MUCH: "Forward bending too much",
+    FeedbackCode.SQUAT_TOO_DEEP: "Don't squat too deep",
+    FeedbackCode.SQUAT_LOWER_HIPS: "Lower your hips",
+    FeedbackCode.CURL_CORRECT_FORM: "Correct form, keep it up",
+    FeedbackCode.CURL_EXTEND_ARM: "Extend your arm fully at the bottom",
+    FeedbackCode.CURL_HIGHER: "Curl the weight higher",
+    FeedbackCode.CURL_ELBOW_STILL: "Keep your elbow still",
+    FeedbackCode.CURL_BODY_SWING_SLIGHT: "Your body is slightly swinging. Keep your body stable.",
+    FeedbackCode.CURL_BODY_SWING_EXCESSIVE: "Your body is excessively swinging. Keep your body stable.",
+    FeedbackCode.CURL_UPPER_ARM_STILL: "Keep your upper arm still, excessive elbow movement",
+    FeedbackCode.CURL_ELBOW_UNDETECTED: "Unable to detect elbow movement accurately",
+}
+
+CORRECT_FORM_CODES = frozenset({FeedbackCode.SQUAT_CORRECT_FORM, FeedbackCode.CURL_CORRECT_FORM})
+
+
+def is_mistake(code):
+    return code not in CORRECT_FORM_CODES
+
+
+def render_feedback(code):
+    return FEEDBACK_TEXT[code]
+
+
+@lru_cache(maxsize=256)
+def _render_joined(codes, separator):
+    return separator.join(FEEDBACK_TEXT[code] for code in codes)
+
+
+def render_feedback_list(codes, separator=' | ', limit=None):
+    # Rendered strings are cached per code combination, so repeated UI refreshes
+    # with the same feedback do not build new strings every frame
+    codes = tuple(codes[:limit] if limit is not None else codes)
+    return _render_joined(codes, separator)
+
+
+def encode_mistakes(codes):
+    # Compact, stable representation for the database: comma-separated code values
+    return ','.join(str(int(code)) for code in codes)
+
+
+def decode_mistakes(text):
+    if not text:
+        return []
+    codes = []
+    for part in text.split(','):
+        part = part.strip()
+        if part.isdigit():
+            codes.append(FeedbackCode(int(part)))
+    return codes
@@ -1,6 +1,5 @@
 import sys
 import cv2
-import json
 import os
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
@@ -9,23 +8,40 @@ from PyQt6.QtWidgets import (
     QSlider, QDialog, QDialogButtonBox,QScrollArea
 )
 from PyQt6.QtCore import Qt, QSize, QTimer, QPropertyAnimation, QEasingCurve, pyqtSignal, QRectF, pyqtSignal, pyqtProperty, pyqtSlot, QRunnable, QObject, QThreadPool 
-from PyQt6.QtGui import QImage, QPixmap, QIcon, QPainter, QColor, QPalette,  QPen, QBrush
-from workout_extractor import WorkoutExtractor
+from PyQt6.QtGui import QImage, QPixmap, QIcon, QPainter, QColor, QPalette,  QPen, QBrush, QShortcut, QKeySequence
+from workout_extractor import WorkoutExtractor, WORKOUT_PLAN_SCHEMA
 from PyQt6.QtMultimedia import QMediaPlayer
 import google.generativeai as genai
 from home_tab import *
 import math
 import logging
+import threading
 from demo1 import VideoProcessor
 from workout_plan_widget import WorkoutPlanWidget
 from elevenlabs import Voice, VoiceSettings, play
 from elevenlabs.client import ElevenLabs
-import mysql.connector
-from mysql.connector import Error
+from storage import get_storage, close_storage, STORAGE_ERRORS
+from db_writer import submit_write, stop_writer
+from db_manager import (setup_database, update_exercise_score, save_exercise_feedback, set_current_user,
+                        get_current_user_name)
+from update_survey import update_survey_data
 import datetime
 from dashboard import Dashboard  # Import the Dashboard class
 from threshold_adjuster import ThresholdAdjuster
 from meal_plan_extractor import MealPlanExtractor
+from feedback_codes import render_feedback, render_feedback_list
+from mistake_track import MistakeTracker
+from threshold_store import ThresholdFileWatcher, DEFAULT_THRESHOLDS, profile_path
+from telemetry_store import stop_telemetry_writer
+import archive
+from archive import get_archiver, stop_archiver
+import query_stats
+
+SESSIONS_DIR = os.environ.get('WORKOUT_SESSIONS_DIR', 'sessions')
+
+STREAM_UPDATE_INTERVAL = 50  # Milliseconds between repaints of a response that is still streaming
+
+CHAT_HISTORY_PAGE_SIZE = 50  # Messages fetched per page when browsing chat history
 
 class SessionManager:
     def __init__(self, db):
@@ -33,29 +49,22 @@ class SessionManager:
         self.current_session_id = None
 
     def start_new_session(self):
-        cursor = self.db.connection.cursor()
-        cursor.execute("INSERT INTO sessions (start_time) VALUES (NOW())")
-        self.db.connection.commit()
-        self.current_session_id = cursor.lastrowid
+        self.current_session_id = get_storage().start_session()
         return self.current_session_id
 
     def get_previous_sessions(self):
-        cursor = self.db.connection.cursor()
-        cursor.execute("SELECT id, start_time FROM sessions ORDER BY start_time DESC")
-        return cursor.fetchall()
+        return get_storage().get_sessions()
 
-    def load_session(self, session_id):
+    def load_session(self, session_id, before_id=None, limit=CHAT_HISTORY_PAGE_SIZE):
         self.current_session_id = session_id
-        # Load chat history for this session
-        cursor = self.db.connection.cursor()
-        cursor.execute("SELECT sender, message FROM chat_log WHERE session_id = %s ORDER BY timestamp", (session_id,))
-        return cursor.fetchall()
+        # Load one page of chat history for this session: the newest `limit` messages
+        # older than before_id, returned oldest first as (id, sender, message)
+        rows = archive.get_chat_history(before_id=before_id, limit=limit, session_id=session_id)
+        return [(message_id, sender, message) for message_id, _, sender, message in rows]
 
     def save_message(self, sender, message):
-        cursor = self.db.connection.cursor()
-        cursor.execute("INSERT INTO chat_log (session_id, timestamp, sender, message) VALUES (%s, NOW(), %s, %s)",
-                       (self.current_session_id, sender, message))
-        self.db.connection.commit()
+        # Timestamp taken now so queued messages keep their order and time
+        submit_write('save_chat_message', self.current_session_id, datetime.datetime.now(), sender, message)
 class StarRating(QWidget):
     ratingChanged = pyqtSignal(float)
 
@@ -118,7 +127,7 @@ class ExerciseFeedbackDialog(QDialog):
             self.mistake_widgets = []
             for mistake in self.mistakes:
                 mistake_layout = QHBoxLayout()
-                mistake_label = QLabel(mistake)
+                mistake_label = QLabel(render_feedback(mistake))
                 mistake_layout.addWidget(mistake_label)
                 
                 yes_button = QPushButton("Yes")
@@ -145,7 +154,7 @@ class ExerciseFeedbackDialog(QDialog):
                 if confirm:
                     self.confirmed_mistakes.append(mistake)
                 break
-        print(f"Mistake '{mistake}' confirmed: {confirm}")
+        print(f"Mistake '{render_feedback(mistake)}' confirmed: {confirm}")
 
 
 
@@ -176,6 +185,44 @@ class AIWorker(QRunnable):
         else:
             self.signals.finished.emit(result)
 
+class StreamWorkerSignals(QObject):
+    chunk = pyqtSignal(str)
+    finished = pyqtSignal(str)
+    error = pyqtSignal(str)
+
+class StreamWorker(QRunnable):
+    # Runs fn(*args), a generator of text chunks, emitting each chunk as it arrives.
+    # After cancel() it stops at the next chunk, and finished carries what had arrived by then.
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = StreamWorkerSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @pyqtSlot()
+    def run(self):
+        text = []
+        chunks = None
+        try:
+            chunks = self.fn(*self.args, **self.kwargs)
+            for chunk in chunks:
+                if self._cancelled.is_set():
+                    break
+                text.append(chunk)
+                self.signals.chunk.emit(chunk)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+            return
+        finally:
+            if chunks is not None:
+                chunks.close()
+        self.signals.finished.emit(''.join(text))
+
 class ScoreBoard(QWidget):
     def __init__(self):
         super().__init__()
@@ -334,76 +381,37 @@ class ThemeManager:
 
 class ChatDatabase:
     def __init__(self):
-        try:
-            self.connection = mysql.connector.connect(
-                host='localhost',
-                database='workout_assistant',
-                user='root',
-                password=''  # Default password for XAMPP is empty
-            )
-            if self.connection.is_connected():
-                print("Connected to MySQL database")
-                self.create_tables()
-        except Error as e:
-            print(f"Error while connecting to MySQL: {e}")
-
-    def create_tables(self):
-        try:
-            cursor = self.connection.cursor()
-            
-            # Create sessions table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS sessions (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    start_time DATETIME
-                )
-            ''')
-            
-            # Create chat_log table with session_id
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS chat_log (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    session_id INT,
-                    timestamp DATETIME,
-                    sender VARCHAR(255),
-                    message TEXT,
-                    FOREIGN KEY (session_id) REFERENCES sessions(id)
-                )
-            ''')
-            
-            self.connection.commit()
-            print("Tables created successfully")
-        except Error as e:
-            print(f"Error creating tables: {e}")
-
-
+        # Backend (SQLite file or MySQL server) and its migrations are chosen in storage.py
+        self.storage = get_storage()
 
     def save_message(self, sender, message):
+        # Queued for the background writer so the GUI thread never waits on the database
+        submit_write('save_chat_message', None, datetime.datetime.now(), sender, message,
+                     after_commit=lambda: print(f"Message saved successfully: {sender} - {message[:50]}..."))  # Log first 50 characters
+
+    def get_chat_history(self, before_id=None, limit=CHAT_HISTORY_PAGE_SIZE):
+        # Keyset pagination on the primary key: the newest `limit` messages older than
+        # before_id, returned oldest first as (id, timestamp, sender, message). Paging carries on
+        # into archived months once the messages still in the database run out.
         try:
-            cursor = self.connection.cursor()
-            query = "INSERT INTO chat_log (timestamp, sender, message) VALUES (%s, %s, %s)"
-            cursor.execute(query, (datetime.datetime.now(), sender, message))
-            self.connection.commit()
-            print(f"Message saved successfully: {sender} - {message[:50]}...")  # Log first 50 characters
-        except Error as e:
-            print(f"Error saving message: {e}")
-
-    def get_chat_history(self):
-        try:
-            cursor = self.connection.cursor()
-            query = "SELECT timestamp, sender, message FROM chat_log ORDER BY timestamp"
-            cursor.execute(query)
-            results = cursor.fetchall()
+            results = archive.get_chat_history(before_id=before_id, limit=limit)
             print(f"Retrieved {len(results)} messages from chat history")  # Log number of messages retrieved
             return results
-        except Error as e:
+        except (STORAGE_ERRORS + (OSError, ValueError)) as e:
             print(f"Error retrieving chat history: {e}")
             return []
 
+    def search_chat(self, text, before_id=None, limit=CHAT_HISTORY_PAGE_SIZE):
+        # Full-text search, paged like get_chat_history
+        try:
+            return archive.search_chat(text, before_id=before_id, limit=limit)
+        except (STORAGE_ERRORS + (OSError, ValueError)) as e:
+            print(f"Error searching chat history: {e}")
+            return []
+
     def close_connection(self):
-        if self.connection.is_connected():
-            self.connection.close()
-            print("MySQL connection is closed")
+        close_storage()
+        print("Database connections are closed")
 
 class WorkoutApp(QMainWindow):
     def __init__(self):
@@ -412,6 +420,9 @@ class WorkoutApp(QMainWindow):
         self.setGeometry(100, 100, 1200, 800)
         self.db = ChatDatabase()
         self.is_chat_log_displayed = False
+        self.chat_history_oldest_id = None  # Keyset cursor for paging back through chat history
+        self.chat_history_exhausted = False
+        self.chat_history_query = None  # Full-text search shown in the history view, None for all messages
         self.current_chat_messages = []
         
         # Innitial mistake track
@@ -427,11 +438,16 @@ class WorkoutApp(QMainWindow):
         self.setStyleSheet(self.dark_style)
 
         self.video_processor = VideoProcessor()
+        self.recording_path = None
         self.scoreboard = ScoreBoard()  
         self.dashboard = None
         
         # Intialize the database
         setup_database()
+        # Query timings per statement and call site, printed on demand
+        QShortcut(QKeySequence("Ctrl+Shift+Q"), self).activated.connect(lambda: print(query_stats.summary()))
+        # Record landmark sessions of the current exercise for offline threshold calibration
+        QShortcut(QKeySequence("Ctrl+Shift+R"), self).activated.connect(self.toggle_landmark_recording)
         # Create central stacked widget
         self.central_stacked_widget = QStackedWidget()
         self.setCentralWidget(self.central_stacked_widget)
@@ -458,8 +474,11 @@ class WorkoutApp(QMainWindow):
         # Initialize theme manager
         self.theme_manager = ThemeManager()
         self.theme_manager.set_dark_theme(QApplication.instance())
-        self.threshold_file = "thresholds.json"
-        self.load_thresholds()
+        self.threshold_file = None
+        self.threshold_watcher = None
+        self.use_threshold_file(self.threshold_path())
+        # Moves chat and feedback rows past their retention into archive files, in the background
+        get_archiver()
 
         # Create tabs
         self.home_screen = SplitScreen(self.central_stacked_widget)
@@ -521,6 +540,16 @@ class WorkoutApp(QMainWindow):
 
         self.threadpool = QThreadPool()
 
+        # Streamed chat responses: chunks collect in stream_buffer and the timer moves them into the live bubble
+        self.stream_worker = None
+        self.plan_worker = None  # The survey plan request, which also holds the chat session's turn
+        self.stream_item = None
+        self.stream_buffer = []
+        self.stream_cancelled = False
+        self.stream_timer = QTimer(self)
+        self.stream_timer.setInterval(STREAM_UPDATE_INTERVAL)
+        self.stream_timer.timeout.connect(self.flush_stream_buffer)
+
         self.workout_timer = QTimer(self)
         self.workout_timer.timeout.connect(self.main_workout_loop)
         self.workout_timer.start(30)  # Update every 30ms
@@ -584,15 +613,33 @@ class WorkoutApp(QMainWindow):
             except Exception as e:
                 print(f"Error removing temporary audio file: {str(e)}")
 
+    def threshold_path(self):
+        # The signed-in member's profile from calibrate_thresholds.py, else the shared thresholds.json
+        name = get_current_user_name()
+        if name is not None and os.path.exists(profile_path(name)):
+            return profile_path(name)
+        return "thresholds.json"
+
+    def use_threshold_file(self, path):
+        if path == self.threshold_file:
+            return
+        if self.threshold_watcher is not None:
+            self.threshold_watcher.stop()
+            # Keys missing from the new file go back to the defaults, not the previous member's values
+            self.video_processor.threshold_store.update(DEFAULT_THRESHOLDS)
+        self.threshold_file = path
+        self.load_thresholds()
+        logging.info(f"Using thresholds from {path}")
+        # Apply edits to the file live, without a restart; adjustments are saved back to it
+        self.threshold_watcher = ThresholdFileWatcher(self.video_processor.threshold_store, self.threshold_file)
+        self.threshold_watcher.start()
+
     def save_thresholds(self):
-        with open(self.threshold_file, 'w') as f:
-            json.dump(self.video_processor.thresholds, f)
+        self.video_processor.threshold_store.save(self.threshold_file)
 
     def load_thresholds(self):
         if os.path.exists(self.threshold_file):
-            with open(self.threshold_file, 'r') as f:
-                loaded_thresholds = json.load(f)
-                self.video_processor.thresholds.update(loaded_thresholds)
+            self.video_processor.threshold_store.load(self.threshold_file)
 
 
     def on_media_status_changed(self, status):
@@ -618,39 +665,55 @@ class WorkoutApp(QMainWindow):
     def process_threshold_adjustment(self):
         user_input = self.threshold_chat_input.text()
         self.threshold_chat_input.clear()
+        if not user_input.strip():
+            return
 
-        new_threshold, _, _ = self.threshold_adjuster.adjust_threshold(user_input, self.video_processor.thresholds)
-        
-        if new_threshold is not None:
-            response = self.threshold_adjuster.model.generate_content(self.threshold_adjuster.generate_prompt(user_input, self.video_processor.thresholds))
-            result = self.threshold_adjuster.extract_json_from_response(response.text)
-            
-            if result and 'feedback_condition' in result:
-                feedback_condition = result['feedback_condition']
-                threshold_key = feedback_condition  # Use only the feedback condition as the key
-                
-                if threshold_key in self.video_processor.thresholds:
-                    old_threshold = self.video_processor.thresholds[threshold_key]
-                    self.video_processor.thresholds[threshold_key] = new_threshold
-                    self.save_thresholds()  # Save thresholds immediately after updating
-                    message = f"Adjusted {threshold_key} from {old_threshold} to {new_threshold} degrees."
-                    self.threshold_chat_display.append(message)
-                    
-                    # Use text-to-speech for successful adjustments
-                    speech_message = f"Threshold adjusted. {threshold_key} is now set to {new_threshold} degrees."
-                    self.text_to_speech(speech_message)
-                else:
-                    message = f"Error: Invalid threshold key '{threshold_key}'. Available keys are: {', '.join(self.video_processor.thresholds.keys())}"
-                    self.threshold_chat_display.append(message)
-            else:
-                message = "Error: Invalid response from AI. Please try again."
-                self.threshold_chat_display.append(message)
-        else:
+        current_thresholds = self.video_processor.thresholds.as_dict()
+        # Clear requests are resolved on the spot; the rest need one model call, off the GUI thread
+        result = self.threshold_adjuster.resolve_locally(user_input, current_thresholds)
+        if result is not None:
+            self.apply_threshold_adjustment(result)
+            return
+
+        self.threshold_chat_input.setEnabled(False)
+        worker = AIWorker(self.threshold_adjuster.adjust_threshold, user_input, current_thresholds)
+        worker.signals.finished.connect(self.apply_threshold_adjustment)
+        worker.signals.error.connect(self.handle_threshold_error)
+        self.threadpool.start(worker)
+
+    def apply_threshold_adjustment(self, result):
+        self.threshold_chat_input.setEnabled(True)
+        if result is None:
             message = "Error: Failed to determine new threshold. Please try again with different wording."
             self.threshold_chat_display.append(message)
+            print(message)
+            return
+
+        threshold_key = result['feedback_condition']
+        new_threshold = result['new_threshold']
+        current_thresholds = self.video_processor.thresholds
+        if threshold_key in current_thresholds:
+            old_threshold = current_thresholds[threshold_key]
+            self.video_processor.threshold_store.update({threshold_key: new_threshold})
+            self.save_thresholds()  # Save thresholds immediately after updating
+            message = f"Adjusted {threshold_key} from {old_threshold} to {new_threshold} degrees."
+            self.threshold_chat_display.append(message)
+
+            # Use text-to-speech for successful adjustments
+            speech_message = f"Threshold adjusted. {threshold_key} is now set to {new_threshold} degrees."
+            self.text_to_speech(speech_message)
+        else:
+            message = f"Error: Invalid threshold key '{threshold_key}'. Available keys are: {', '.join(current_thresholds.keys())}"
+            self.threshold_chat_display.append(message)
 
         print(message)  # This will print the message to the console for debugging
 
+    def handle_threshold_error(self, error):
+        self.threshold_chat_input.setEnabled(True)
+        message = f"Error: {error}"
+        self.threshold_chat_display.append(message)
+        print(message)
+
     def stop_audio(self):
         if self.is_speaking and self.current_audio:
             # This is a placeholder as ElevenLabs doesn't provide a direct way to stop playback
@@ -671,7 +734,7 @@ class WorkoutApp(QMainWindow):
         <p><strong>Counter:</strong> {exercise_data.get('squat_counter', 0)}</p>
         <p><strong>State:</strong> {exercise_data.get('squat_state', '')}</p>
         <p><strong>Feedback:</strong><br>
-        {' | '.join(exercise_data.get('squat_feedback', [])[:2])}</p>
+        {render_feedback_list(exercise_data.get('squat_feedback', []), limit=2)}</p>
         """
 
         bicep_curl_info = f"""
@@ -679,7 +742,7 @@ class WorkoutApp(QMainWindow):
         <p><strong>Counter:</strong> {exercise_data.get('curl_counter', 0)}</p>
         <p><strong>State:</strong> {exercise_data.get('curl_state', '')}</p>
         <p><strong>Feedback:</strong><br>
-        {' | '.join(exercise_data.get('bicep_curl_feedback', [])[:2])}</p>
+        {render_feedback_list(exercise_data.get('bicep_curl_feedback', []), limit=2)}</p>
         """
 
         # Update the exercise info labels
@@ -767,6 +830,8 @@ class WorkoutApp(QMainWindow):
             self.update_exercise_progress_display()
 
     def on_exercise_completed(self, exercise):
+        if self.video_processor.recorder is not None:
+            self.stop_landmark_recording()  # A session holds a single exercise
         self.scoreboard.add_points(10)
         self.workout_plan_widget.mark_current_exercise_completed()
         self.workout_plan_widget.next_exercise()
@@ -868,10 +933,6 @@ class WorkoutApp(QMainWindow):
         msg_box.buttonClicked.connect(lambda _: self.close())
         
         msg_box.exec()
-    def closeEvent(self, event):
-        # This method is called when the window is about to be closed
-        self.stop_camera()
-        super().closeEvent(event)
 
     def reset_exercise_state(self):
         self.current_exercise = None
@@ -952,6 +1013,27 @@ class WorkoutApp(QMainWindow):
         else:
             print("Failed to start camera")
 
+    def toggle_landmark_recording(self):
+        if self.video_processor.recorder is not None:
+            self.stop_landmark_recording()
+            return
+        if self.current_exercise is None:
+            logging.warning("No exercise in progress, nothing to record")
+            return
+        name = self.current_exercise['name'].lower()
+        exercise = 'bicep_curl' if name in ['bicep curl', 'curl'] else name.replace(' ', '_')
+        os.makedirs(SESSIONS_DIR, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.recording_path = os.path.join(SESSIONS_DIR, f"{exercise}-{timestamp}.npz")
+        self.video_processor.start_recording(exercise)
+        logging.info(f"Recording landmarks to {self.recording_path}")
+
+    def stop_landmark_recording(self):
+        # Saves the session; label its reps with landmark_session.py before calibrating
+        recorder = self.video_processor.stop_recording(self.recording_path)
+        if recorder is not None:
+            logging.info(f"Saved {len(recorder.frames)} landmark frames to {self.recording_path}")
+
     def stop_camera(self):
         if self.capture is not None:
             self.capture.release()
@@ -967,6 +1049,14 @@ class WorkoutApp(QMainWindow):
         self.chat_list.setStyleSheet("background-color: #F0F0F0; border: none;")
         self.chat_list.setSpacing(10)
         self.chat_list.setWordWrap(True)
+        self.chat_list.verticalScrollBar().valueChanged.connect(self.on_chat_scrolled)
+
+        # Full-text search over the chat history, only shown while browsing history
+        self.history_search_input = QLineEdit()
+        self.history_search_input.setPlaceholderText("Search chat history...")
+        self.history_search_input.returnPressed.connect(self.search_chat_history)
+        self.history_search_input.hide()
+        chat_layout.addWidget(self.history_search_input)
         chat_layout.addWidget(self.chat_list)
 
         input_layout = QHBoxLayout()
@@ -1001,6 +1091,12 @@ class WorkoutApp(QMainWindow):
         """)
         input_layout.addWidget(self.send_button)
 
+        # Stops a response that is still streaming in
+        self.cancel_response_button = QPushButton("Stop Response")
+        self.cancel_response_button.clicked.connect(self.cancel_ai_response)
+        self.cancel_response_button.setVisible(False)
+        input_layout.addWidget(self.cancel_response_button)
+
         # Add the stop button to the input layout
         input_layout.addWidget(self.stop_button)
 
@@ -1020,8 +1116,12 @@ class WorkoutApp(QMainWindow):
         else:
             self.restore_current_chat()
 
-    def add_message(self, message, is_user):
-        item = QListWidgetItem(self.chat_list)
+    def add_message(self, message, is_user, row=None):
+        # row inserts the message at that position instead of appending it
+        if row is None:
+            item = QListWidgetItem(self.chat_list)
+        else:
+            item = QListWidgetItem()
         parent_width = self.chat_list.viewport().width()
         chat_bubble = create_chat_bubble(message, is_user, parent_width)
         
@@ -1030,58 +1130,171 @@ class WorkoutApp(QMainWindow):
             
             speaker_icon = QPushButton()
             speaker_icon.setIcon(QIcon('speaker_icon.png'))
-            speaker_icon.clicked.connect(lambda: self.text_to_speech(message))
+            # Read from the bubble, which for a streamed response only holds the full text at the end
+            bubble = chat_bubble.findChild(ChatBubble)
+            speaker_icon.clicked.connect(lambda: self.text_to_speech(bubble.toPlainText()))
             controls_layout.addWidget(speaker_icon)
             
             chat_bubble.layout().addLayout(controls_layout)
         
-        self.chat_list.addItem(item)
+        if row is None:
+            self.chat_list.addItem(item)
+        else:
+            self.chat_list.insertItem(row, item)
         self.chat_list.setItemWidget(item, chat_bubble)
         
         item.setSizeHint(chat_bubble.sizeHint())
         
-        self.chat_list.scrollToBottom()
+        if row is None:
+            self.chat_list.scrollToBottom()
+        return item
 
     def send_message(self, message=None, is_initial_prompt=False):
+        if self.stream_worker is not None or self.plan_worker is not None:
+            return  # One turn at a time; the chat session cannot take a message mid-response
         if not message:
             message = self.chat_input.text()
 
         if message:
             self.add_message(message, True)
             self.chat_input.clear()
-            
-            try:
-                worker = AIWorker(self.get_ai_response, message)
-                worker.signals.finished.connect(lambda response: self.handle_ai_response(response, is_initial_prompt))
-                worker.signals.error.connect(self.handle_ai_error)
-                
+            # Save the user message to the database
+            self.db.save_message("User", message)
+
+            if is_initial_prompt:
+                # The survey prompt asks for the plan as JSON constrained to the plan schema, so it can be
+                # used without a reformatting call; it is shown once complete rather than streamed
+                worker = AIWorker(self.get_ai_response, message,
+                                  generation_config={'response_mime_type': 'application/json',
+                                                     'response_schema': WORKOUT_PLAN_SCHEMA})
+                worker.signals.finished.connect(self.finish_plan_response)
+                worker.signals.error.connect(self.fail_plan_response)
+                self.plan_worker = worker
+                self.set_chat_busy(True)
                 self.threadpool.start(worker)
-                
-                # Save the user message to the database
-                self.db.save_message("User", message)
-                
-            except Exception as e:
-                error_response = f"Error: Unable to process message. {str(e)}"
-                self.add_message(error_response, False)
-                self.db.save_message("System", error_response)
-    
-    def handle_ai_response(self, response, is_initial_prompt):
+            else:
+                self.start_streamed_response(message)
+
+    def handle_ai_response(self, response, is_initial_prompt=False):
+        if is_initial_prompt and not self.initial_plan_extracted:
+            workout_plan = self.workout_extractor.parse_workout_plan(response)
+            if workout_plan:
+                # Show the plan as text rather than the JSON it arrived as
+                response = self.format_workout_plan(workout_plan)
+                self.create_workout_plan(workout_plan)
+            else:
+                self.extract_workout_plan_with_ai(response)
+
         self.add_message(response, False)
-        
         # Save the AI response to the database
         self.db.save_message("AI", response)
-        
-        if is_initial_prompt and not self.initial_plan_extracted:
-            self.extract_and_create_workout_plan(response)
-    
+
+    def finish_plan_response(self, response):
+        self.plan_worker = None
+        self.set_chat_busy(False)
+        self.handle_ai_response(response, True)
+
+    def fail_plan_response(self, error):
+        self.plan_worker = None
+        self.set_chat_busy(False)
+        self.handle_ai_error(error)
+
     def handle_ai_error(self, error):
         error_response = f"Error: Unable to get AI response. {str(error)}"
         self.add_message(error_response, False)
         self.db.save_message("System", error_response)
-    
-    def get_ai_response(self, prompt):
-        return self.chat.send_message(prompt).text
-        
+
+    def get_ai_response(self, prompt, **options):
+        return self.chat.send_message(prompt, **options).text
+
+    def stream_ai_response(self, prompt):
+        # Text chunks of the answer as the model produces them
+        response = self.chat.send_message(prompt, stream=True)
+        completed = False
+        try:
+            for chunk in response:
+                if chunk.parts:
+                    yield chunk.text
+            completed = True
+        finally:
+            if not completed:
+                # Cancelled or failed mid-stream: drop the unfinished turn so the chat session stays usable
+                self.chat.rewind()
+
+    def start_streamed_response(self, message):
+        self.stream_item = self.add_message("", False)
+        self.stream_buffer = []
+        self.stream_cancelled = False
+        self.stream_worker = StreamWorker(self.stream_ai_response, message)
+        self.stream_worker.signals.chunk.connect(self.stream_buffer.append)
+        self.stream_worker.signals.finished.connect(self.finish_streamed_response)
+        self.stream_worker.signals.error.connect(self.fail_streamed_response)
+        self.set_streaming(True)
+        self.threadpool.start(self.stream_worker)
+
+    def set_chat_busy(self, busy):
+        # While a turn is in flight nothing else may be sent on the chat session
+        self.send_button.setEnabled(not busy)
+        self.history_button.setEnabled(not busy)  # Browsing history would remove the live bubble
+
+    def set_streaming(self, streaming):
+        self.cancel_response_button.setVisible(streaming)
+        self.set_chat_busy(streaming)
+        if streaming:
+            self.stream_timer.start()
+        else:
+            self.stream_timer.stop()
+
+    def stream_bubble(self):
+        widget = self.chat_list.itemWidget(self.stream_item) if self.stream_item is not None else None
+        return widget, widget.findChild(ChatBubble) if widget is not None else None
+
+    def flush_stream_buffer(self, suffix=""):
+        if not self.stream_buffer and not suffix:
+            return
+        text = ''.join(self.stream_buffer) + suffix
+        self.stream_buffer.clear()
+        widget, bubble = self.stream_bubble()
+        if bubble is None:
+            return
+        cursor = bubble.textCursor()
+        cursor.movePosition(cursor.MoveOperation.End)
+        cursor.insertText(text)
+        self.stream_item.setSizeHint(widget.sizeHint())
+        self.chat_list.scrollToBottom()
+
+    def cancel_ai_response(self):
+        # The bubble stops growing right away; the worker stops when the next chunk arrives and
+        # sending stays disabled until it has
+        if self.stream_worker is None or self.stream_cancelled:
+            return
+        self.stream_cancelled = True
+        self.stream_worker.cancel()
+        self.stream_worker.signals.chunk.disconnect()
+        self.flush_stream_buffer(" [stopped]")
+        self.stream_timer.stop()
+        self.cancel_response_button.setVisible(False)
+
+    def end_streamed_response(self):
+        self.set_streaming(False)
+        self.stream_worker = None
+        self.stream_item = None
+
+    def finish_streamed_response(self, response):
+        if not self.stream_cancelled:
+            self.flush_stream_buffer()
+        _, bubble = self.stream_bubble()
+        self.end_streamed_response()
+        if bubble is not None and bubble.toPlainText():
+            # Save the AI response to the database, as far as it got
+            self.db.save_message("AI", bubble.toPlainText())
+
+    def fail_streamed_response(self, error):
+        if not self.stream_cancelled:
+            self.flush_stream_buffer()
+        self.end_streamed_response()
+        self.handle_ai_error(error)
+
     def display_chat_log(self):
         try:
             # Store current chat messages
@@ -1091,24 +1304,72 @@ class WorkoutApp(QMainWindow):
                 for i in range(self.chat_list.count())
             ]
             
-            # Clear the chat list and display chat history
-            self.chat_list.clear()
-            chat_history = self.db.get_chat_history()
-            if chat_history:
-                for timestamp, sender, message in chat_history:
-                    self.add_message(f"[{timestamp}] {sender}: {message}", sender == "User")
-            else:
-                self.add_message("No chat history available.", False)
+            # Clear the chat list and display the most recent page of chat history;
+            # older pages are fetched when the user scrolls to the top
+            self.chat_history_query = None
+            self.show_chat_history_page()
             
             self.is_chat_log_displayed = True
+            self.history_search_input.clear()
+            self.history_search_input.show()
             self.history_button.setText("Return to Current Chat")
 
         except Exception as e:
             print(f"Error displaying chat log: {e}")
             QMessageBox.warning(self, "Error", f"Failed to display chat history: {str(e)}")
 
+    def show_chat_history_page(self):
+        # Stop paging while the list is cleared, then show the newest page for the current query
+        self.chat_history_exhausted = True
+        self.chat_list.clear()
+        self.chat_history_oldest_id = None
+        self.chat_history_exhausted = False
+        chat_history = self.load_chat_history_page()
+        if chat_history:
+            for message_id, timestamp, sender, message in chat_history:
+                self.add_message(f"[{timestamp}] {sender}: {message}", sender == "User")
+        elif self.chat_history_query:
+            self.add_message(f"No messages found for \"{self.chat_history_query}\".", False)
+        else:
+            self.add_message("No chat history available.", False)
+
+    def search_chat_history(self):
+        # An empty search goes back to the full history
+        self.chat_history_query = self.history_search_input.text().strip() or None
+        try:
+            self.show_chat_history_page()
+        except Exception as e:
+            print(f"Error searching chat history: {e}")
+            QMessageBox.warning(self, "Error", f"Failed to search chat history: {str(e)}")
+
+    def load_chat_history_page(self):
+        if self.chat_history_query:
+            page = self.db.search_chat(self.chat_history_query, before_id=self.chat_history_oldest_id,
+                                       limit=CHAT_HISTORY_PAGE_SIZE)
+        else:
+            page = self.db.get_chat_history(before_id=self.chat_history_oldest_id, limit=CHAT_HISTORY_PAGE_SIZE)
+        if len(page) < CHAT_HISTORY_PAGE_SIZE:
+            self.chat_history_exhausted = True
+        if page:
+            self.chat_history_oldest_id = page[0][0]
+        return page
+
+    def on_chat_scrolled(self, value):
+        if (not self.is_chat_log_displayed or self.chat_history_exhausted
+                or value != self.chat_list.verticalScrollBar().minimum()):
+            return
+        page = self.load_chat_history_page()
+        for row, (message_id, timestamp, sender, message) in enumerate(page):
+            self.add_message(f"[{timestamp}] {sender}: {message}", sender == "User", row=row)
+        if page:
+            # Keep the message the user was looking at in view
+            self.chat_list.scrollToItem(self.chat_list.item(len(page)), QListWidget.ScrollHint.PositionAtTop)
+
     def restore_current_chat(self):
         try:
+            # Leave history mode first so clearing the list does not trigger paging
+            self.is_chat_log_displayed = False
+
             # Clear the chat list
             self.chat_list.clear()
 
@@ -1116,7 +1377,7 @@ class WorkoutApp(QMainWindow):
             for message, is_user in self.current_chat_messages:
                 self.add_message(message, is_user)
             
-            self.is_chat_log_displayed = False
+            self.history_search_input.hide()
             self.history_button.setText("View Chat History")
 
         except Exception as e:
@@ -1262,6 +1523,8 @@ class WorkoutApp(QMainWindow):
             self.show_chat_interface()
 
     def show_dashboard(self, email):
+        set_current_user(email)
+        self.use_threshold_file(self.threshold_path())
         if self.dashboard is None:
             self.dashboard = Dashboard(self.meal_plan)  # Pass meal_plan here
         self.central_stacked_widget.addWidget(self.dashboard)
@@ -1300,10 +1563,10 @@ class WorkoutApp(QMainWindow):
         SQUAT STATE: {exercise_data['squat_state']}
         
         BICEP CURL FEEDBACK:
-        {' | '.join(exercise_data['bicep_curl_feedback'][:2])}
+        {render_feedback_list(exercise_data['bicep_curl_feedback'], limit=2)}
         
         SQUAT FEEDBACK:
-        {' | '.join(exercise_data['squat_feedback'][:2])}
+        {render_feedback_list(exercise_data['squat_feedback'], limit=2)}
         """
         
         # Update the exercise info label
@@ -1335,6 +1598,14 @@ class WorkoutApp(QMainWindow):
     def closeEvent(self, event):
             # Release the camera when closing the application
             self.stop_camera()
+            self.threshold_watcher.stop()
+            # Write out anything still queued before the connections go away
+            stop_archiver()
+            stop_writer()
+            stop_telemetry_writer()
+            if query_stats.LOG_SUMMARY_AT_EXIT:
+                logging.info(query_stats.summary())
+            self.db.close_connection()
             super().closeEvent(event)
 
     def process_survey_data(self):
@@ -1347,63 +1618,22 @@ class WorkoutApp(QMainWindow):
             "goal": self.goal_group.checkedButton().text().lower() if self.goal_group.checkedButton() else "",
             "intensity": self.intensity_group.checkedButton().text().lower() if self.intensity_group.checkedButton() else ""
         }
-        
-        # Start of the link from update_survey.py
-        # Update the survey data in the database
-        update_survey_data(survey_data)
-        
-        # Generate the initial prompt for the AI
-        initial_prompt = self.create_initial_prompt(survey_data)
-        
-        # Send the initial prompt to the AI
-        self.send_message(initial_prompt, is_initial_prompt=True)
-        
-        # Validate the input
-        if not all(survey_data.values()):
-            QMessageBox.warning(self, "Incomplete Form", "Please fill out all fields before submitting.")
-            return
-        # Done linking
-        
+
         # Validate the input
         if not all(survey_data.values()):
             QMessageBox.warning(self, "Incomplete Form", "Please fill out all fields before submitting.")
             return
+        self.survey_data = survey_data
 
-
-
-        # Create initial prompt for AI
-        initial_prompt = self.create_initial_prompt(survey_data)
-        
-        # Send initial prompt to AI and display response
-        response = self.send_message(initial_prompt, is_initial_prompt=True)
+        # Update the survey data in the database
+        update_survey_data(survey_data)
 
         # Hide survey form and show chat interface
         self.survey_widget.hide()
         self.show_chat_interface()
 
-        # Extract workout plan from AI response
-        self.workout_plan = self.workout_extractor.extract_workout_plan(response)
-        if not self.workout_plan:
-            logging.warning("Failed to extract workout plan, attempting to clean and structure response")
-            self.workout_plan = self.workout_extractor.clean_and_structure_response(response)
-
-        if self.workout_plan:
-            self.update_workout_plan_widget()
-            self.initial_plan_extracted = True
-        else:
-            logging.error("Failed to create workout plan")
-
-        # Enable chat functionality
-        self.chat_input.setEnabled(True)
-        self.send_button.setEnabled(True)
-
-        
-        worker = AIWorker(self.get_ai_response, initial_prompt)
-        worker.signals.finished.connect(self.handle_ai_response)
-        worker.signals.error.connect(self.handle_ai_error)
-        
-        self.threadpool.start(worker)
-        self.prompt_for_meal_plan()
+        # One generation; the plan and the meal plan question follow when it arrives
+        self.send_message(self.create_initial_prompt(survey_data), is_initial_prompt=True)
 
     def prompt_for_meal_plan(self):
         if hasattr(self, 'survey_data') and self.survey_data:
@@ -1467,9 +1697,6 @@ class WorkoutApp(QMainWindow):
         self.central_stacked_widget.addWidget(self.ai_tab)
         self.central_stacked_widget.addWidget(self.workout_tab)
 
-    def get_ai_response(self, prompt):
-        return self.chat.send_message(prompt).text
-    
     def setup_ai_tab(self):
             self.ai_layout = QVBoxLayout(self.ai_tab)
             # Show survey or chat based on completion status
@@ -1477,55 +1704,33 @@ class WorkoutApp(QMainWindow):
             # Create chat interface (initially hidden)
             self.create_chat_interface()
             self.chat_widget.hide()
-    def handle_ai_response(self, response):
-        self.extract_and_create_workout_plan(response)
-
-    def handle_ai_error(self, error):
-        QMessageBox.critical(self, "Error", f"An error occurred: {error}")
-
-    def extract_and_create_workout_plan(self, response):
-        workout_plan = self.workout_extractor.extract_workout_plan(response)
-        if not workout_plan:
-            workout_plan = self.workout_extractor.clean_and_structure_response(response)
-
-        if workout_plan:
-            self.workout_plan = workout_plan
-            self.update_workout_plan_widget()
-            self.initial_plan_extracted = True
-            if self.central_stacked_widget.currentWidget() == self.workout_tab:
-                self.start_camera()
-        else:
-            QMessageBox.warning(self, "Warning", "Failed to create workout plan. Please try again.")
-
-    def update_workout_plan_widget(self):
-        if self.workout_plan_widget is None:
-            self.workout_plan_widget = WorkoutPlanWidget(self.workout_plan)
-            self.workout_plan_widget.exercise_selected.connect(self.on_exercise_selected)
-            self.workout_plan_widget.plan_updated.connect(self.on_workout_plan_updated)
-            self.workout_plan_widget.exercise_completed.connect(self.on_exercise_completed)
-            self.right_layout.addWidget(self.workout_plan_widget)
-        else:
-            self.workout_plan_widget.set_workout_plan(self.workout_plan)
-
-        # Ensure the workout tab shows the updated plan
-        self.central_stacked_widget.setCurrentWidget(self.workout_tab)
-
-    def send_message(self, message=None, is_initial_prompt=False):
-        if not message:
-            message = self.chat_input.text()
+    def create_workout_plan(self, workout_plan):
+        self.workout_plan = workout_plan
+        self.update_workout_plan_widget()
+        self.initial_plan_extracted = True
+        if self.central_stacked_widget.currentWidget() == self.workout_tab:
+            self.start_camera()
+        self.prompt_for_meal_plan()
 
-        if message:
-            self.add_message(message, True)
-            self.chat_input.clear()
-            
-            worker = AIWorker(self.get_ai_response, message)
-            worker.signals.finished.connect(self.handle_chat_response)
-            worker.signals.error.connect(self.handle_ai_error)
-            
-            self.threadpool.start(worker)
+    def extract_workout_plan_with_ai(self, response):
+        # Last resort when the answer is neither JSON nor the expected text format: one reformatting call
+        worker = AIWorker(self.workout_extractor.extract_workout_plan, response)
+        worker.signals.finished.connect(self.create_workout_plan)
+        worker.signals.error.connect(
+            lambda error: QMessageBox.warning(self, "Warning", "Failed to create workout plan. Please try again."))
+        self.threadpool.start(worker)
 
-    def handle_chat_response(self, response):
-        self.add_message(response, False)
+    def format_workout_plan(self, workout_plan):
+        formatted_plan = "7-Day Workout Plan:\n\n"
+        for day in workout_plan:
+            formatted_plan += f"{day['day']}:\n"
+            for exercise in day['exercises']:
+                if exercise.get('is_timed'):
+                    formatted_plan += f"  {exercise['name']}: {exercise['reps']} seconds\n"
+                else:
+                    formatted_plan += f"  {exercise['name']}: {exercise['sets']} x {exercise['reps']}\n"
+            formatted_plan += "\n"
+        return formatted_plan
 
     def setup_workout_tab(self):
         if not hasattr(self, 'workout_layout'):
@@ -1747,21 +1952,23 @@ class WorkoutApp(QMainWindow):
         3. Use only the following exercises:
         Reps-based: curl, squat, lunge, pushup, shoulder press
         Duration-based: plank, jumping jack, jump rope, knee tap, mountain climber
-        4. Format each exercise as follows:
-        Reps-based: [Exercise Name]: [Sets] x [Reps]
-        Duration-based: [Exercise Name]: [Duration] seconds
-        5. Do not include any introductions, explanations, or dietary advice.
-        6. Use the exact exercise names provided, with correct spelling.
-
-        Example of correct formatting:
-        Day 1:
-        Jumping Jack: 30 seconds
-        Pushup: 3 x 10
-        Plank: 60 seconds
-        Squat: 3 x 15
-        Mountain Climber: 45 seconds
-
-        Your response must follow this exact structure for all 7 days. DO NOT deviate from this format or include any additional information.
+        4. Respond with a JSON array of exactly 7 objects, one per day, and nothing else:
+        [
+            {{
+                "day": "Day 1",
+                "exercises": [
+                    {{"name": "Jumping Jack", "sets": 1, "reps": 30, "is_timed": true}},
+                    {{"name": "Pushup", "sets": 3, "reps": 10, "is_timed": false}},
+                    {{"name": "Plank", "sets": 1, "reps": 60, "is_timed": true}},
+                    {{"name": "Squat", "sets": 3, "reps": 15, "is_timed": false}}
+                ]
+            }},
+            ...
+        ]
+        5. For duration-based exercises "sets" is 1, "reps" is the duration in seconds and "is_timed" is true.
+        For reps-based exercises "is_timed" is false. "sets" and "reps" are always integers.
+        6. Do not include any introductions, explanations, or dietary advice.
+        7. Use the exact exercise names provided, with correct spelling.
 
         Begin the 7-day workout plan NOW:
         """
@@ -1775,33 +1982,6 @@ class WorkoutApp(QMainWindow):
         self.goal_combo.setCurrentIndex(0)
         self.dietary_combo.setCurrentIndex(0)
 
-    def send_message(self, message=None, is_initial_prompt=False):
-        if not message:
-            message = self.chat_input.text()
-
-        if message:
-            self.add_message(message, True)
-            self.chat_input.clear()
-            
-            try:
-                response = self.chat.send_message(message).text
-                self.add_message(response, False)
-                
-                # Save the message and response to the database
-                self.db.save_message("User", message)
-                self.db.save_message("AI", response)
-                
-                if is_initial_prompt and not self.initial_plan_extracted:
-                    self.extract_and_create_workout_plan(response)
-                
-            except Exception as e:
-                error_response = f"Error: Unable to get AI response. {str(e)}"
-                self.add_message(error_response, False)
-                self.db.save_message("User", message)
-                self.db.save_message("AI", error_response)
-            
-            return response
-
     def create_workout_plan_widget(self, workout_plan):
         if not workout_plan:
             logging.error("Workout plan is empty or None")
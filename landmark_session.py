@@ -0,0 +1,89 @@
+import json
+import numpy as np
+
+LANDMARK_COUNT = 33  # MediaPipe Pose landmarks per frame
+
+
+class LandmarkSession:
+    def __init__(self, landmarks, fps, exercise, labels=None):
+        # landmarks: float32 array of shape (frames, 33, 4) holding x, y, z, visibility
+        self.landmarks = landmarks
+        self.fps = fps
+        self.exercise = exercise
+        # Each label marks one rep, either by frame range {"start": frame, "end": frame, "codes": [...]}
+        # or by detected rep index {"rep": n, "codes": [...]}; codes are FeedbackCode values
+        self.labels = labels or []
+
+    def __len__(self):
+        return len(self.landmarks)
+
+
+class LandmarkRecorder:
+    def __init__(self, exercise, fps):
+        self.exercise = exercise
+        self.fps = fps
+        self.frames = []
+        self.labels = []
+
+    def add_frame(self, landmarks):
+        self.frames.append([(lm.x, lm.y, lm.z, lm.visibility) for lm in landmarks])
+
+    def label_rep(self, start, end, codes=()):
+        self.labels.append({'start': int(start), 'end': int(end), 'codes': [int(code) for code in codes]})
+
+    def label_detected_rep(self, rep, codes=()):
+        self.labels.append({'rep': int(rep), 'codes': [int(code) for code in codes]})
+
+    def to_session(self):
+        landmarks = np.asarray(self.frames, dtype=np.float32).reshape(-1, LANDMARK_COUNT, 4)
+        return LandmarkSession(landmarks, self.fps, self.exercise, list(self.labels))
+
+    def save(self, path):
+        save_session(path, self.to_session())
+
+
+def save_session(path, session):
+    np.savez_compressed(
+        path,
+        landmarks=np.asarray(session.landmarks, dtype=np.float32),
+        fps=np.float32(session.fps),
+        exercise=np.str_(session.exercise),
+        labels=np.str_(json.dumps(session.labels))
+    )
+
+
+def load_session(path):
+    with np.load(path) as data:
+        return LandmarkSession(
+            data['landmarks'],
+            float(data['fps']),
+            str(data['exercise']),
+            json.loads(str(data['labels']))
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+    from feedback_codes import FeedbackCode
+
+    # Labels one rep of a recorded session: python landmark_session.py sessions/squat-x.npz --rep 2 --codes SQUAT_TOO_DEEP
+    # Rep numbers are the ones printed by offline_analysis.py; a rep without --codes is labelled as correct form
+    parser = argparse.ArgumentParser(description="Label a rep of a recorded landmark session")
+    parser.add_argument("path", help="Session file saved by the app (Ctrl+Shift+R)")
+    parser.add_argument("--rep", type=int, help="Detected rep number, counting from 1")
+    parser.add_argument("--start", type=int, help="First frame of the rep, instead of --rep")
+    parser.add_argument("--end", type=int, help="Last frame of the rep, with --start")
+    parser.add_argument("--codes", nargs='*', default=[], help="FeedbackCode names or values of the mistakes in the rep")
+    args = parser.parse_args()
+    by_range = args.start is not None or args.end is not None
+    if (args.rep is None) != by_range or (by_range and (args.start is None or args.end is None)):
+        parser.error("give either --rep or both --start and --end")
+
+    codes = [FeedbackCode(int(code)) if code.isdigit() else FeedbackCode[code.upper()] for code in args.codes]
+    session = load_session(args.path)
+    if args.rep is not None:
+        session.labels.append({'rep': args.rep - 1, 'codes': [int(code) for code in codes]})
+    else:
+        session.labels.append({'start': args.start, 'end': args.end, 'codes': [int(code) for code in codes]})
+    save_session(args.path, session)
+    print(f"{args.path}: {len(session.labels)} labelled reps")
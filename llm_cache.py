@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Disk-backed cache for Gemini responses. Extraction prompts are built from survey answers
+# and thresholds, so the same prompt comes back often; a repeat is answered from here in
+# milliseconds instead of a full model round-trip:
+#
+#     text = cached_generate(self.model, prompt)      # instead of model.generate_content(prompt).text
+#
+# Entries are keyed by model name, generation options and a hash of the whitespace-normalized
+# prompt. They expire after LLM_CACHE_TTL seconds, and the least recently used entries are
+# evicted beyond LLM_CACHE_MAX_ENTRIES. Identical requests made while one is already in
+# flight wait for that call and share its answer instead of calling the model again.
+# Only successful responses are cached, and only those the caller's validate() accepts, so a
+# malformed answer is asked for again next time rather than replayed.
+
+LLM_CACHE_PATH = os.environ.get('WORKOUT_LLM_CACHE_PATH', 'llm_cache.db')
+LLM_CACHE_TTL = float(os.environ.get('WORKOUT_LLM_CACHE_TTL', 7 * 86400))  # Seconds
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('WORKOUT_LLM_CACHE_MAX_ENTRIES', 2000))
+
+
+def normalize_prompt(prompt):
+    # Indentation and line wrapping in the prompt templates do not change the answer
+    return ' '.join(prompt.split())
+
+
+def model_name(model):
+    return getattr(model, 'model_name', None) or type(model).__name__
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LLMCache:
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()  # Guards the connection and the in-flight map
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+
+    @staticmethod
+    def key(model, prompt, options=None):
+        options = json.dumps(options, sort_keys=True, default=str) if options else ''
+        digest = hashlib.sha256(f"{options}\n{normalize_prompt(prompt)}".encode('utf-8')).hexdigest()
+        return f"{model}:{digest}"
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM llm_cache WHERE cache_key = ?",
+                                     (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE cache_key = ?", (now, key))
+            return row[0]
+
+    def put(self, key, model, response):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("REPLACE INTO llm_cache (cache_key, model, response, created_at, last_used) "
+                               "VALUES (?, ?, ?, ?, ?)", (key, model, response, now, now))
+            # Expired entries first, then the least recently used ones beyond the limit
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute("DELETE FROM llm_cache WHERE cache_key IN (SELECT cache_key FROM llm_cache "
+                               "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def get_or_generate(self, model, prompt, generate, options=None, validate=None):
+        # generate() returns the response text; it runs at most once for concurrent identical requests
+        key = self.key(model, prompt, options)
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            response = self.get(key)
+            if response is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                response = generate()
+                if validate is None or validate(response):
+                    self.put(key, model, response)
+            flight.result = response
+            return response
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+
+def cached_generate(model, prompt, validate=None, cache=None, **options):
+    # model.generate_content(prompt, **options).text, answered from the cache when possible
+    cache = cache or get_llm_cache()
+    start = time.perf_counter()
+    text = cache.get_or_generate(model_name(model), prompt,
+                                 lambda: model.generate_content(prompt, **options).text, options, validate)
+    logging.info(f"LLM response in {(time.perf_counter() - start) * 1000:.0f} ms "
+                 f"({cache.hits} cache hits, {cache.misses} misses so far)")
+    return text
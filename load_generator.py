@@ -0,0 +1,184 @@
+import argparse
+import sys
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+from feedback_codes import FeedbackCode, encode_mistakes, is_mistake
+from storage import STORAGE_BACKEND, STORAGE_ERRORS, SQLiteStorage, create_storage
+
+# Bulk-loads synthetic members, scores, exercise feedback and chat history so the dashboard,
+# leaderboard and search queries can be measured at realistic scale. The same arguments and
+# seed always produce the same rows.
+#
+#   python load_generator.py --sqlite-path bench.db --users 20000 --days 365
+#   python load_generator.py --backend mysql --users 5000 --activity pareto
+#
+# Point it at a separate SQLite file or a scratch MySQL server, not at your own data.
+
+EXERCISE_TYPES = ('squat', 'bicep_curl', 'push_up')
+MISTAKE_CODES = [code for code in FeedbackCode if is_mistake(code)]
+CHAT_WORDS = ("squat depth knee back form rep set protein meal prep plan rest day curl elbow swing "
+              "warm up stretch cardio weight goal calories sleep tempo posture core breathing").split()
+USERS_PER_CHUNK = 500  # Members generated and committed together
+
+
+def user_activity(rng, users, mean, distribution):
+    # Probability that each member works out on a given day
+    if distribution == 'uniform':
+        return np.full(users, mean)
+    # Pareto: a few very active members and a long tail of occasional ones
+    weights = rng.pareto(1.5, users) + 1
+    return np.clip(weights / weights.mean() * mean, 0.01, 1.0)
+
+
+def draw_points(rng, count, distribution):
+    if distribution == 'normal':
+        points = rng.normal(5.0, 2.0, count)
+    else:
+        points = rng.uniform(0.1, 10.0, count)
+    return np.round(np.clip(points, 0.1, 10.0), 1)
+
+
+def chat_message(rng, sender):
+    words = rng.choice(CHAT_WORDS, rng.integers(4, 30))
+    text = ' '.join(words)
+    return f"How do I improve my {text}?" if sender == 'User' else f"Focus on {text}."
+
+
+class LoadGenerator:
+    def __init__(self, storage, args):
+        self.storage = storage
+        self.args = args
+        self.rng = np.random.default_rng(args.seed)
+        self.end_date = date.fromisoformat(args.end_date) if args.end_date else datetime.now().date()
+        self.counts = {'users': 0, 'user_score': 0, 'exercise': 0, 'user_totals': 0, 'exercise_feedback': 0,
+                       'score_rollup': 0, 'chat_log': 0}
+
+    def _next_id(self, tx, table):
+        return self.storage._execute(tx, f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchall()[0][0] + 1
+
+    def _insert(self, tx, table, columns, rows):
+        batch = self.args.batch
+        for start in range(0, len(rows), batch):
+            self.storage.bulk_insert(tx, table, columns, rows[start:start + batch])
+        self.counts[table] += len(rows)
+
+    def _create_users(self, tx, first, count):
+        user_id = self._next_id(tx, 'users')
+        created = datetime.combine(self.end_date - timedelta(days=self.args.days), datetime.min.time())
+        rows = [(user_id + i, f"{self.args.prefix}-{self.args.seed}-{first + i}", created) for i in range(count)]
+        self._insert(tx, 'users', ('id', 'name', 'created_at'), rows)
+        return np.arange(user_id, user_id + count)
+
+    def _load_scores(self, tx, first, count):
+        args, rng = self.args, self.rng
+        user_ids = self._create_users(tx, first, count)
+        activity = user_activity(rng, count, args.activity_rate, args.activity)
+
+        # Which (member, day) pairs have a workout: one user_score row each
+        active = rng.random((count, args.days)) < activity[:, None]
+        members, day_offsets = np.nonzero(active)
+        score_ids = self._next_id(tx, 'user_score') + np.arange(len(members))
+
+        # One to three distinct exercises per workout
+        exercise_mask = rng.random((len(members), len(EXERCISE_TYPES))) < 0.6
+        exercise_mask[np.arange(len(members)), rng.integers(0, len(EXERCISE_TYPES), len(members))] = True
+        workout_index, exercise_index = np.nonzero(exercise_mask)
+        points = draw_points(rng, len(workout_index), args.points)
+        daily_totals = np.round(np.bincount(workout_index, weights=points, minlength=len(members)), 1)
+
+        days = [self.end_date - timedelta(days=int(offset)) for offset in range(args.days)]
+        self._insert(tx, 'user_score', ('id', 'user_id', 'total_points', 'score_date'), [
+            (int(score_id), int(user_ids[member]), float(total), days[offset])
+            for score_id, member, total, offset in zip(score_ids, members, daily_totals, day_offsets)
+        ])
+        self._insert(tx, 'exercise', ('user_score_id', 'exercise_type', 'points'), [
+            (int(score_ids[workout]), EXERCISE_TYPES[exercise], float(point))
+            for workout, exercise, point in zip(workout_index, exercise_index, points)
+        ])
+
+        # Running totals, as the live writes would have left them
+        totals = np.round(np.bincount(members, weights=daily_totals, minlength=count), 1)
+        self._insert(tx, 'user_totals', ('user_id', 'total_points'), [
+            (int(user_id), float(total)) for user_id, total in zip(user_ids, totals) if total > 0
+        ])
+
+        # Feedback for a share of the exercises, with 0-3 mistakes each
+        with_feedback = np.nonzero(rng.random(len(workout_index)) < args.feedback_rate)[0]
+        mistake_counts = rng.integers(0, 4, len(with_feedback))
+        feedback_rows = []
+        for row, mistakes in zip(with_feedback, mistake_counts):
+            workout = workout_index[row]
+            codes = sorted(rng.choice(MISTAKE_CODES, mistakes, replace=False)) if mistakes else []
+            feedback_rows.append((int(user_ids[members[workout]]), EXERCISE_TYPES[exercise_index[row]],
+                                  int(rng.integers(5, 30)), encode_mistakes(codes), float(points[row]),
+                                  days[day_offsets[workout]]))
+        self._insert(tx, 'exercise_feedback',
+                     ('user_id', 'exercise_name', 'reps_completed', 'mistakes', 'score', 'feedback_date'),
+                     feedback_rows)
+
+        # Rollups and streaks for the new members, as the live writes would have kept them
+        self.counts['score_rollup'] += self.storage.rebuild_rollups(tx, int(user_ids[0]), int(user_ids[-1]))
+
+    def _load_chat(self, tx, count):
+        # Chat history, spread over the whole period
+        args, rng = self.args, self.rng
+        messages = int(rng.poisson(args.messages_per_user * count))
+        if messages:
+            start = datetime.combine(self.end_date - timedelta(days=args.days - 1), datetime.min.time())
+            seconds = np.sort(rng.integers(0, args.days * 86400, messages))
+            self._insert(tx, 'chat_log', ('session_id', 'timestamp', 'sender', 'message'), [
+                (None, start + timedelta(seconds=int(second)), sender, chat_message(rng, sender))
+                for second, sender in zip(seconds, np.where(np.arange(messages) % 2, 'AI', 'User').tolist())
+            ])
+
+    def run(self):
+        started = time.perf_counter()
+        for first in range(0, self.args.users, USERS_PER_CHUNK):
+            count = min(USERS_PER_CHUNK, self.args.users - first)
+            # Chat lives in its own database on MySQL, so it gets its own transaction
+            with self.storage.transaction('exercise_tracker') as tx:
+                self._load_scores(tx, first, count)
+            with self.storage.transaction('workout_assistant') as tx:
+                self._load_chat(tx, count)
+            elapsed = time.perf_counter() - started
+            rows = sum(self.counts.values())
+            print(f"{first + count}/{self.args.users} members, {rows} rows, {rows / elapsed:.0f} rows/sec", flush=True)
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load synthetic data for query benchmarks")
+    parser.add_argument("--backend", choices=['sqlite', 'mysql'], default=STORAGE_BACKEND)
+    parser.add_argument("--sqlite-path", default="bench.db", help="SQLite file to load into (default: bench.db)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365, help="Days of history ending at --end-date")
+    parser.add_argument("--end-date", help="Last day of generated history, YYYY-MM-DD (default: today)")
+    parser.add_argument("--activity", choices=['uniform', 'pareto'], default='pareto',
+                        help="How workout frequency is spread across members")
+    parser.add_argument("--activity-rate", type=float, default=0.4, help="Mean chance of a workout per member per day")
+    parser.add_argument("--points", choices=['uniform', 'normal'], default='uniform', help="Points per exercise")
+    parser.add_argument("--feedback-rate", type=float, default=0.5, help="Share of exercises with a feedback row")
+    parser.add_argument("--messages-per-user", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prefix", default="loadgen", help="Member name prefix; names must not exist yet")
+    parser.add_argument("--batch", type=int, default=5000, help="Rows per executemany call")
+    args = parser.parse_args()
+
+    storage = SQLiteStorage(args.sqlite_path) if args.backend == 'sqlite' else create_storage('mysql')
+    try:
+        if not storage.migrate():
+            print("Migrations failed, nothing loaded.")
+            return 1
+        elapsed = LoadGenerator(storage, args).run()
+    except STORAGE_ERRORS as e:
+        print(f"Load failed: {e}")
+        return 1
+    finally:
+        storage.close()
+    print(f"Loaded in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
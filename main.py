@@ -2,6 +2,7 @@ import sys
 from PyQt6.QtWidgets import QApplication
 from sign_up import LoginPage
 from dashboard import Dashboard  # Assuming your dashboard class is in a file named dashboard.py
+from db_manager import set_current_user
 
 class MainApplication:
     def __init__(self):
@@ -16,6 +17,8 @@ class MainApplication:
 
     def show_dashboard(self, username):
         self.login_page.hide()
+        # Scores, feedback and the leaderboard position belong to the signed-in member
+        set_current_user(username)
         self.dashboard = Dashboard()
         self.dashboard.show()
         # You can pass the username to the dashboard if needed
@@ -1,6 +1,7 @@
 import google.generativeai as genai
 import json
 import logging
+from llm_cache import cached_generate
 
 class MealPlanExtractor:
     def __init__(self, api_key):
@@ -36,13 +37,20 @@ class MealPlanExtractor:
         """
 
         try:
-            response = self.model.generate_content(prompt)
-            meal_plan = json.loads(response.text)
+            meal_plan = json.loads(cached_generate(self.model, prompt, validate=self.is_meal_plan_json))
             return meal_plan
         except Exception as e:
             logging.error(f"Error in extract_meal_plan: {str(e)}")
             return self.generate_default_meal_plan()
 
+    @staticmethod
+    def is_meal_plan_json(response_text):
+        try:
+            json.loads(response_text)
+            return True
+        except json.JSONDecodeError:
+            return False
+
     def generate_default_meal_plan(self):
         # Create a simple default meal plan if extraction fails
         default_plan = []
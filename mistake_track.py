@@ -1,8 +1,6 @@
 import sys
 import cv2
 import os
-import mysql.connector
-from mysql.connector import Error
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton,  QListWidget, QFrame, QTextEdit,
@@ -21,31 +19,31 @@ from demo1 import VideoProcessor
 from workout_plan_widget import WorkoutPlanWidget
 from elevenlabs import Voice, VoiceSettings, play
 from elevenlabs.client import ElevenLabs
+from collections import Counter
+from feedback_codes import is_mistake, render_feedback
 
 
 class MistakeTracker:
     def __init__(self):
+        # Counts per feedback code; text is only rendered when the report is built
         self.mistakes_log = {
-            'bicep_curl': {'incorrect_form': 0, 'wrong_weight': 0, 'other': 0},
-            'squat': {'incorrect_form': 0, 'wrong_depth': 0, 'other': 0}
+            'bicep_curl': Counter(),
+            'squat': Counter()
         }
 
     def update_mistakes(self, exercise_data):
-        self.mistakes_log['bicep_curl']['incorrect_form'] += exercise_data['bicep_curl_feedback'].count('incorrect_form')
-        self.mistakes_log['bicep_curl']['wrong_weight'] += exercise_data['bicep_curl_feedback'].count('wrong_weight')
-        self.mistakes_log['bicep_curl']['other'] += exercise_data['bicep_curl_feedback'].count('other')
-        
-        self.mistakes_log['squat']['incorrect_form'] += exercise_data['squat_feedback'].count('incorrect_form')
-        self.mistakes_log['squat']['wrong_depth'] += exercise_data['squat_feedback'].count('wrong_depth')
-        self.mistakes_log['squat']['other'] += exercise_data['squat_feedback'].count('other')
+        self.mistakes_log['bicep_curl'].update(code for code in exercise_data['bicep_curl_feedback'] if is_mistake(code))
+        self.mistakes_log['squat'].update(code for code in exercise_data['squat_feedback'] if is_mistake(code))
 
     def generate_mistakes_report(self):
         report = "Exercise Mistakes Report\n\n"
 
         for exercise, mistakes in self.mistakes_log.items():
             report += f"{exercise.upper()} MISTAKES:\n"
-            for mistake_type, count in mistakes.items():
-                report += f"  - {mistake_type.replace('_', ' ').title()}: {count}\n"
+            if not mistakes:
+                report += "  - None\n"
+            for code, count in mistakes.items():
+                report += f"  - {render_feedback(code)}: {count}\n"
             report += "\n"
         
         return report
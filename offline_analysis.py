@@ -0,0 +1,342 @@
+import numpy as np
+from feedback_codes import FeedbackCode
+
+# Vectorized versions of the live analysis in exercise_analysis.py, for recorded sessions.
+# Everything here works on whole (frames, ...) arrays instead of one frame at a time.
+
+VISIBILITY_THRESHOLD = 0.6
+BODY_SWING_DETECTION_ANGLE = 18  # BicepCurlAnalyzer.body_swing_angle_threshold
+
+# MediaPipe Pose landmark indices
+LEFT_EAR, RIGHT_EAR = 7, 8
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_ELBOW, RIGHT_ELBOW = 13, 14
+LEFT_WRIST, RIGHT_WRIST = 15, 16
+LEFT_HIP, RIGHT_HIP = 23, 24
+LEFT_KNEE, RIGHT_KNEE = 25, 26
+LEFT_ANKLE, RIGHT_ANKLE = 27, 28
+
+# threshold key -> (exercise, feedback code, per-rep statistic, comparison that flags the mistake)
+FORM_RULES = {
+    'squat_too_deep': ('squat', FeedbackCode.SQUAT_TOO_DEEP, 'hold_knee_angle', 'below'),
+    'squat_not_deep_enough': ('squat', FeedbackCode.SQUAT_LOWER_HIPS, 'hold_knee_angle', 'at_or_above'),
+    'squat_forward_bend_too_little': ('squat', FeedbackCode.SQUAT_BEND_FORWARD_MORE, 'hold_back_angle', 'below'),
+    'squat_forward_bend_too_much': ('squat', FeedbackCode.SQUAT_FORWARD_BEND_TOO_MUCH, 'hold_back_angle', 'above'),
+    'bicep_curl_not_low_enough': ('bicep_curl', FeedbackCode.CURL_EXTEND_ARM, 'max_bicep_angle', 'above'),
+    'bicep_curl_not_high_enough': ('bicep_curl', FeedbackCode.CURL_HIGHER, 'max_up_bicep_angle', 'above'),
+    'bicep_curl_elbow_movement': ('bicep_curl', FeedbackCode.CURL_ELBOW_STILL, 'max_elbow_movement', 'above'),
+    'bicep_curl_body_swing': ('bicep_curl', FeedbackCode.CURL_BODY_SWING_EXCESSIVE, 'max_swing_angle', 'above'),
+}
+
+# analyze_squat_form checks these pairs with if/elif: rule -> the rule that, when it fires, stops it being checked
+EXCLUSIVE_RULES = {
+    'squat_forward_bend_too_much': 'squat_forward_bend_too_little',
+    'squat_not_deep_enough': 'squat_too_deep',
+}
+
+# (start, bottom, end) angles of the live ExerciseCounter state machines
+SQUAT_STATE_THRESHOLDS = (160, 80, 160)
+BICEP_CURL_STATE_THRESHOLDS = (160, 90, 150)
+EXERCISE_ANGLE = {
+    'squat': 'knee_angle',
+    'bicep_curl': 'bicep_angle',
+}
+
+COMPARISONS = {
+    'above': np.greater,
+    'below': np.less,
+    'at_or_above': np.greater_equal,
+}
+
+
+def angle_deg(p1, pref, p2):
+    # AngleCalculator.angle_deg over (frames, 2) arrays
+    v1 = p1 - pref
+    v2 = p2 - pref
+    dot = np.einsum('ij,ij->i', v1, v2)
+    norms = np.linalg.norm(v1, axis=1) * np.linalg.norm(v2, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_theta = dot / norms
+    return np.degrees(np.arccos(np.clip(cos_theta, -1.0, 1.0)))
+
+
+def find_angle(p1, p2):
+    # AngleCalculator.findAngle over (frames, 2) arrays
+    x1, y1 = p1[:, 0], p1[:, 1]
+    x2, y2 = p2[:, 0], p2[:, 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        theta = np.arccos((y2 - y1) * (-y1) / (np.hypot(x2 - x1, y2 - y1) * y1))
+    return int(180 / np.pi) * theta
+
+
+def compute_features(landmarks, visibility_threshold=VISIBILITY_THRESHOLD):
+    # landmarks: (frames, 33, 4) array of x, y, z, visibility
+    lm = np.asarray(landmarks, dtype=np.float64)
+    xy = lm[:, :, :2]
+    visible = lm[:, :, 3] > visibility_threshold
+
+    knee_angle = (angle_deg(xy[:, LEFT_HIP], xy[:, LEFT_KNEE], xy[:, LEFT_ANKLE]) +
+                  angle_deg(xy[:, RIGHT_HIP], xy[:, RIGHT_KNEE], xy[:, RIGHT_ANKLE])) / 2
+
+    left_vertical = np.stack([xy[:, LEFT_SHOULDER, 0], xy[:, LEFT_HIP, 1]], axis=1)
+    right_vertical = np.stack([xy[:, RIGHT_SHOULDER, 0], xy[:, RIGHT_HIP, 1]], axis=1)
+    back_angle = (angle_deg(xy[:, LEFT_HIP], xy[:, LEFT_SHOULDER], left_vertical) +
+                  angle_deg(xy[:, RIGHT_HIP], xy[:, RIGHT_SHOULDER], right_vertical)) / 2
+
+    # The live loop follows the arm with the smaller (more curled) angle on every frame
+    left_bicep = angle_deg(xy[:, LEFT_SHOULDER], xy[:, LEFT_ELBOW], xy[:, LEFT_WRIST])
+    right_bicep = angle_deg(xy[:, RIGHT_SHOULDER], xy[:, RIGHT_ELBOW], xy[:, RIGHT_WRIST])
+    use_left = left_bicep < right_bicep
+    bicep_angle = np.where(use_left, left_bicep, right_bicep)
+    elbow = np.where(use_left[:, None], xy[:, LEFT_ELBOW], xy[:, RIGHT_ELBOW])
+
+    left_arm_visible = visible[:, LEFT_HIP] & visible[:, LEFT_SHOULDER] & visible[:, LEFT_ELBOW]
+    right_arm_visible = visible[:, RIGHT_HIP] & visible[:, RIGHT_SHOULDER] & visible[:, RIGHT_ELBOW]
+    left_elbow_torso = np.where(left_arm_visible,
+                                angle_deg(xy[:, LEFT_HIP], xy[:, LEFT_SHOULDER], xy[:, LEFT_ELBOW]), np.nan)
+    right_elbow_torso = np.where(right_arm_visible,
+                                 angle_deg(xy[:, RIGHT_HIP], xy[:, RIGHT_SHOULDER], xy[:, RIGHT_ELBOW]), np.nan)
+    elbow_torso_angle = np.where(use_left, left_elbow_torso, right_elbow_torso)
+
+    left_torso_visible = visible[:, LEFT_HIP] & visible[:, LEFT_SHOULDER]
+    right_torso_visible = visible[:, RIGHT_HIP] & visible[:, RIGHT_SHOULDER]
+    hip_shoulder_angle = np.where(
+        left_torso_visible, find_angle(xy[:, LEFT_HIP], xy[:, LEFT_SHOULDER]),
+        np.where(right_torso_visible, find_angle(xy[:, RIGHT_HIP], xy[:, RIGHT_SHOULDER]), np.nan))
+
+    return {
+        'knee_angle': knee_angle,
+        'back_angle': back_angle,
+        'bicep_angle': bicep_angle,
+        'elbow': elbow,
+        'elbow_torso_angle': elbow_torso_angle,
+        'hip_shoulder_angle': hip_shoulder_angle,
+        'visibility': lm[:, :, 3].mean(axis=1),
+    }
+
+
+def _next_true(mask):
+    # next_index[i] is the first j >= i where mask[j] holds, or len(mask); one extra
+    # sentinel entry lets callers look up i == len(mask)
+    n = len(mask)
+    indices = np.where(mask, np.arange(n), n)
+    next_index = np.minimum.accumulate(indices[::-1])[::-1]
+    return np.append(next_index, n)
+
+
+def segment_reps(angles, start_threshold, bottom_threshold, end_threshold, initial_prev_angle=180):
+    # Replays ExerciseCounter.process_squat / process_bicep_curl over a whole angle series:
+    #   IDLE  -> START when angle < start_threshold
+    #   START -> DOWN  when angle < bottom_threshold, back to IDLE if the angle rises first
+    #   DOWN  -> HOLD  when the angle stops falling
+    #   HOLD  -> UP    when the angle rises
+    #   UP    -> IDLE  when angle >= end_threshold, counting one rep
+    # Every transition is a "first frame after i where <condition>" lookup into arrays
+    # computed once for the whole series, so the loop runs per rep, not per frame.
+    angles = np.asarray(angles, dtype=np.float64)
+    n = len(angles)
+    prev = np.concatenate(([initial_prev_angle], angles[:-1]))
+    rising = angles > prev
+
+    next_start = _next_true(angles < start_threshold)
+    next_start_exit = _next_true((angles < bottom_threshold) | rising)
+    next_hold = _next_true(angles <= prev)
+    next_up = _next_true(rising)
+    next_end = _next_true(angles >= end_threshold)
+    below_bottom = angles < bottom_threshold
+
+    starts, bottoms, holds, ups, ends = [], [], [], [], []
+    i = 0
+    while i < n:
+        start = next_start[i]
+        if start >= n:
+            break
+        bottom = next_start_exit[start + 1]
+        if bottom >= n:
+            break
+        if not below_bottom[bottom]:
+            # Angle rose before reaching the bottom threshold: back to IDLE without a rep
+            i = bottom + 1
+            continue
+        hold = next_hold[bottom + 1]
+        if hold >= n:
+            break
+        up = next_up[hold + 1]
+        if up >= n:
+            break
+        end = next_end[up + 1]
+        if end >= n:
+            break
+        starts.append(start)
+        bottoms.append(bottom)
+        holds.append(hold)
+        ups.append(up)
+        ends.append(end)
+        i = end + 1
+
+    return {
+        'start': np.array(starts, dtype=np.int64),
+        'bottom': np.array(bottoms, dtype=np.int64),
+        'hold': np.array(holds, dtype=np.int64),
+        'up': np.array(ups, dtype=np.int64),
+        'end': np.array(ends, dtype=np.int64),
+    }
+
+
+def segment_exercise(features, exercise):
+    if exercise == 'squat':
+        thresholds = SQUAT_STATE_THRESHOLDS
+    elif exercise == 'bicep_curl':
+        thresholds = BICEP_CURL_STATE_THRESHOLDS
+    else:
+        raise ValueError(f"Unsupported exercise: {exercise}")
+    return segment_reps(features[EXERCISE_ANGLE[exercise]], *thresholds)
+
+
+def _segment_frames(starts, ends):
+    # Frame indices of every segment laid end to end, plus each segment's offset into them
+    lengths = ends - starts + 1
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    frames = np.arange(lengths.sum()) - np.repeat(offsets - starts, lengths)
+    segment_ids = np.repeat(np.arange(len(starts)), lengths)
+    return frames, offsets, segment_ids
+
+
+def rep_phase_frames(angles, bottom_threshold, starts, ends):
+    # Where the live state machine enters DOWN/UP (the first frame after start below
+    # bottom_threshold) and HOLD (the first frame after that which does not fall further)
+    # inside each [start, end] range; -1 for ranges it would never take that far
+    n = len(angles)
+    prev = np.concatenate(([180.0], angles[:-1]))
+    next_bottom = _next_true(angles < bottom_threshold)
+    next_hold = _next_true(angles <= prev)
+
+    bottoms = next_bottom[np.minimum(starts + 1, n)]
+    holds = next_hold[np.minimum(bottoms + 1, n)]
+    reached = holds <= ends
+    return np.where(reached, bottoms, -1), np.where(reached, holds, -1)
+
+
+def _at(values, frames):
+    # values[frames], NaN where frames is -1
+    return np.where(frames >= 0, values[np.maximum(frames, 0)], np.nan)
+
+
+def squat_rep_statistics(features, starts, ends, holds=None):
+    # Form is judged where ExerciseCounter.process_squat judges it, on the DOWN -> HOLD frame;
+    # ranges it would never judge get NaN statistics and so no mistakes
+    if holds is None:
+        _, holds = rep_phase_frames(features['knee_angle'], SQUAT_STATE_THRESHOLDS[1], starts, ends)
+    holds = np.asarray(holds, dtype=np.int64)
+    return {
+        'hold_frame': holds,
+        'hold_knee_angle': _at(features['knee_angle'], holds),
+        'hold_back_angle': _at(features['back_angle'], holds),
+    }
+
+
+def bicep_curl_rep_statistics(features, starts, ends, bottoms=None, holds=None):
+    # BicepCurlAnalyzer records its reference positions on the start frame and judges
+    # every frame after it, so the start frame itself is excluded
+    first = np.minimum(starts + 1, ends)
+    frames, offsets, segment_ids = _segment_frames(first, ends)
+    start_of_frame = starts[segment_ids]
+
+    bicep = features['bicep_angle'][frames]
+    elbow_movement = np.linalg.norm(features['elbow'][frames] - features['elbow'][start_of_frame], axis=1)
+    swing = np.abs(features['hip_shoulder_angle'][frames] - features['hip_shoulder_angle'][start_of_frame])
+
+    # "Curl higher" is only checked while the state machine is in CURL_UP, from the first
+    # frame below the up threshold until the angle stops falling
+    if bottoms is None or holds is None:
+        bottoms, holds = rep_phase_frames(features['bicep_angle'], BICEP_CURL_STATE_THRESHOLDS[1], starts, ends)
+    bottoms, holds = np.asarray(bottoms, dtype=np.int64), np.asarray(holds, dtype=np.int64)
+    curling = holds >= 0
+    max_up = np.full(len(starts), np.nan)
+    if curling.any():
+        up_frames, up_offsets, _ = _segment_frames(bottoms[curling], holds[curling] - 1)
+        max_up[curling] = np.fmax.reduceat(features['bicep_angle'][up_frames], up_offsets)
+
+    max_swing = np.fmax.reduceat(swing, offsets)
+    # Severity only matters once a swing has been detected at all
+    max_swing = np.where(max_swing > BODY_SWING_DETECTION_ANGLE, max_swing, 0.0)
+
+    return {
+        'max_bicep_angle': np.fmax.reduceat(bicep, offsets),
+        'max_up_bicep_angle': max_up,
+        'max_elbow_movement': np.fmax.reduceat(elbow_movement, offsets),
+        'max_swing_angle': max_swing,
+    }
+
+
+def rep_statistics(features, exercise, starts, ends, bottoms=None, holds=None):
+    # bottoms, holds: the DOWN/UP and HOLD frames from segment_reps(); derived from the ranges when not given
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    if len(starts) == 0:
+        return {}
+    if exercise == 'squat':
+        return squat_rep_statistics(features, starts, ends, holds)
+    if exercise == 'bicep_curl':
+        return bicep_curl_rep_statistics(features, starts, ends, bottoms, holds)
+    raise ValueError(f"Unsupported exercise: {exercise}")
+
+
+def evaluate_rule(key, statistic, threshold):
+    # Boolean mask of the reps (or candidate thresholds, via broadcasting) that trigger the mistake
+    _, _, _, comparison = FORM_RULES[key]
+    return COMPARISONS[comparison](statistic, threshold)
+
+
+def rules_for_exercise(exercise):
+    return [key for key, rule in FORM_RULES.items() if rule[0] == exercise]
+
+
+def analyze_session(landmarks, exercise, thresholds):
+    # Bulk scoring of a recorded session: rep segmentation, then every form rule
+    # evaluated for all reps at once
+    features = compute_features(landmarks)
+    segments = segment_exercise(features, exercise)
+    stats = rep_statistics(features, exercise, segments['start'], segments['end'],
+                           segments['bottom'], segments['hold'])
+
+    rep_count = len(segments['start'])
+    mistakes = [[] for _ in range(rep_count)]
+    if rep_count:
+        flagged = {}
+        for key in rules_for_exercise(exercise):
+            _, code, stat_name, _ = FORM_RULES[key]
+            flagged[key] = evaluate_rule(key, stats[stat_name], thresholds[key])
+            if key in EXCLUSIVE_RULES:
+                flagged[key] &= ~flagged[EXCLUSIVE_RULES[key]]
+            for rep in np.flatnonzero(flagged[key]):
+                mistakes[rep].append(code)
+
+    return {
+        'reps': rep_count,
+        'segments': segments,
+        'statistics': stats,
+        'mistakes': mistakes,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from landmark_session import load_session
+    from threshold_store import ThresholdStore
+
+    store = ThresholdStore()
+    store.load("thresholds.json")
+    for path in sys.argv[1:]:
+        session = load_session(path)
+        started = time.perf_counter()
+        result = analyze_session(session.landmarks, session.exercise, store.current)
+        elapsed = time.perf_counter() - started
+        duration = len(session) / session.fps if session.fps else 0
+        speed = duration / elapsed if elapsed else float('inf')
+        print(f"{path}: {session.exercise}, {result['reps']} reps, {len(session)} frames "
+              f"analyzed in {elapsed * 1000:.1f} ms ({speed:.0f}x real time)")
+        for rep, codes in enumerate(result['mistakes']):
+            start, end = result['segments']['start'][rep], result['segments']['end'][rep]
+            print(f"  rep {rep + 1} (frames {start}-{end}): {[code.name for code in codes] or 'correct form'}")
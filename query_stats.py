@@ -0,0 +1,202 @@
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Per-statement and per-call-site timing for everything the storage layer executes.
+# storage.py routes each statement through timed(); queries slower than SLOW_QUERY_MS are
+# logged with their parameters redacted. Read the numbers with summary():
+#
+#     print(query_stats.summary())    # or Ctrl+Shift+Q in the app, or at exit with WORKOUT_QUERY_STATS=1
+
+SLOW_QUERY_MS = float(os.environ.get('WORKOUT_SLOW_QUERY_MS', 100))
+LOG_SUMMARY_AT_EXIT = os.environ.get('WORKOUT_QUERY_STATS') == '1'
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is everything slower
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float('inf'))
+
+# Frames in these files are the storage layer itself; the call site is the first frame outside them
+STORAGE_LAYER_FILES = {'query_stats.py', 'storage.py', 'db_pool.py', 'db_writer.py', 'db_manager.py',
+                       'update_survey.py', 'contextlib.py'}
+
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class StatementStats:
+    __slots__ = ('count', 'errors', 'rows', 'total_ms', 'max_ms', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * len(BUCKETS_MS)
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding this fraction of the calls
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.histogram):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+
+class SiteStats:
+    __slots__ = ('count', 'total_ms', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements = set()
+
+
+_statements = {}
+_sites = {}
+
+
+@lru_cache(maxsize=512)
+def statement_key(sql):
+    # Whitespace-normalized SQL; statements are constants, so this is cached
+    return ' '.join(sql.split())
+
+
+def redact(params):
+    # Types and sizes only: chat messages, survey answers and names never reach the log
+    if params is None:
+        return '()'
+    return '(' + ', '.join(
+        f"<{type(value).__name__}:{len(value)}>" if isinstance(value, (str, bytes)) else f"<{type(value).__name__}>"
+        for value in params
+    ) + ')'
+
+
+def call_site():
+    override = getattr(_local, 'site', None)
+    if override is not None:
+        return override
+    frame = sys._getframe(1)
+    while frame is not None and os.path.basename(frame.f_code.co_filename) in STORAGE_LAYER_FILES:
+        frame = frame.f_back
+    if frame is None:
+        return 'unknown'
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+@contextmanager
+def attributed(site):
+    # Charge queries run here (e.g. on the writer thread) to the site that asked for them
+    previous = getattr(_local, 'site', None)
+    _local.site = site
+    try:
+        yield
+    finally:
+        _local.site = previous
+
+
+def _record(sql, params, elapsed_ms, failed):
+    key = statement_key(sql)
+    site = call_site()
+    with _lock:
+        stats = _statements.get(key)
+        if stats is None:
+            stats = _statements[key] = StatementStats()
+        stats.count += 1
+        stats.errors += failed
+        stats.total_ms += elapsed_ms
+        if elapsed_ms > stats.max_ms:
+            stats.max_ms = elapsed_ms
+        stats.histogram[bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+
+        site_stats = _sites.get(site)
+        if site_stats is None:
+            site_stats = _sites[site] = SiteStats()
+        site_stats.count += 1
+        site_stats.total_ms += elapsed_ms
+        site_stats.statements.add(key)
+
+    if failed:
+        logging.error(f"Query failed after {elapsed_ms:.1f} ms at {site}: {key[:200]} {redact(params)}")
+    elif elapsed_ms >= SLOW_QUERY_MS:
+        logging.warning(f"Slow query, {elapsed_ms:.1f} ms at {site}: {key[:200]} {redact(params)}")
+
+
+def timed(sql, params, execute, *args):
+    # Runs execute(*args) and records it under sql; args are what the driver needs, which
+    # may be a rewritten form of sql
+    start = time.perf_counter()
+    try:
+        result = execute(*args)
+    except Exception:
+        _record(sql, params, (time.perf_counter() - start) * 1000, True)
+        raise
+    _record(sql, params, (time.perf_counter() - start) * 1000, False)
+    return result
+
+
+def add_rows(sql, rows):
+    key = statement_key(sql)
+    with _lock:
+        stats = _statements.get(key)
+        if stats is not None:
+            stats.rows += rows
+
+
+class InstrumentedCursor:
+    # Passes everything through to the driver's cursor and counts the rows fetched from it
+    def __init__(self, cursor, sql):
+        self._cursor = cursor
+        self._sql = sql
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        add_rows(self._sql, len(rows))
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            add_rows(self._sql, 1)
+        return row
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def reset():
+    with _lock:
+        _statements.clear()
+        _sites.clear()
+
+
+def summary(limit=15):
+    with _lock:
+        statements = sorted(_statements.items(), key=lambda item: item[1].total_ms, reverse=True)
+        sites = sorted(_sites.items(), key=lambda item: item[1].total_ms, reverse=True)
+        lines = [f"Query statistics ({sum(stats.count for _, stats in statements)} statements)",
+                 f"{'calls':>7}{'errors':>7}{'rows':>9}{'total ms':>10}{'mean':>8}{'p50':>8}{'p95':>8}{'max':>9}  statement"]
+        for key, stats in statements[:limit]:
+            lines.append(f"{stats.count:>7}{stats.errors:>7}{stats.rows:>9}{stats.total_ms:>10.1f}"
+                         f"{stats.total_ms / stats.count:>8.2f}{stats.percentile(0.5):>8.2f}"
+                         f"{stats.percentile(0.95):>8.2f}{stats.max_ms:>9.2f}  {key[:90]}")
+        lines.append(f"{'calls':>7}{'total ms':>10}{'stmts':>7}  call site")
+        for site, stats in sites[:limit]:
+            lines.append(f"{stats.count:>7}{stats.total_ms:>10.1f}{len(stats.statements):>7}  {site}")
+    return '\n'.join(lines)
+
+
+def histogram(sql):
+    # (bucket upper bound in ms, calls) pairs for one statement
+    with _lock:
+        stats = _statements.get(statement_key(sql))
+        return list(zip(BUCKETS_MS, stats.histogram)) if stats is not None else []
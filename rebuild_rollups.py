@@ -0,0 +1,50 @@
+import argparse
+import sys
+import time
+from archive import ArchiveStore
+from storage import STORAGE_BACKEND, SQLITE_PATH, STORAGE_ERRORS, SQLiteStorage, create_storage
+
+# Recomputes the daily, weekly and monthly score rollups and the workout streaks from the
+# raw score and feedback rows. Score writes keep them up to date on their own; run this after
+# editing those tables by hand or restoring a backup.
+#
+#   python rebuild_rollups.py
+#   python rebuild_rollups.py --user alice@example.com
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild score rollups and streaks")
+    parser.add_argument("--backend", choices=['sqlite', 'mysql'], default=STORAGE_BACKEND)
+    parser.add_argument("--sqlite-path", default=SQLITE_PATH, help="SQLite file to rebuild (default: the app's)")
+    parser.add_argument("--user", help="Only rebuild this member, by name (default: everyone)")
+    args = parser.parse_args()
+
+    storage = SQLiteStorage(args.sqlite_path) if args.backend == 'sqlite' else create_storage('mysql')
+    started = time.perf_counter()
+    try:
+        if not storage.migrate():
+            print("Migrations failed, nothing rebuilt.")
+            return 1
+        # Feedback moved to the archive still counts towards reps and mistakes
+        archived = [(row['user_id'], row['feedback_date'], row['exercise_name'], row['reps_completed'], row['mistakes'])
+                    for row in ArchiveStore().read('exercise_feedback')]
+        with storage.transaction('exercise_tracker') as tx:
+            if args.user:
+                users = storage._execute(tx, "SELECT id FROM users WHERE name = %s", (args.user,)).fetchall()
+                if not users:
+                    print(f"No member named {args.user}")
+                    return 1
+                rows = storage.rebuild_rollups(tx, users[0][0], users[0][0], archived)
+            else:
+                rows = storage.rebuild_rollups(tx, archived_feedback=archived)
+    except (STORAGE_ERRORS + (OSError, ValueError)) as e:
+        print(f"Rebuild failed: {e}")
+        return 1
+    finally:
+        storage.close()
+    print(f"Rebuilt {rows} rollup rows in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+from exercise_analysis import FrameAnalyzer, POSE_LANDMARKS
+from landmark_session import LandmarkSession, LANDMARK_COUNT, load_session
+from offline_analysis import FORM_RULES, analyze_session
+from threshold_store import ThresholdStore
+
+# Replays landmark sequences through the live per-frame analysis (FrameAnalyzer) without
+# MediaPipe or a camera, checks the results against golden files and measures throughput.
+#
+#   python replay_harness.py                    check the built-in synthetic sequences
+#   python replay_harness.py sessions/*.npz     check recorded sessions
+#   python replay_harness.py --update-golden    rewrite golden files after an intended change
+#   python replay_harness.py --bench            logic-only frames/sec and memory allocated per frame
+#
+# Every check also runs offline_analysis.analyze_session() on the same landmarks and requires
+# the same reps, ending on the same frames, with the same form mistakes per rep.
+
+GOLDEN_DIR = "golden"
+SYNTHETIC_FPS = 30
+
+EXERCISE_NAMES = {
+    'squat': 'squat',
+    'bicep_curl': 'bicep curl',
+}
+
+# Feedback codes offline_analysis can produce; the live analysis has a few more that it cannot
+OFFLINE_CODES = {int(rule[1]) for rule in FORM_RULES.values()}
+
+
+def _pose(knee_angle, lean, elbow_angle, arm_swing, rng, noise):
+    # Side-on stick figure in normalized image coordinates (y grows downwards).
+    # knee_angle and elbow_angle are the joint angles, lean tilts the torso forward
+    # from vertical and arm_swing tilts the upper arm forward, all in degrees.
+    landmarks = np.zeros((LANDMARK_COUNT, 4), dtype=np.float64)
+    landmarks[:, 3] = 0.95
+    half_knee = np.radians((180 - knee_angle) / 2)
+    lean = np.radians(lean)
+    arm_swing = np.radians(arm_swing)
+    elbow = np.radians(elbow_angle)
+    leg, torso, upper_arm, forearm = 0.22, 0.28, 0.15, 0.14
+
+    for side, dx in (('left', -0.01), ('right', 0.01)):
+        ankle = np.array([0.5 + dx, 0.92])
+        knee = ankle - leg * np.array([-np.sin(half_knee), np.cos(half_knee)])
+        hip = knee - leg * np.array([np.sin(half_knee), np.cos(half_knee)])
+        shoulder = hip + torso * np.array([np.sin(lean), -np.cos(lean)])
+        ear = shoulder + np.array([0.02, -0.09])
+        elbow_point = shoulder + upper_arm * np.array([np.sin(arm_swing), np.cos(arm_swing)])
+        # Forearm direction measured from the upper arm pointing back at the shoulder
+        forearm_direction = arm_swing + np.pi - elbow
+        wrist = elbow_point + forearm * np.array([np.sin(forearm_direction), np.cos(forearm_direction)])
+        for name, point in (('ankle', ankle), ('knee', knee), ('hip', hip), ('shoulder', shoulder),
+                            ('ear', ear), ('elbow', elbow_point), ('wrist', wrist)):
+            landmarks[POSE_LANDMARKS[f'{side}_{name}'], :2] = point
+
+    if noise:
+        landmarks[:, :2] += rng.normal(0, noise, (LANDMARK_COUNT, 2))
+    return landmarks
+
+
+def _rep_curve(low, high, frames):
+    # One smooth high -> low -> high excursion
+    t = np.linspace(0, 2 * np.pi, frames)
+    return high - (high - low) * (1 - np.cos(t)) / 2
+
+
+def synthetic_session(exercise, depths, seed, noise=0.0, swing=0.0, rest_frames=12, rep_frames=48):
+    # Deterministic sequence: the same arguments always produce the same landmarks
+    rng = np.random.default_rng(seed)
+    frames = []
+    for depth in depths:
+        for phase, value in enumerate(np.concatenate((_rep_curve(depth, 172, rep_frames), np.full(rest_frames, 172)))):
+            progress = (172 - value) / (172 - depth) if depth < 172 else 0
+            if exercise == 'squat':
+                frames.append(_pose(value, 8 + 30 * progress, 170, 0, rng, noise))
+            else:
+                sway = swing * np.sin(np.pi * min(phase, rep_frames) / rep_frames)
+                frames.append(_pose(172, 2 + sway, value, sway / 2, rng, noise))
+    return LandmarkSession(np.asarray(frames, dtype=np.float32), SYNTHETIC_FPS, exercise)
+
+
+SYNTHETIC_SEQUENCES = {
+    'squat_clean': lambda: synthetic_session('squat', [70] * 8, seed=1),
+    'squat_mixed_depth': lambda: synthetic_session('squat', [55, 75, 95, 62, 130, 78, 88, 66], seed=2, noise=0.002),
+    'bicep_curl_clean': lambda: synthetic_session('bicep_curl', [45] * 8, seed=3),
+    'bicep_curl_partial_swing': lambda: synthetic_session('bicep_curl', [45, 100, 60, 120, 40, 70], seed=4,
+                                                          noise=0.002, swing=24),
+}
+
+
+def prepare_frames(session):
+    # Landmarks are turned into the per-frame dicts VideoProcessor builds, ahead of
+    # time, so replay and benchmark timings only cover the analysis logic
+    columns = [3 if axis == 2 else axis for axis in range(3)]  # x, y, visibility
+    names = list(POSE_LANDMARKS)
+    selected = np.asarray(session.landmarks, dtype=np.float64)[:, [POSE_LANDMARKS[name] for name in names]][:, :, columns]
+    return [dict(zip(names, frame)) for frame in selected.tolist()]
+
+
+class ReplayRecorder:
+    # Collects rep completions and feedback changes, as run-length (frame, codes) pairs
+    def __init__(self):
+        self.rep_frames = []
+        self.rep_mistakes = []  # Sorted form mistake codes the live analysis raised during each rep
+        self.feedback = {'squat_feedback': [], 'bicep_curl_feedback': [], 'squat_form': []}
+        self.bad_posture_frames = 0
+        self._reps = 0
+        self._rep_codes = set()
+        self._frame_codes = set()
+        self._started = False
+
+    def watch(self, analyzer):
+        # Sees the form checks the rep state machines run, not just the top feedback they keep
+        counter = analyzer.exercise_counter
+        squat_form = counter.analyze_squat_form_callback
+        analyze_curl = counter.bicep_curl_analyzer.analyze_curl
+        counter.analyze_squat_form_callback = lambda *args: self._codes(squat_form(*args))
+        counter.bicep_curl_analyzer.analyze_curl = lambda *args: self._codes(analyze_curl(*args))
+
+    def _codes(self, feedback):
+        self._frame_codes.update(int(code) for code in feedback if int(code) in OFFLINE_CODES)
+        return feedback
+
+    def _track(self, key, frame, codes):
+        changes = self.feedback[key]
+        codes = [int(code) for code in codes]
+        if not changes or changes[-1][1] != codes:
+            changes.append([frame, codes])
+
+    def add(self, frame, analyzer, result):
+        counter = analyzer.exercise_counter
+        # A rep's mistakes are collected from the frame it starts on to the frame it is counted on
+        started = counter.squat_state.name == 'SQUAT_START' or counter.bicep_curl_state.name == 'CURL_START'
+        if started and not self._started:
+            self._rep_codes = set()
+        self._started = started
+        self._rep_codes |= self._frame_codes
+        self._frame_codes = set()
+
+        reps = counter.squat_counter + counter.curl_counter
+        if reps != self._reps:
+            self.rep_frames.append(frame)
+            self.rep_mistakes.append(sorted(self._rep_codes))
+            self._rep_codes = set()
+            self._reps = reps
+        self._track('squat_feedback', frame, counter.get_squat_feedback())
+        self._track('bicep_curl_feedback', frame, counter.get_bicep_curl_feedback())
+        self._track('squat_form', frame, analyzer.squat_form_feedback)
+        if not result['good_posture']:
+            self.bad_posture_frames += 1
+
+
+def replay(frames, exercise, fps, thresholds=None, recorder=None):
+    analyzer = FrameAnalyzer(fps, ThresholdStore(thresholds))
+    current_exercise = {'name': EXERCISE_NAMES.get(exercise, exercise)}
+    analyze = analyzer.analyze
+    if recorder is None:
+        for points in frames:
+            analyze(points, current_exercise)
+    else:
+        recorder.watch(analyzer)
+        for frame, points in enumerate(frames):
+            recorder.add(frame, analyzer, analyze(points, current_exercise))
+    return analyzer
+
+
+def replay_result(session, thresholds=None, recorder=None):
+    recorder = recorder or ReplayRecorder()
+    analyzer = replay(prepare_frames(session), session.exercise, session.fps, thresholds, recorder)
+    return {
+        'exercise': session.exercise,
+        'frames': len(session),
+        'squat_counter': analyzer.exercise_counter.squat_counter,
+        'curl_counter': analyzer.exercise_counter.curl_counter,
+        'rep_frames': recorder.rep_frames,
+        'bad_posture_frames': recorder.bad_posture_frames,
+        'feedback': recorder.feedback
+    }
+
+
+def golden_path(name):
+    return os.path.join(GOLDEN_DIR, f"{name}.json")
+
+
+def diff_results(expected, actual, prefix=''):
+    differences = []
+    for key in sorted(set(expected) | set(actual)):
+        if key not in expected or key not in actual:
+            differences.append(f"{prefix}{key}: only in {'actual' if key in actual else 'golden'}")
+        elif isinstance(expected[key], dict) and isinstance(actual[key], dict):
+            differences.extend(diff_results(expected[key], actual[key], f"{prefix}{key}."))
+        elif expected[key] != actual[key]:
+            differences.append(f"{prefix}{key}: golden {expected[key]} != actual {actual[key]}")
+    return differences
+
+
+def diff_offline(session, recorder, thresholds=None):
+    # The bulk offline analysis must agree with the live state machines rep for rep
+    offline = analyze_session(session.landmarks, session.exercise, ThresholdStore(thresholds).current)
+    differences = []
+    rep_frames = offline['segments']['end'].tolist()
+    if rep_frames != recorder.rep_frames:
+        differences.append(f"offline rep_frames: live {recorder.rep_frames} != offline {rep_frames}")
+    for rep, (live, codes) in enumerate(zip(recorder.rep_mistakes, offline['mistakes'])):
+        codes = sorted(int(code) for code in codes)
+        if live != codes:
+            differences.append(f"offline mistakes, rep {rep + 1}: live {live} != offline {codes}")
+    return differences
+
+
+def check(sessions, update_golden=False):
+    failures = 0
+    for name, load in sessions:
+        session = load()
+        recorder = ReplayRecorder()
+        result = replay_result(session, recorder=recorder)
+        path = golden_path(name)
+        if update_golden:
+            os.makedirs(GOLDEN_DIR, exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(result, f, indent=1)
+                f.write('\n')
+            print(f"{name}: golden file written ({result['squat_counter'] + result['curl_counter']} reps)")
+            continue
+
+        if not os.path.exists(path):
+            print(f"{name}: MISSING golden file {path} (run with --update-golden)")
+            failures += 1
+            continue
+        with open(path, 'r') as f:
+            expected = json.load(f)
+        differences = diff_results(expected, result) + diff_offline(session, recorder)
+        if differences:
+            failures += 1
+            print(f"{name}: FAIL")
+            for difference in differences:
+                print(f"    {difference}")
+        else:
+            print(f"{name}: ok")
+    return failures
+
+
+def measure_allocations(frames, exercise, fps):
+    # tracemalloc cannot count every short-lived allocation, so report two proxies:
+    # the average per-frame high-water mark of temporary memory, and the blocks
+    # still alive after the replay (anything above ~0 per frame is a leak)
+    analyzer = FrameAnalyzer(fps, ThresholdStore())
+    current_exercise = {'name': EXERCISE_NAMES.get(exercise, exercise)}
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    transient = 0
+    for points in frames:
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        analyzer.analyze(points, current_exercise)
+        _, peak = tracemalloc.get_traced_memory()
+        transient += peak - start
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, 'filename')
+                   if stat.traceback[0].filename != tracemalloc.__file__)
+    return transient / len(frames), retained / len(frames)
+
+
+def benchmark(sessions, repeat):
+    print(f"{'sequence':<28}{'frames':>8}{'frames/sec':>12}{'peak B/frame':>14}{'retained blocks/frame':>23}")
+    for name, load in sessions:
+        session = load()
+        frames = prepare_frames(session)
+        replay(frames, session.exercise, session.fps)  # Warm up caches and lazy imports
+
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            replay(frames, session.exercise, session.fps)
+            best = min(best, time.perf_counter() - start)
+
+        transient, retained = measure_allocations(frames, session.exercise, session.fps)
+        print(f"{name:<28}{len(frames):>8}{len(frames) / best:>12.0f}{transient:>14.0f}{retained:>23.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay landmark sequences through the exercise analysis")
+    parser.add_argument("sessions", nargs="*", help="Recorded .npz landmark sessions (default: synthetic sequences)")
+    parser.add_argument("--update-golden", action="store_true", help="Write golden files instead of checking them")
+    parser.add_argument("--bench", action="store_true", help="Report logic-only throughput and allocations")
+    parser.add_argument("--repeat", type=int, default=5, help="Benchmark runs per sequence (best is reported)")
+    args = parser.parse_args()
+
+    if args.sessions:
+        sessions = [(os.path.splitext(os.path.basename(path))[0], lambda path=path: load_session(path))
+                    for path in args.sessions]
+    else:
+        sessions = list(SYNTHETIC_SEQUENCES.items())
+
+    if args.bench:
+        benchmark(sessions, args.repeat)
+        return 0
+    return 1 if check(sessions, args.update_golden) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1048 @@
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import query_stats
+from query_stats import InstrumentedCursor
+
+# Storage backends for scores, exercise feedback, survey answers and chat history.
+# The application talks to get_storage() and never to a database driver directly:
+#
+#   SQLiteStorage  one local file in WAL mode, no server needed (default, single user)
+#   MySQLStorage   the shared MySQL server through db_pool.py (WORKOUT_STORAGE=mysql)
+#
+# Reads are plain methods. Writes are methods taking a transaction handle first,
+# write_x(tx, ...), and are normally run by name on the background writer:
+#
+#     submit_write('write_exercise_feedback', name, reps, mistakes, score, day)
+
+STORAGE_BACKEND = os.environ.get('WORKOUT_STORAGE', 'sqlite')  # 'sqlite' or 'mysql'
+SQLITE_PATH = os.environ.get('WORKOUT_SQLITE_PATH', 'workout_assistant.db')
+SQLITE_BUSY_TIMEOUT = 5.0  # Seconds a connection waits for the write lock before failing
+LOCAL_USER_ID = 1  # Created by the migrations; owns everything recorded before anyone signs in
+ACTIVE_DAY_POINTS = 40  # A day total at or above this completes the workout plan for that day
+
+# score_rollup keeps one row per user, period, period start and exercise, plus an ALL_EXERCISES
+# row summing them. Score and feedback writes add their change to the day, week and month rows.
+ROLLUP_PERIODS = ('day', 'week', 'month')
+ALL_EXERCISES = 'all'
+ROLLUP_COLUMNS = ('user_id', 'period', 'period_start', 'exercise_type', 'points', 'reps', 'mistakes',
+                  'workout_days', 'goal_days')
+ROLLUP_INSERT = (f"INSERT INTO score_rollup ({', '.join(ROLLUP_COLUMNS)}) VALUES "
+                 + ', '.join([f"({', '.join(['%s'] * len(ROLLUP_COLUMNS))})"] * 2 * len(ROLLUP_PERIODS)))
+ROLLUP_USERS_PER_CHUNK = 1000  # Users whose rollups rebuild_rollups() computes in memory at once
+
+try:
+    from mysql.connector import Error as MySQLError
+except ImportError:  # MySQL support is optional with the SQLite backend
+    MySQLError = None
+
+# Every exception a storage call can raise because of the database
+STORAGE_ERRORS = (sqlite3.Error,) + ((MySQLError,) if MySQLError is not None else ())
+
+
+def period_starts(day):
+    # First day of the day, week (Monday) and month periods containing day, in ROLLUP_PERIODS order
+    return day, day - timedelta(days=day.weekday()), day.replace(day=1)
+
+
+def count_mistakes(mistakes):
+    # Entries in an exercise_feedback.mistakes value, e.g. "11,13" -> 2
+    return len([part for part in (mistakes or '').split(',') if part.strip()])
+
+
+def streak_of(days):
+    # (current, longest, last day) of the runs of consecutive dates in sorted days, None if empty
+    if not days:
+        return None
+    current = longest = 0
+    previous = None
+    for day in days:
+        current = current + 1 if previous is not None and day == previous + timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = day
+    return current, longest, previous
+
+
+# SQLite stores dates as ISO text; convert on the way in and, for DATE/DATETIME columns, on the way out
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+
+
+class Storage:
+    # Operations every backend provides. Write methods take the transaction handle from
+    # transaction() first, must not commit, and are grouped by batch_key() on the writer.
+    errors = STORAGE_ERRORS
+
+    def migrate(self):
+        raise NotImplementedError
+
+    def batch_key(self, method):
+        # Writes with the same key can share one transaction
+        return None
+
+    def transaction(self, key=None):
+        raise NotImplementedError
+
+    def is_transient(self, error):
+        # True when retrying the same write later can succeed
+        return False
+
+    def is_unavailable(self, error):
+        # True when the database cannot be reached at all; writes are journaled, not retried
+        return False
+
+    def bulk_insert(self, tx, table, columns, rows):
+        # Many rows in one batched statement; for bulk loads, not the per-action writes
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    # Users and leaderboard
+    def get_or_create_user(self, name):
+        raise NotImplementedError
+
+    def get_leaderboard(self, user_id, limit=10):
+        raise NotImplementedError
+
+    # Scores and exercise feedback
+    def get_score_data(self, user_id, days=None):
+        raise NotImplementedError
+
+    def write_exercise_score(self, tx, user_id, exercise_name, score, date):
+        raise NotImplementedError
+
+    def write_exercise_feedback(self, tx, user_id, exercise_name, reps_completed, mistakes, score, feedback_date):
+        raise NotImplementedError
+
+    # Rollups and streaks
+    def get_rollups(self, user_id, period, since=None, exercise_type=ALL_EXERCISES):
+        raise NotImplementedError
+
+    def get_streak(self, user_id):
+        raise NotImplementedError
+
+    def rebuild_rollups(self, tx, first_user_id=None, last_user_id=None, archived_feedback=()):
+        raise NotImplementedError
+
+    # Archiving old rows, see archive.py
+    def oldest_row_time(self, database, table, column):
+        raise NotImplementedError
+
+    def rows_between(self, database, table, columns, column, start, end):
+        raise NotImplementedError
+
+    def delete_rows_between(self, tx, table, column, start, end, max_id):
+        raise NotImplementedError
+
+    # Survey
+    def insert_survey(self, tx, user_id, weight, height, gender, activity, goal, intensity):
+        raise NotImplementedError
+
+    # Chat
+    def save_chat_message(self, tx, session_id, timestamp, sender, message):
+        raise NotImplementedError
+
+    def get_chat_history(self, before_id=None, limit=50, session_id=None):
+        raise NotImplementedError
+
+    def search_chat(self, text, before_id=None, limit=50):
+        raise NotImplementedError
+
+    def start_session(self):
+        raise NotImplementedError
+
+    def get_sessions(self):
+        raise NotImplementedError
+
+
+class SQLStorage(Storage):
+    # Shared SQL for both backends, written with %s placeholders. Subclasses run it
+    # through _execute() and _query() and supply the few dialect-specific fragments.
+    SCORE_DAY_UPSERT = None  # Creates the user_score row for (user_id, day) if needed; returns (id, total_points)
+    EXERCISE_UPSERT = None
+    USER_TOTAL_ADD = None  # Adds a delta to one user's running total, creating the row if needed
+    USER_INSERT_IGNORE = None
+    ROLLUP_ADD = None  # ROLLUP_INSERT, adding to the rows that already exist
+    CHAT_SEARCH_FROM = None  # FROM/WHERE clause matching chat_log c against one full-text query parameter
+
+    def chat_search_query(self, words):
+        # Full-text query matching messages that contain every word, the last one as a prefix
+        raise NotImplementedError
+
+    def _execute(self, tx, sql, params=()):
+        raise NotImplementedError
+
+    def _query(self, database, sql, params=(), dictionary=False):
+        raise NotImplementedError
+
+    def _executemany(self, tx, sql, rows):
+        raise NotImplementedError
+
+    def bulk_insert(self, tx, table, columns, rows):
+        placeholders = ', '.join(['%s'] * len(columns))
+        self._executemany(tx, f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+    def get_or_create_user(self, name):
+        with self.transaction('exercise_tracker') as tx:
+            self._execute(tx, self.USER_INSERT_IGNORE, (name, datetime.now()))
+            return self._execute(tx, "SELECT id FROM users WHERE name = %s", (name,)).fetchall()[0][0]
+
+    def get_leaderboard(self, user_id, limit=10):
+        # Returns (top rows as (rank, user_id, name, total), (rank, total) for user_id or None).
+        # Both queries walk idx_user_totals_rank, so the cost depends on limit and the
+        # user's rank, not on scanning every member's scores.
+        top = self._query('exercise_tracker', """
+            SELECT t.user_id, u.name, t.total_points
+            FROM user_totals t
+            JOIN users u ON u.id = t.user_id
+            ORDER BY t.total_points DESC, t.user_id
+            LIMIT %s
+        """, (limit,))
+        ranked, rank, previous = [], 0, None
+        for position, (member_id, name, total) in enumerate(top, 1):
+            if total != previous:  # Equal totals share a rank
+                rank, previous = position, total
+            ranked.append((rank, member_id, name, total))
+
+        own = self._query('exercise_tracker', "SELECT total_points FROM user_totals WHERE user_id = %s", (user_id,))
+        if not own:
+            return ranked, None
+        total = own[0][0]
+        above = self._query('exercise_tracker', "SELECT COUNT(*) FROM user_totals WHERE total_points > %s", (total,))
+        return ranked, (above[0][0] + 1, total)
+
+    def get_score_data(self, user_id, days=None):
+        # Returns (daily rows, grand total) for one user; the grand total always covers all history.
+        # Rows come from the daily rollups, a range scan over the primary key of at most
+        # four rows per day in the window.
+        date_filter, params = "", [user_id, user_id]
+        if days is not None:
+            date_filter = "AND r.period_start > %s"
+            params.append(date.today() - timedelta(days=days))
+
+        # The grand total comes from the running per-user total, read once for the whole result
+        data = tuple(self._query('exercise_tracker', f"""
+            SELECT
+                r.period_start as score_date,
+                SUM(CASE WHEN r.exercise_type = 'all' THEN r.points ELSE 0 END) as total_points,
+                SUM(CASE WHEN r.exercise_type = 'squat' THEN r.points ELSE 0 END) as squat_points,
+                SUM(CASE WHEN r.exercise_type = 'bicep_curl' THEN r.points ELSE 0 END) as bicep_curl_points,
+                SUM(CASE WHEN r.exercise_type = 'push_up' THEN r.points ELSE 0 END) as push_up_points,
+                SUM(CASE WHEN r.exercise_type = 'all' THEN r.reps ELSE 0 END) as reps,
+                SUM(CASE WHEN r.exercise_type = 'all' THEN r.mistakes ELSE 0 END) as mistakes,
+                MAX(r.goal_days) as goal_met,
+                (SELECT total_points FROM user_totals WHERE user_id = %s) as grand_total
+            FROM score_rollup r
+            WHERE r.user_id = %s AND r.period = 'day' {date_filter}
+            GROUP BY r.period_start
+            HAVING MAX(r.workout_days) > 0
+            ORDER BY r.period_start
+        """, tuple(params), dictionary=True))
+
+        if data:
+            return data, data[0]['grand_total'] or 0
+        # Nothing in the window, but older history still counts towards the total
+        rows = self._query('exercise_tracker', "SELECT total_points FROM user_totals WHERE user_id = %s", (user_id,))
+        return data, rows[0][0] if rows else 0
+
+    def get_rollups(self, user_id, period, since=None, exercise_type=ALL_EXERCISES):
+        # One user's rollup rows for period ('day', 'week' or 'month') starting on or after since, oldest first
+        since_filter, params = "", (user_id, period, exercise_type)
+        if since is not None:
+            since_filter, params = "AND period_start >= %s", params + (since,)
+        return self._query('exercise_tracker', f"""
+            SELECT period_start, points, reps, mistakes, workout_days, goal_days
+            FROM score_rollup
+            WHERE user_id = %s AND period = %s AND exercise_type = %s {since_filter}
+            ORDER BY period_start
+        """, params, dictionary=True)
+
+    def get_streak(self, user_id):
+        # (current, longest) run of consecutive workout days; the current run ends once a day is missed
+        rows = self._query('exercise_tracker',
+                           "SELECT current_streak, longest_streak, last_day FROM user_streaks WHERE user_id = %s",
+                           (user_id,))
+        if not rows:
+            return 0, 0
+        current, longest, last_day = rows[0]
+        if last_day < date.today() - timedelta(days=1):
+            current = 0
+        return current, longest
+
+    def _record_score(self, tx, user_id, exercise_name, score, date):
+        # Upserts the day and exercise rows and moves the day and user totals by the change.
+        # Returns (previous points for this exercise, previous day total).
+        # The day row comes from an upsert on the unique (user_id, score_date) key, so concurrent
+        # writers can never create the same day twice.
+        user_score_id, old_total = self._execute(tx, self.SCORE_DAY_UPSERT, (user_id, date)).fetchall()[0]
+        old = self._execute(tx, "SELECT points FROM exercise WHERE user_score_id = %s AND exercise_type = %s",
+                            (user_score_id, exercise_name)).fetchall()
+        old_points = old[0][0] if old else 0
+        delta = round(float(score) - float(old_points), 1)
+
+        self._execute(tx, self.EXERCISE_UPSERT, (user_score_id, exercise_name, score))
+        if delta:
+            self._execute(tx, "UPDATE user_score SET total_points = ROUND(total_points + %s, 1) WHERE id = %s",
+                          (delta, user_score_id))
+            self._execute(tx, self.USER_TOTAL_ADD, (user_id, delta))
+        return old_points, old_total
+
+    def write_exercise_score(self, tx, user_id, exercise_name, score, date):
+        # Totals, rollups and the streak all move by the change in this exercise's points
+        old_points, old_total = (float(value) for value in self._record_score(tx, user_id, exercise_name, score, date))
+        score = float(score)
+        delta = round(score - old_points, 1)
+        if not delta:
+            return
+        new_total = round(old_total + delta, 1)
+        workout_day = (new_total > 0) - (old_total > 0)
+        goal_day = (new_total >= ACTIVE_DAY_POINTS) - (old_total >= ACTIVE_DAY_POINTS)
+        self._add_to_rollups(tx, user_id, date, exercise_name,
+                             (delta, 0, 0, (score > 0) - (old_points > 0), 0),
+                             (delta, 0, 0, workout_day, goal_day))
+        if workout_day:
+            self._update_streak(tx, user_id, date, workout_day > 0)
+
+    def write_exercise_feedback(self, tx, user_id, exercise_name, reps_completed, mistakes, score, feedback_date):
+        self._execute(tx, """
+            INSERT INTO exercise_feedback
+            (user_id, exercise_name, reps_completed, mistakes, score, feedback_date)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (user_id, exercise_name, reps_completed, mistakes, score, feedback_date))
+        change = (0, reps_completed, count_mistakes(mistakes), 0, 0)
+        self._add_to_rollups(tx, user_id, feedback_date, exercise_name, change, change)
+
+    def _add_to_rollups(self, tx, user_id, day, exercise_type, exercise_change, all_change):
+        # Changes are (points, reps, mistakes, workout_days, goal_days) for the exercise's rows and
+        # the ALL_EXERCISES rows; all six day, week and month rows are updated in one statement
+        params = []
+        for period, start in zip(ROLLUP_PERIODS, period_starts(day)):
+            params += (user_id, period, start, exercise_type) + exercise_change
+            params += (user_id, period, start, ALL_EXERCISES) + all_change
+        self._execute(tx, self.ROLLUP_ADD, tuple(params))
+
+    def _update_streak(self, tx, user_id, day, started):
+        # A new workout day after the last one extends or restarts the streak; anything else,
+        # a back-filled day or one whose points went back to zero, recounts the user's streak
+        rows = self._execute(tx, "SELECT current_streak, longest_streak, last_day FROM user_streaks WHERE user_id = %s",
+                             (user_id,)).fetchall()
+        if not started or (rows and day <= rows[0][2]):
+            self._recount_streak(tx, user_id)
+            return
+        current, longest, last_day = rows[0] if rows else (0, 0, None)
+        current = current + 1 if last_day == day - timedelta(days=1) else 1
+        self._execute(tx, "REPLACE INTO user_streaks (user_id, current_streak, longest_streak, last_day) "
+                          "VALUES (%s, %s, %s, %s)", (user_id, current, max(current, longest), day))
+
+    def _recount_streak(self, tx, user_id):
+        days = [row[0] for row in self._execute(tx, """
+            SELECT period_start FROM score_rollup
+            WHERE user_id = %s AND period = 'day' AND exercise_type = %s AND workout_days > 0
+            ORDER BY period_start
+        """, (user_id, ALL_EXERCISES)).fetchall()]
+        self._execute(tx, "DELETE FROM user_streaks WHERE user_id = %s", (user_id,))
+        streak = streak_of(days)
+        if streak is not None:
+            self._execute(tx, "INSERT INTO user_streaks (user_id, current_streak, longest_streak, last_day) "
+                              "VALUES (%s, %s, %s, %s)", (user_id,) + streak)
+
+    def rebuild_rollups(self, tx, first_user_id=None, last_user_id=None, archived_feedback=()):
+        # Recomputes score_rollup and user_streaks for a range of user ids (default: everyone)
+        # from user_score, exercise and exercise_feedback, plus feedback rows already moved to the
+        # archive as (user_id, feedback_date, exercise_name, reps_completed, mistakes).
+        # Returns the number of rollup rows written.
+        if first_user_id is None:
+            first_user_id = 0
+        if last_user_id is None:
+            last_user_id = self._execute(tx, """
+                SELECT MAX(user_id) FROM (
+                    SELECT MAX(user_id) AS user_id FROM user_score
+                    UNION ALL SELECT MAX(user_id) FROM exercise_feedback
+                ) ids
+            """).fetchall()[0][0] or 0
+        written = 0
+        for first in range(first_user_id, last_user_id + 1, ROLLUP_USERS_PER_CHUNK):
+            last = min(first + ROLLUP_USERS_PER_CHUNK - 1, last_user_id)
+            archived = [row for row in archived_feedback if first <= row[0] <= last]
+            written += self._rebuild_rollup_chunk(tx, first, last, archived)
+        return written
+
+    def _rebuild_rollup_chunk(self, tx, first, last, archived_feedback):
+        users = (first, last)
+        self._execute(tx, "DELETE FROM score_rollup WHERE user_id BETWEEN %s AND %s", users)
+        self._execute(tx, "DELETE FROM user_streaks WHERE user_id BETWEEN %s AND %s", users)
+
+        # (user_id, day, exercise) -> [points, reps, mistakes]
+        daily = {}
+        for user_id, day, exercise_type, points in self._execute(tx, """
+            SELECT us.user_id, us.score_date, e.exercise_type, e.points
+            FROM user_score us
+            JOIN exercise e ON e.user_score_id = us.id
+            WHERE us.user_id BETWEEN %s AND %s
+        """, users):
+            daily.setdefault((user_id, day, exercise_type), [0.0, 0, 0])[0] += float(points)
+        feedback = self._execute(tx, """
+            SELECT user_id, feedback_date, exercise_name, reps_completed, mistakes
+            FROM exercise_feedback
+            WHERE user_id BETWEEN %s AND %s
+        """, users).fetchall()
+        for user_id, day, exercise_type, reps, mistakes in feedback + list(archived_feedback):
+            totals = daily.setdefault((user_id, day, exercise_type), [0.0, 0, 0])
+            totals[1] += reps
+            totals[2] += count_mistakes(mistakes)
+
+        # Day rows per exercise, then the ALL_EXERCISES day rows summing them
+        days = {}
+        all_days = {}
+        for (user_id, day, exercise_type), (points, reps, mistakes) in daily.items():
+            days[(user_id, day, exercise_type)] = [points, reps, mistakes, int(points > 0), 0]
+            totals = all_days.setdefault((user_id, day, ALL_EXERCISES), [0.0, 0, 0, 0, 0])
+            totals[0] += points
+            totals[1] += reps
+            totals[2] += mistakes
+        for totals in all_days.values():
+            totals[0] = round(totals[0], 1)
+            totals[3] = int(totals[0] > 0)
+            totals[4] = int(totals[0] >= ACTIVE_DAY_POINTS)
+        days.update(all_days)
+
+        # Weeks and months are sums of their day rows
+        rollups = {}
+        for (user_id, day, exercise_type), values in days.items():
+            for period, start in zip(ROLLUP_PERIODS, period_starts(day)):
+                totals = rollups.setdefault((user_id, period, start, exercise_type), [0.0, 0, 0, 0, 0])
+                for i, value in enumerate(values):
+                    totals[i] += value
+        rows = [key + (round(totals[0], 1),) + tuple(totals[1:]) for key, totals in rollups.items()]
+        self.bulk_insert(tx, 'score_rollup', ROLLUP_COLUMNS, rows)
+
+        workout_days = {}
+        for (user_id, day, _), totals in sorted(all_days.items()):
+            if totals[3]:
+                workout_days.setdefault(user_id, []).append(day)
+        self.bulk_insert(tx, 'user_streaks', ('user_id', 'current_streak', 'longest_streak', 'last_day'),
+                         [(user_id,) + streak_of(user_days) for user_id, user_days in workout_days.items()])
+        return len(rows)
+
+    def oldest_row_time(self, database, table, column):
+        # Not MIN(): SQLite only converts the value back to a date when it is read from the column itself
+        rows = self._query(database, f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL ORDER BY {column} LIMIT 1")
+        return rows[0][0] if rows else None
+
+    def rows_between(self, database, table, columns, column, start, end):
+        return self._query(database, f"""
+            SELECT {', '.join(columns)} FROM {table}
+            WHERE {column} >= %s AND {column} < %s
+            ORDER BY id
+        """, (start, end))
+
+    def delete_rows_between(self, tx, table, column, start, end, max_id):
+        # Rows added to the range after it was read (id above max_id) stay for the next run
+        return self._execute(tx, f"DELETE FROM {table} WHERE {column} >= %s AND {column} < %s AND id <= %s",
+                             (start, end, max_id)).rowcount
+
+    def seed_sample_scores(self, tx):
+        # A month of random scores so the dashboard has something to show on a fresh install
+        if self._execute(tx, "SELECT COUNT(*) FROM user_score").fetchall()[0][0]:
+            return
+        for i in range(30):
+            day = (datetime.now() - timedelta(days=29-i)).date()
+            user_score_id = self._execute(
+                tx, "INSERT INTO user_score (total_points, score_date) VALUES (%s, %s)", (0, day)
+            ).lastrowid
+            total_points = 0
+            for exercise_type in ['squat', 'bicep_curl', 'push_up']:
+                points = round(random.uniform(0.1, 10.0), 1)  # Random decimal between 0.1 and 10.0
+                total_points += points
+                self._execute(tx, "INSERT INTO exercise (user_score_id, exercise_type, points) VALUES (%s, %s, %s)",
+                              (user_score_id, exercise_type, points))
+            self._execute(tx, "UPDATE user_score SET total_points = %s WHERE id = %s",
+                          (round(total_points, 1), user_score_id))
+
+    def insert_survey(self, tx, user_id, weight, height, gender, activity, goal, intensity):
+        self._execute(tx, """
+            INSERT INTO user_information (user_id, weight, height, gender, activity, goal, intensity)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (user_id, weight, height, gender, activity, goal, intensity))
+
+    def save_chat_message(self, tx, session_id, timestamp, sender, message):
+        self._execute(tx, "INSERT INTO chat_log (session_id, timestamp, sender, message) VALUES (%s, %s, %s, %s)",
+                      (session_id, timestamp, sender, message))
+
+    def get_chat_history(self, before_id=None, limit=50, session_id=None):
+        # Keyset pagination on the primary key: the newest `limit` messages older than
+        # before_id, returned oldest first as (id, timestamp, sender, message)
+        conditions, params = [], []
+        if session_id is not None:
+            conditions.append("session_id = %s")
+            params.append(session_id)
+        if before_id is not None:
+            conditions.append("id < %s")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._query('workout_assistant',
+                           f"SELECT id, timestamp, sender, message FROM chat_log {where} ORDER BY id DESC LIMIT %s",
+                           tuple(params) + (limit,))
+        return rows[::-1]
+
+    def search_chat(self, text, before_id=None, limit=50):
+        # Same paging and row shape as get_chat_history, over messages matching every word in text
+        words = re.findall(r"\w+", text)
+        if not words:
+            return []
+        sql = f"SELECT c.id, c.timestamp, c.sender, c.message {self.CHAT_SEARCH_FROM}"
+        params = [self.chat_search_query(words)]
+        if before_id is not None:
+            sql += " AND c.id < %s"
+            params.append(before_id)
+        rows = self._query('workout_assistant', f"{sql} ORDER BY c.id DESC LIMIT %s", tuple(params) + (limit,))
+        return rows[::-1]
+
+    def start_session(self):
+        with self.transaction('workout_assistant') as tx:
+            return self._execute(tx, "INSERT INTO sessions (start_time) VALUES (%s)", (datetime.now(),)).lastrowid
+
+    def get_sessions(self):
+        return self._query('workout_assistant', "SELECT id, start_time FROM sessions ORDER BY start_time DESC")
+
+
+def merge_duplicate_score_days(execute):
+    # Run by both backends' migrations before the unique (user_id, score_date) key is added.
+    # Concurrent first writes of a day used to create one user_score row each; keep the oldest,
+    # give it the newest points per exercise, as a later write would have, and drop the rest.
+    # execute(sql, params) runs one statement and returns its rows.
+    duplicates = execute("""
+        SELECT user_id, score_date, MIN(id) FROM user_score
+        GROUP BY user_id, score_date
+        HAVING COUNT(*) > 1
+    """, ())
+    for user_id, score_date, keep_id in duplicates:
+        day = (user_id, score_date)
+        latest = dict(execute("""
+            SELECT e.exercise_type, e.points
+            FROM exercise e
+            JOIN user_score us ON us.id = e.user_score_id
+            WHERE us.user_id = %s AND us.score_date = %s
+            ORDER BY e.id
+        """, day))
+        execute("DELETE FROM exercise WHERE user_score_id IN "
+                "(SELECT id FROM user_score WHERE user_id = %s AND score_date = %s)", day)
+        execute("DELETE FROM user_score WHERE user_id = %s AND score_date = %s AND id <> %s", day + (keep_id,))
+        for exercise_type, points in latest.items():
+            execute("INSERT INTO exercise (user_score_id, exercise_type, points) VALUES (%s, %s, %s)",
+                    (keep_id, exercise_type, points))
+        execute("UPDATE user_score SET total_points = %s WHERE id = %s",
+                (round(sum(float(points) for points in latest.values()), 1), keep_id))
+
+    if duplicates:
+        execute("DELETE FROM user_totals", ())
+        execute("""
+            INSERT INTO user_totals (user_id, total_points)
+            SELECT user_id, ROUND(SUM(total_points), 1) FROM user_score GROUP BY user_id
+        """, ())
+    return len(duplicates)
+
+
+def build_initial_rollups(execute, executemany, archived_feedback=()):
+    # Migration 6 of both backends: fills the new score_rollup and user_streaks tables.
+    # A frozen copy of rebuild_rollups() as the migration shipped, with its own SQL and
+    # constants, so later changes to the rollups cannot change what an old database gets
+    # when it reaches this version. archived_feedback holds exercise_feedback rows already
+    # moved to the archive, as dicts. execute(sql, params) runs one statement and returns its
+    # rows; executemany(sql, rows) runs one statement for many rows. Returns the rows written.
+    archived_feedback = [(row['user_id'], row['feedback_date'], row['exercise_name'], row['reps_completed'],
+                          row['mistakes']) for row in archived_feedback]
+    last_user_id = execute("""
+        SELECT MAX(user_id) FROM (
+            SELECT MAX(user_id) AS user_id FROM user_score
+            UNION ALL SELECT MAX(user_id) FROM exercise_feedback
+        ) ids
+    """, ())[0][0] or 0
+    written = 0
+    for first in range(0, last_user_id + 1, 1000):
+        users = (first, first + 999)
+        execute("DELETE FROM score_rollup WHERE user_id BETWEEN %s AND %s", users)
+        execute("DELETE FROM user_streaks WHERE user_id BETWEEN %s AND %s", users)
+
+        # (user_id, day, exercise) -> [points, reps, mistakes]
+        daily = {}
+        for user_id, day, exercise_type, points in execute("""
+            SELECT us.user_id, us.score_date, e.exercise_type, e.points
+            FROM user_score us
+            JOIN exercise e ON e.user_score_id = us.id
+            WHERE us.user_id BETWEEN %s AND %s
+        """, users):
+            daily.setdefault((user_id, day, exercise_type), [0.0, 0, 0])[0] += float(points)
+        feedback = execute("""
+            SELECT user_id, feedback_date, exercise_name, reps_completed, mistakes
+            FROM exercise_feedback
+            WHERE user_id BETWEEN %s AND %s
+        """, users)
+        feedback += [row for row in archived_feedback if users[0] <= row[0] <= users[1]]
+        for user_id, day, exercise_type, reps, mistakes in feedback:
+            totals = daily.setdefault((user_id, day, exercise_type), [0.0, 0, 0])
+            totals[1] += reps
+            totals[2] += len([part for part in (mistakes or '').split(',') if part.strip()])
+
+        # Day rows per exercise, then the 'all' day rows summing them; 40 points complete a day
+        days = {}
+        all_days = {}
+        for (user_id, day, exercise_type), (points, reps, mistakes) in daily.items():
+            days[(user_id, day, exercise_type)] = [points, reps, mistakes, int(points > 0), 0]
+            totals = all_days.setdefault((user_id, day, 'all'), [0.0, 0, 0, 0, 0])
+            totals[0] += points
+            totals[1] += reps
+            totals[2] += mistakes
+        for totals in all_days.values():
+            totals[0] = round(totals[0], 1)
+            totals[3] = int(totals[0] > 0)
+            totals[4] = int(totals[0] >= 40)
+        days.update(all_days)
+
+        # Weeks (from Monday) and months are sums of their day rows
+        rollups = {}
+        for (user_id, day, exercise_type), values in days.items():
+            starts = (('day', day), ('week', day - timedelta(days=day.weekday())), ('month', day.replace(day=1)))
+            for period, start in starts:
+                totals = rollups.setdefault((user_id, period, start, exercise_type), [0.0, 0, 0, 0, 0])
+                for i, value in enumerate(values):
+                    totals[i] += value
+        rows = [key + (round(totals[0], 1),) + tuple(totals[1:]) for key, totals in rollups.items()]
+        executemany("""
+            INSERT INTO score_rollup (user_id, period, period_start, exercise_type, points, reps, mistakes,
+                                      workout_days, goal_days)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, rows)
+        written += len(rows)
+
+        # Current and longest runs of consecutive workout days
+        streaks = {}
+        for (user_id, day, _), totals in sorted(all_days.items()):
+            if not totals[3]:
+                continue
+            current, longest, previous = streaks.get(user_id, (0, 0, None))
+            current = current + 1 if previous is not None and day == previous + timedelta(days=1) else 1
+            streaks[user_id] = (current, max(longest, current), day)
+        executemany("INSERT INTO user_streaks (user_id, current_streak, longest_streak, last_day) "
+                    "VALUES (%s, %s, %s, %s)", [(user_id,) + streak for user_id, streak in streaks.items()])
+    return written
+
+
+def _build_initial_rollups(storage, tx):
+    from archive import ArchiveStore  # archive.py imports this module
+    build_initial_rollups(lambda sql, params: storage._execute(tx, sql, params).fetchall(),
+                          lambda sql, rows: storage._executemany(tx, sql, rows),
+                          ArchiveStore().read('exercise_feedback'))
+
+
+@lru_cache(maxsize=256)
+def _sqlite_sql(sql):
+    # The shared SQL uses MySQL's %s placeholders
+    return sql.replace('%s', '?')
+
+
+class SQLiteStorage(SQLStorage):
+    # All three MySQL databases map onto one file. WAL lets the GUI read while the
+    # writer thread commits, and synchronous=NORMAL only fsyncs at checkpoints, which
+    # can lose the last commits on power failure but never corrupts the file.
+    # The no-op DO UPDATE makes RETURNING report the existing row too (SQLite 3.35+)
+    SCORE_DAY_UPSERT = """
+        INSERT INTO user_score (user_id, total_points, score_date) VALUES (%s, 0, %s)
+        ON CONFLICT (user_id, score_date) DO UPDATE SET total_points = total_points
+        RETURNING id, total_points
+    """
+    EXERCISE_UPSERT = """
+        INSERT INTO exercise (user_score_id, exercise_type, points)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (user_score_id, exercise_type) DO UPDATE SET points = excluded.points
+    """
+    # Rounded because REAL would otherwise drift away from the DECIMAL(.1) totals after many small deltas
+    USER_TOTAL_ADD = """
+        INSERT INTO user_totals (user_id, total_points) VALUES (%s, %s)
+        ON CONFLICT (user_id) DO UPDATE SET total_points = ROUND(total_points + excluded.total_points, 1)
+    """
+    USER_INSERT_IGNORE = "INSERT INTO users (name, created_at) VALUES (%s, %s) ON CONFLICT (name) DO NOTHING"
+    ROLLUP_ADD = ROLLUP_INSERT + """
+        ON CONFLICT (user_id, period, period_start, exercise_type) DO UPDATE SET
+            points = ROUND(points + excluded.points, 1),
+            reps = reps + excluded.reps,
+            mistakes = mistakes + excluded.mistakes,
+            workout_days = workout_days + excluded.workout_days,
+            goal_days = goal_days + excluded.goal_days
+    """
+    CHAT_SEARCH_FROM = "FROM chat_log_fts f JOIN chat_log c ON c.id = f.rowid WHERE chat_log_fts MATCH %s"
+
+    # Ordered list of (version, description, steps); a step is SQL or a callable taking (storage, tx).
+    # Never edit a migration that has shipped, append a new one instead.
+    MIGRATIONS = [
+        (1, "create tables", [
+            """
+            CREATE TABLE IF NOT EXISTS user_score (
+                id INTEGER PRIMARY KEY,
+                total_points REAL NOT NULL,
+                score_date DATE NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS exercise (
+                id INTEGER PRIMARY KEY,
+                user_score_id INTEGER REFERENCES user_score(id),
+                exercise_type TEXT NOT NULL CHECK (exercise_type IN ('squat', 'bicep_curl', 'push_up')),
+                points REAL NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS exercise_feedback (
+                id INTEGER PRIMARY KEY,
+                exercise_name TEXT NOT NULL,
+                reps_completed INTEGER NOT NULL,
+                mistakes TEXT,
+                score REAL NOT NULL,
+                feedback_date DATE NOT NULL
+            )
+            """,
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_exercise_score_type ON exercise (user_score_id, exercise_type)",
+            "CREATE INDEX IF NOT EXISTS idx_user_score_date ON user_score (score_date)",
+            "CREATE INDEX IF NOT EXISTS idx_exercise_feedback_date ON exercise_feedback (feedback_date)",
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                id INTEGER PRIMARY KEY,
+                start_time DATETIME
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS chat_log (
+                id INTEGER PRIMARY KEY,
+                session_id INTEGER REFERENCES sessions(id),
+                timestamp DATETIME,
+                sender TEXT,
+                message TEXT
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_chat_log_timestamp ON chat_log (timestamp)",
+            "CREATE INDEX IF NOT EXISTS idx_chat_log_session_time ON chat_log (session_id, timestamp)",
+            """
+            CREATE TABLE IF NOT EXISTS user_information (
+                id INTEGER PRIMARY KEY,
+                weight REAL NOT NULL,
+                height REAL NOT NULL,
+                gender TEXT NOT NULL,
+                activity TEXT NOT NULL,
+                goal TEXT NOT NULL,
+                intensity TEXT NOT NULL,
+                created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        ]),
+        (2, "seed sample scores", [lambda storage, tx: storage.seed_sample_scores(tx)]),
+        (3, "full-text index over chat messages", [
+            # External-content FTS5 table: the text lives in chat_log only, triggers keep the index in step
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chat_log_fts USING fts5(message, content='chat_log', content_rowid='id')",
+            """
+            CREATE TRIGGER IF NOT EXISTS chat_log_fts_insert AFTER INSERT ON chat_log BEGIN
+                INSERT INTO chat_log_fts (rowid, message) VALUES (new.id, new.message);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS chat_log_fts_delete AFTER DELETE ON chat_log BEGIN
+                INSERT INTO chat_log_fts (chat_log_fts, rowid, message) VALUES ('delete', old.id, old.message);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS chat_log_fts_update AFTER UPDATE OF message ON chat_log BEGIN
+                INSERT INTO chat_log_fts (chat_log_fts, rowid, message) VALUES ('delete', old.id, old.message);
+                INSERT INTO chat_log_fts (rowid, message) VALUES (new.id, new.message);
+            END
+            """,
+            "INSERT INTO chat_log_fts (chat_log_fts) VALUES ('rebuild')",
+        ]),
+        (4, "users and per-user totals", [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE,
+                created_at DATETIME NOT NULL
+            )
+            """,
+            f"INSERT OR IGNORE INTO users (id, name, created_at) VALUES ({LOCAL_USER_ID}, 'local', CURRENT_TIMESTAMP)",
+            # Existing rows belong to the local user
+            f"ALTER TABLE user_score ADD COLUMN user_id INTEGER NOT NULL DEFAULT {LOCAL_USER_ID}",
+            f"ALTER TABLE exercise_feedback ADD COLUMN user_id INTEGER NOT NULL DEFAULT {LOCAL_USER_ID}",
+            f"ALTER TABLE user_information ADD COLUMN user_id INTEGER NOT NULL DEFAULT {LOCAL_USER_ID}",
+            "CREATE INDEX IF NOT EXISTS idx_user_score_user_date ON user_score (user_id, score_date)",
+            "CREATE INDEX IF NOT EXISTS idx_exercise_feedback_user_date ON exercise_feedback (user_id, feedback_date)",
+            """
+            CREATE TABLE IF NOT EXISTS user_totals (
+                user_id INTEGER PRIMARY KEY,
+                total_points REAL NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_user_totals_rank ON user_totals (total_points DESC, user_id)",
+            """
+            INSERT INTO user_totals (user_id, total_points)
+            SELECT user_id, ROUND(SUM(total_points), 1) FROM user_score GROUP BY user_id
+            """,
+        ]),
+        (5, "one score row per user and day", [
+            lambda storage, tx: merge_duplicate_score_days(
+                lambda sql, params: storage._execute(tx, sql, params).fetchall()),
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_user_score_user_date ON user_score (user_id, score_date)",
+            # Covered by the unique index now
+            "DROP INDEX IF EXISTS idx_user_score_user_date",
+        ]),
+        (6, "daily, weekly and monthly rollups and streaks", [
+            """
+            CREATE TABLE IF NOT EXISTS score_rollup (
+                user_id INTEGER NOT NULL,
+                period TEXT NOT NULL CHECK (period IN ('day', 'week', 'month')),
+                period_start DATE NOT NULL,
+                exercise_type TEXT NOT NULL,
+                points REAL NOT NULL DEFAULT 0,
+                reps INTEGER NOT NULL DEFAULT 0,
+                mistakes INTEGER NOT NULL DEFAULT 0,
+                workout_days INTEGER NOT NULL DEFAULT 0,
+                goal_days INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, period, period_start, exercise_type)
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS user_streaks (
+                user_id INTEGER PRIMARY KEY,
+                current_streak INTEGER NOT NULL,
+                longest_streak INTEGER NOT NULL,
+                last_day DATE NOT NULL
+            )
+            """,
+            _build_initial_rollups,
+        ]),
+    ]
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def _connection(self):
+        # One connection per thread; sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, detect_types=sqlite3.PARSE_DECLTYPES,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self, key=None):
+        conn = self._connection()
+        # Take the write lock up front so a transaction never fails halfway on SQLITE_BUSY
+        query_stats.timed("BEGIN IMMEDIATE", (), conn.execute, "BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        query_stats.timed("COMMIT", (), conn.commit)
+
+    def _execute(self, tx, sql, params=()):
+        return InstrumentedCursor(query_stats.timed(sql, params, tx.execute, _sqlite_sql(sql), params), sql)
+
+    def _executemany(self, tx, sql, rows):
+        query_stats.timed(sql, (), tx.executemany, _sqlite_sql(sql), rows)
+
+    def _query(self, database, sql, params=(), dictionary=False):
+        cursor = query_stats.timed(sql, params, self._connection().execute, _sqlite_sql(sql), params)
+        rows = cursor.fetchall()
+        query_stats.add_rows(sql, len(rows))
+        if dictionary:
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in rows]
+        return rows
+
+    def chat_search_query(self, words):
+        # Quoted so words like AND, OR or NEAR are searched for, not treated as operators
+        terms = [f'"{word}"' for word in words]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def is_transient(self, error):
+        # "database is locked" when another process held the write lock past the busy timeout
+        return isinstance(error, sqlite3.OperationalError) and 'locked' in str(error)
+
+    def migrate(self):
+        with self.transaction() as tx:
+            tx.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at DATETIME NOT NULL
+                )
+            """)
+            current = tx.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+            # SQLite DDL is transactional, so each migration is all or nothing
+            for version, description, steps in self.MIGRATIONS:
+                if version <= current:
+                    continue
+                logging.info(f"Applying SQLite migration {version}: {description}")
+                for step in steps:
+                    if callable(step):
+                        step(self, tx)
+                    else:
+                        tx.execute(step)
+                tx.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                           (version, description, datetime.now()))
+        return True
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+class MySQLStorage(SQLStorage):
+    # The original MySQL databases, through the connection pool and migrations in
+    # db_pool.py and db_migrations.py. For deployments that share one server.
+    EXERCISE_UPSERT = """
+        INSERT INTO exercise (user_score_id, exercise_type, points)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE points = VALUES(points)
+    """
+    USER_TOTAL_ADD = """
+        INSERT INTO user_totals (user_id, total_points) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE total_points = total_points + VALUES(total_points)
+    """
+    USER_INSERT_IGNORE = "INSERT IGNORE INTO users (name, created_at) VALUES (%s, %s)"
+    ROLLUP_ADD = ROLLUP_INSERT + """
+        ON DUPLICATE KEY UPDATE
+            points = points + VALUES(points),
+            reps = reps + VALUES(reps),
+            mistakes = mistakes + VALUES(mistakes),
+            workout_days = workout_days + VALUES(workout_days),
+            goal_days = goal_days + VALUES(goal_days)
+    """
+    CHAT_SEARCH_FROM = "FROM chat_log c WHERE MATCH (c.message) AGAINST (%s IN BOOLEAN MODE)"
+
+    # write method -> database it writes to
+    METHOD_DATABASES = {
+        'write_exercise_score': 'exercise_tracker',
+        'write_exercise_feedback': 'exercise_tracker',
+        'insert_survey': 'hackkathon2024',
+        'save_chat_message': 'workout_assistant',
+    }
+
+    def __init__(self):
+        # Imported here so the SQLite backend works without mysql-connector installed
+        import db_migrations
+        import db_pool
+        self._migrations = db_migrations
+        self._pool = db_pool
+
+    def migrate(self):
+        return self._migrations.run_all_migrations()
+
+    def batch_key(self, method):
+        return self.METHOD_DATABASES.get(method, 'exercise_tracker')
+
+    @contextmanager
+    def transaction(self, key=None):
+        with self._pool.pooled_connection(key or 'exercise_tracker') as conn:
+            yield conn
+            query_stats.timed("COMMIT", (), conn.commit)
+
+    def _record_score(self, tx, user_id, exercise_name, score, date):
+        # One round trip: the record_exercise_score procedure from db_migrations.py runs the
+        # same upserts and delta updates on the server and hands back the previous values
+        params = (user_id, date, exercise_name, score, 0, 0)
+        cursor = tx.cursor()
+        result = query_stats.timed("CALL record_exercise_score(%s, %s, %s, %s, @old_points, @old_total)", params,
+                                   cursor.callproc, 'record_exercise_score', params)
+        cursor.close()
+        return result[4], result[5]
+
+    def _execute(self, tx, sql, params=()):
+        return InstrumentedCursor(query_stats.timed(sql, params, tx.execute_prepared, sql, params), sql)
+
+    def _executemany(self, tx, sql, rows):
+        # A plain cursor, so the connector rewrites the batch into multi-row INSERTs
+        cursor = tx.cursor()
+        query_stats.timed(sql, (), cursor.executemany, sql, rows)
+        cursor.close()
+
+    def _query(self, database, sql, params=(), dictionary=False):
+        with self._pool.pooled_connection(database) as conn:
+            cursor = conn.cursor(dictionary=dictionary)
+            query_stats.timed(sql, params, cursor.execute, sql, params)
+            rows = cursor.fetchall()
+            cursor.close()
+            query_stats.add_rows(sql, len(rows))
+            return rows
+
+    def chat_search_query(self, words):
+        # Boolean mode: every word required, the last one as a prefix
+        return ' '.join(f'+{word}' for word in words) + '*'
+
+    def is_transient(self, error):
+        return self._pool.is_transient(error)
+
+    def is_unavailable(self, error):
+        return self._pool.is_unavailable(error)
+
+    def close(self):
+        self._pool.close_all_pools()
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def create_storage(backend=STORAGE_BACKEND):
+    if backend == 'mysql':
+        return MySQLStorage()
+    if backend == 'sqlite':
+        return SQLiteStorage()
+    raise ValueError(f"Unknown storage backend '{backend}', expected 'sqlite' or 'mysql'")
+
+
+def get_storage():
+    # Created and migrated on first use
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            storage = create_storage()
+            try:
+                migrated = storage.migrate()
+            except STORAGE_ERRORS as e:
+                migrated = False
+                print(f"Error migrating {STORAGE_BACKEND} storage: {e}")
+            if not migrated:
+                # Keep going; reads and writes report their own errors and migrate() is safe to repeat
+                logging.warning("Storage migrations did not complete")
+            _storage = storage
+        return _storage
+
+
+def close_storage():
+    global _storage
+    with _storage_lock:
+        storage, _storage = _storage, None
+    if storage is not None:
+        storage.close()
@@ -0,0 +1,342 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import numpy as np
+from feedback_codes import is_mistake
+
+# Append-only, columnar store for per-rep telemetry. The analysis thread hands finished reps
+# to a background writer, which appends them as NumPy structured-array chunk files:
+#
+#   telemetry/index.json          chunk list with row counts and time ranges
+#   telemetry/reps-000001.npy     one chunk, loaded with np.load(mmap_mode='r')
+#
+# Chunks are never modified once written; compact() merges small ones into a new chunk.
+# Analytics read whole columns at once:
+#
+#     reps = TelemetryStore().read(since=time.time() - 7 * 86400, exercise='squat')
+#     reps['duration'].mean(), mistake_counts(reps)
+
+TELEMETRY_DIR = "telemetry"
+CHUNK_ROWS = 4096  # Rows buffered before a chunk is written
+FLUSH_INTERVAL = 30.0  # Most seconds a row waits in a partly filled buffer before it is written
+COMPACT_BELOW = 256  # compact() merges chunks with fewer rows than this
+
+EXERCISE_CODES = {'squat': 1, 'bicep_curl': 2}
+EXERCISE_NAMES = {code: name for name, code in EXERCISE_CODES.items()}
+
+# One row per completed rep. Angles are in degrees, the primary angle is the knee for
+# squats and the working elbow for curls. mistake_mask has bit n set for FeedbackCode n.
+REP_DTYPE = np.dtype([
+    ('session_id', np.int64),
+    ('exercise', np.uint8),
+    ('rep', np.uint16),
+    ('end_time', np.float64),  # Unix time the rep finished
+    ('duration', np.float32),  # Seconds, i.e. tempo
+    ('frames', np.uint16),
+    ('min_angle', np.float32),
+    ('max_angle', np.float32),
+    ('min_back_angle', np.float32),
+    ('max_back_angle', np.float32),
+    ('mean_visibility', np.float32),
+    ('min_visibility', np.float32),
+    ('mistake_mask', np.uint32),
+])
+
+# Landmarks whose visibility is tracked per rep
+TRACKED_JOINTS = ('left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow', 'left_wrist', 'right_wrist',
+                  'left_hip', 'right_hip', 'left_knee', 'right_knee', 'left_ankle', 'right_ankle')
+
+
+def exercise_code(name):
+    return EXERCISE_CODES.get(name.lower().replace(' ', '_'), 0) if name else 0
+
+
+def mistake_mask(codes):
+    mask = 0
+    for code in codes:
+        if is_mistake(code):
+            mask |= 1 << int(code)
+    return mask
+
+
+def mistake_counts(reps):
+    # FeedbackCode value -> number of reps with that mistake, vectorized over the mask column
+    masks = np.asarray(reps['mistake_mask'], dtype=np.uint32)
+    counts = {}
+    for code in range(32):
+        count = int(np.count_nonzero(masks & np.uint32(1 << code)))
+        if count:
+            counts[code] = count
+    return counts
+
+
+class RepTelemetry:
+    # Folds per-frame analysis results into one record per rep. Fed by FrameAnalyzer on
+    # every frame, so it only keeps running minima and maxima, never the frames themselves.
+    def __init__(self, fps, writer=None, session_id=None):
+        self.fps = fps or 30
+        self.writer = writer
+        self.session_id = session_id if session_id is not None else time.time_ns() // 1000
+        self.records = []  # Finished reps, only kept when there is no writer
+        self._reps = 0
+        self._start_rep()
+
+    def _start_rep(self):
+        self.frames = 0
+        self.min_angle = self.min_back_angle = self.min_visibility = float('inf')
+        self.max_angle = self.max_back_angle = float('-inf')
+        self.visibility_total = 0.0
+        self.mask = 0
+
+    def add_frame(self, exercise, points, angles, counter, squat_form_feedback):
+        code = exercise_code(exercise)
+        reps = counter.squat_counter + counter.curl_counter
+        if reps < self._reps or not code:
+            # Counters were reset or no exercise is running; start over
+            self._reps = reps
+            self._start_rep()
+            return
+
+        if code == EXERCISE_CODES['squat']:
+            angle = angles['knee_angle']
+            self.mask |= mistake_mask(counter.get_squat_feedback()) | mistake_mask(squat_form_feedback)
+        else:
+            angle = min(angles['left_bicep_angle'], angles['right_bicep_angle'])
+            self.mask |= mistake_mask(counter.get_bicep_curl_feedback())
+        back_angle = angles['back_angle']
+
+        visibility_sum, visibility_min = 0.0, 1.0
+        for name in TRACKED_JOINTS:
+            visibility = points[name][2]
+            visibility_sum += visibility
+            if visibility < visibility_min:
+                visibility_min = visibility
+
+        self.frames += 1
+        if angle < self.min_angle:
+            self.min_angle = angle
+        if angle > self.max_angle:
+            self.max_angle = angle
+        if back_angle < self.min_back_angle:
+            self.min_back_angle = back_angle
+        if back_angle > self.max_back_angle:
+            self.max_back_angle = back_angle
+        self.visibility_total += visibility_sum / len(TRACKED_JOINTS)
+        if visibility_min < self.min_visibility:
+            self.min_visibility = visibility_min
+
+        if reps > self._reps:
+            self._reps = reps
+            self._finish_rep(code, reps)
+
+    def _finish_rep(self, code, rep):
+        record = (self.session_id, code, min(rep, 65535), time.time(), self.frames / self.fps, min(self.frames, 65535),
+                  self.min_angle, self.max_angle, self.min_back_angle, self.max_back_angle,
+                  self.visibility_total / self.frames, self.min_visibility, self.mask)
+        if self.writer is not None:
+            self.writer.append(record)
+        else:
+            self.records.append(record)
+        self._start_rep()
+
+    def to_array(self):
+        return np.array(self.records, dtype=REP_DTYPE)
+
+
+class TelemetryStore:
+    def __init__(self, directory=TELEMETRY_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self._lock = threading.Lock()  # Serializes index updates within the process
+
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return {'next_chunk': 1, 'chunks': []}
+        with open(self.index_path, 'r') as f:
+            return json.load(f)
+
+    def _save_index(self, index):
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(temp_path, self.index_path)
+
+    def _write_chunk(self, index, rows):
+        name = f"reps-{index['next_chunk']:06d}.npy"
+        index['next_chunk'] += 1
+        temp_path = os.path.join(self.directory, f"{name}.tmp")
+        with open(temp_path, 'wb') as f:
+            np.save(f, rows)
+        os.replace(temp_path, os.path.join(self.directory, name))
+        return {
+            'file': name,
+            'rows': int(len(rows)),
+            'start_time': float(rows['end_time'].min()),
+            'end_time': float(rows['end_time'].max()),
+            'exercises': sorted(int(code) for code in np.unique(rows['exercise'])),
+        }
+
+    def append(self, rows):
+        # The chunk file is complete on disk before the index points at it, so a crash
+        # leaves at most an unreferenced file behind
+        rows = np.asarray(rows, dtype=REP_DTYPE)
+        if not len(rows):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            index = self.load_index()
+            index['chunks'].append(self._write_chunk(index, rows))
+            self._save_index(index)
+
+    def chunks(self, since=None, until=None, exercise=None):
+        code = exercise_code(exercise) if exercise is not None else None
+        for chunk in self.load_index()['chunks']:
+            if since is not None and chunk['end_time'] < since:
+                continue
+            if until is not None and chunk['start_time'] > until:
+                continue
+            if code is not None and code not in chunk['exercises']:
+                continue
+            yield chunk
+
+    def read(self, since=None, until=None, exercise=None, columns=None):
+        # Memory-maps only the chunks whose time range and exercises can match, then filters rows
+        parts = []
+        for chunk in self.chunks(since, until, exercise):
+            rows = np.load(os.path.join(self.directory, chunk['file']), mmap_mode='r')
+            keep = np.ones(len(rows), dtype=bool)
+            if since is not None:
+                keep &= rows['end_time'] >= since
+            if until is not None:
+                keep &= rows['end_time'] <= until
+            if exercise is not None:
+                keep &= rows['exercise'] == exercise_code(exercise)
+            parts.append(rows[keep] if columns is None else rows[list(columns)][keep])
+        if not parts:
+            dtype = REP_DTYPE if columns is None else REP_DTYPE[list(columns)]
+            return np.empty(0, dtype=dtype)
+        return np.concatenate(parts)
+
+    def compact(self):
+        # Merge small chunks (one per short session) into one, oldest first
+        with self._lock:
+            index = self.load_index()
+            small = [chunk for chunk in index['chunks'] if chunk['rows'] < COMPACT_BELOW]
+            if len(small) < 2:
+                return 0
+            rows = np.concatenate([np.load(os.path.join(self.directory, chunk['file'])) for chunk in small])
+            merged = self._write_chunk(index, np.sort(rows, order='end_time'))
+            small_files = {chunk['file'] for chunk in small}
+            index['chunks'] = [chunk for chunk in index['chunks'] if chunk['file'] not in small_files] + [merged]
+            self._save_index(index)
+        for name in small_files:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError as e:
+                logging.warning(f"Could not remove compacted telemetry chunk {name}: {e}")
+        return len(small)
+
+
+_STOP = object()
+_FLUSH = object()
+
+
+class TelemetryWriter(threading.Thread):
+    # Buffers rep records off the analysis thread and writes them as chunks
+    def __init__(self, store=None, chunk_rows=CHUNK_ROWS, flush_interval=FLUSH_INTERVAL):
+        super().__init__(daemon=True, name="TelemetryWriter")
+        self.store = store if store is not None else TelemetryStore()
+        self.chunk_rows = chunk_rows
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._buffer = []
+        self._oldest = None  # time.monotonic() when the oldest buffered row arrived
+
+    def append(self, record):
+        self._queue.put(record)
+
+    def _write_buffer(self):
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        self._oldest = None
+        try:
+            self.store.append(np.array(rows, dtype=REP_DTYPE))
+        except (OSError, ValueError) as e:
+            logging.error(f"Dropping {len(rows)} telemetry rows after error: {e}")
+
+    def run(self):
+        while True:
+            # A buffered row is written at most flush_interval seconds after it arrived, even
+            # while more reps keep coming in
+            timeout = None
+            if self._oldest is not None:
+                timeout = self._oldest + self.flush_interval - time.monotonic()
+                if timeout <= 0:
+                    self._write_buffer()
+                    timeout = None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write_buffer()
+                continue
+            try:
+                if item is _STOP:
+                    self._write_buffer()
+                    return
+                if item is _FLUSH:
+                    self._write_buffer()
+                else:
+                    if not self._buffer:
+                        self._oldest = time.monotonic()
+                    self._buffer.append(item)
+                    if len(self._buffer) >= self.chunk_rows:
+                        self._write_buffer()
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout=None):
+        # Write out everything appended so far
+        self._queue.put(_FLUSH)
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def stop(self, timeout=None):
+        self._queue.put(_STOP)
+        self.join(timeout)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_telemetry_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = TelemetryWriter()
+            _writer.start()
+        return _writer
+
+
+def stop_telemetry_writer(timeout=5.0):
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None and writer.is_alive():
+        writer.stop(timeout)
+
+
+if __name__ == "__main__":
+    store = TelemetryStore()
+    reps = store.read()
+    print(f"{len(reps)} reps in {len(store.load_index()['chunks'])} chunks")
+    for code, name in EXERCISE_NAMES.items():
+        selected = reps[reps['exercise'] == code]
+        if len(selected):
+            print(f"{name}: {len(selected)} reps, mean tempo {selected['duration'].mean():.2f}s, "
+                  f"range {selected['min_angle'].mean():.0f}-{selected['max_angle'].mean():.0f} deg, "
+                  f"mistakes {mistake_counts(selected)}")
@@ -3,7 +3,18 @@ import json
 from fuzzywuzzy import fuzz, process
 import re
 import logging
-import time
+from llm_cache import cached_generate
+
+ADJUSTMENT_STEP = 5  # Largest change for "increase"/"decrease" without a number; smaller thresholds move less
+# Only words that can only mean moving the number. "loosen"/"tighten" and "more"/"less" are left
+# out on purpose: which way they move a threshold depends on whether the mistake fires above or
+# below it, and "more"/"less" usually modify another word ("less strict"). Such requests go to the model.
+INCREASE_WORDS = {'increase', 'raise', 'higher', 'bigger'}
+DECREASE_WORDS = {'decrease', 'reduce', 'lower', 'smaller'}
+# Requests about how strict the feedback feels, or negated ones, are never resolved locally
+STRICTNESS_WORDS = {'strict', 'stricter', 'lenient', 'sensitive', 'forgiving', 'harsh', 'picky'}
+NEGATION_WORDS = {'not', 'no', 'never', 'dont', 'doesnt', 'stop', 'without'}
+VAGUE_DIRECTION_WORDS = {'more', 'less', 'up', 'down'}  # Still read by the fuzzy best guess
 
 class ThresholdAdjuster:
     def __init__(self, api_key):
@@ -120,40 +131,155 @@ class ThresholdAdjuster:
                     return None
             return None
 
-    def adjust_threshold(self, user_input, current_thresholds, max_retries=3):
-        cleaned_input = self.preprocess_input(user_input)
-        parsed_exercise, parsed_feedback, parsed_adjustment = self.parse_user_input(cleaned_input)
+    def adjustment_step(self, current_value):
+        return min(ADJUSTMENT_STEP, max(1, round(abs(current_value) * 0.2)))
+
+    def is_valid_threshold(self, value):
+        # Thresholds are joint angles in degrees
+        return not isinstance(value, bool) and isinstance(value, (int, float)) and 0 < value <= 180
+
+    def tokenize(self, text):
+        return re.findall(r"[a-z]+", text.lower().replace("'", ''))
+
+    def unclear_direction(self, tokens):
+        # "make curl elbow less strict", "I don't want more squat too deep warnings": the direction
+        # word does not say which way the threshold should move
+        if STRICTNESS_WORDS & set(tokens):
+            return True
+        direction_words = INCREASE_WORDS | DECREASE_WORDS | VAGUE_DIRECTION_WORDS
+        first = next((i for i, token in enumerate(tokens) if token in direction_words), None)
+        return first is not None and bool(NEGATION_WORDS & set(tokens[:first]))
+
+    def resolve_locally(self, user_input, current_thresholds):
+        # A clear request names the exercise (or a condition only one exercise has), one
+        # feedback condition and a direction or a number. Anything less confident returns None
+        # and is left to the model.
+        text = self.preprocess_input(user_input.replace('_', ' '))  # Threshold keys typed as-is
+        tokens = self.tokenize(text)
+        words = set(tokens)
+        if self.unclear_direction(tokens):
+            return None
+
+        exercises = {ex for ex, synonyms in self.exercise_mapping.items()
+                     if any(re.search(rf"\b{re.escape(synonym)}\b", text) for synonym in synonyms)}
+        if len(exercises) > 1:
+            return None
+
+        # The condition with the longest phrase found word for word in the request
+        matches = {}
+        for condition, phrases in self.feedback_mapping.items():
+            if exercises and not condition.startswith(next(iter(exercises))):
+                continue
+            exercise = next(ex for ex in self.exercise_mapping if condition.startswith(ex))
+            for phrase in phrases + [condition[len(exercise) + 1:].replace('_', ' ')]:
+                if re.search(rf"\b{re.escape(phrase)}\b", text):
+                    matches[condition] = max(matches.get(condition, 0), len(phrase))
+        if not matches:
+            return None
+        longest = max(matches.values())
+        conditions = [condition for condition, length in matches.items() if length == longest]
+        if len(conditions) != 1 or conditions[0] not in current_thresholds:
+            return None
+        condition = conditions[0]
+        current_value = current_thresholds[condition]
 
+        numbers = re.findall(r"\d+(?:\.\d+)?", text)
+        increase, decrease = bool(words & INCREASE_WORDS), bool(words & DECREASE_WORDS)
+        if len(numbers) == 1:
+            value = float(numbers[0])
+            value = int(value) if value.is_integer() else value
+            if 'by' in words and increase != decrease:
+                # "increase squat depth by 5": relative
+                new_threshold = current_value + value if increase else current_value - value
+            elif increase == decrease or 'to' in words:
+                # "set squat too deep to 70": absolute
+                new_threshold = value
+            else:
+                return None
+        elif len(numbers) == 0 and increase != decrease:
+            step = self.adjustment_step(current_value)
+            new_threshold = current_value + step if increase else current_value - step
+        else:
+            return None
+        if not self.is_valid_threshold(new_threshold):
+            return None
+        return {'feedback_condition': condition, 'new_threshold': new_threshold, 'source': 'local'}
+
+    def validate_result(self, result, current_thresholds):
+        # The model's JSON as {'feedback_condition', 'new_threshold'}, or None if it is unusable
+        if not isinstance(result, dict) or result.get('feedback_condition') not in current_thresholds:
+            return None
+        condition = result['feedback_condition']
+        new_threshold = result.get('new_threshold')
+        if isinstance(new_threshold, bool) or not isinstance(new_threshold, (int, float)):
+            if result.get('adjustment') not in ('increase', 'decrease'):
+                return None
+            step = self.adjustment_step(current_thresholds[condition])
+            new_threshold = current_thresholds[condition] + (step if result['adjustment'] == 'increase' else -step)
+        if not self.is_valid_threshold(new_threshold):
+            return None
+        return {'feedback_condition': condition, 'new_threshold': new_threshold, 'source': 'model'}
+
+    def adjust_threshold(self, user_input, current_thresholds):
+        # {'feedback_condition', 'new_threshold', 'source'} or None. Clear requests are resolved
+        # here without a network call; the rest take one JSON-constrained model call.
+        result = self.resolve_locally(user_input, current_thresholds)
+        if result is not None:
+            self.logger.info(f"Resolved threshold request locally: {result}")
+            return result
+
+        cleaned_input = self.preprocess_input(user_input)
         prompt = self.generate_prompt(cleaned_input, current_thresholds)
+        try:
+            response_text = cached_generate(
+                self.model, prompt, validate=lambda text: self.validate_result(
+                    self.extract_json_from_response(text), current_thresholds) is not None,
+                generation_config={'response_mime_type': 'application/json', 'temperature': 0})
+            self.logger.info(f"API Response: {response_text}")
+            result = self.validate_result(self.extract_json_from_response(response_text), current_thresholds)
+            if result is not None:
+                return result
+            self.logger.error("Unusable threshold response from the model")
+        except Exception as e:
+            self.logger.error(f"Error in adjust_threshold: {str(e)}")
+
+        # Best guess from the fuzzy parse, only when it found both a condition and a direction
+        _, feedback_condition, adjustment = self.parse_user_input(cleaned_input)
+        unclear = self.unclear_direction(self.tokenize(cleaned_input))
+        if feedback_condition in current_thresholds and adjustment and not unclear:
+            self.logger.warning("Making best guess based on parsed input")
+            current_value = current_thresholds[feedback_condition]
+            step = self.adjustment_step(current_value)
+            new_threshold = current_value + step if adjustment == 'increase' else current_value - step
+            if self.is_valid_threshold(new_threshold):
+                return {'feedback_condition': feedback_condition, 'new_threshold': new_threshold, 'source': 'guess'}
+        return None
+
+
+if __name__ == "__main__":
+    import os
+    from threshold_store import DEFAULT_THRESHOLDS
 
-        for attempt in range(max_retries):
-            try:
-                response = self.model.generate_content(prompt)
-                self.logger.info(f"API Response: {response.text}")
-
-                result = self.extract_json_from_response(response.text)
-                
-                if result is None:
-                    raise ValueError("Failed to extract JSON from the response")
-
-                new_threshold = result.get("new_threshold")
-                if new_threshold is None:
-                    raise ValueError("No new threshold provided in the response")
-
-                return new_threshold, "", 1  # Returning empty string for explanation and 1 for confidence
-
-            except Exception as e:
-                self.logger.error(f"Error on attempt {attempt + 1}: {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(1)
-                else:
-                    # On final attempt, make a best guess based on parsed input
-                    self.logger.warning("Making best guess based on parsed input")
-                    exercise = parsed_exercise or "squat"  # Default to squat if not parsed
-                    feedback_condition = parsed_feedback or next(iter(self.feedback_mapping))  # Use first feedback condition if not parsed
-                    adjustment = parsed_adjustment or "increase"  # Default to increase if not parsed
-                    current_value = current_thresholds.get(f"{exercise}_{feedback_condition}", 90)  # Default to 90 if not found
-                    new_threshold = current_value + 5 if adjustment == "increase" else current_value - 5
-                    return new_threshold, "", 1  # Returning empty string for explanation and 1 for confidence
-
-        return None, "Failed to process the request. Please try again with different wording.", 1  # Returning 1 for confidence
\ No newline at end of file
+    # Checks for the local resolver: None means the request is left to the model
+    LOCAL_CHECKS = [
+        ("increase squat too deep", ('squat_too_deep', 73)),
+        ("set squat_not_deep_enough to 95", ('squat_not_deep_enough', 95)),
+        ("lower the curl elbow movement threshold by 2", ('bicep_curl_elbow_movement', 3)),
+        ("make curl elbow less strict", None),
+        ("make the squat too deep warning more lenient", None),
+        ("squat too deep is less sensitive than I want", None),
+        ("I don't want more squat too deep warnings", None),
+        ("don't lower the squat too deep threshold", None),
+        ("loosen the squat too deep threshold", None),
+        ("more squat too deep", None),
+    ]
+    adjuster = ThresholdAdjuster(os.environ.get('GEMINI_API_KEY', ''))
+    failures = 0
+    for request, expected in LOCAL_CHECKS:
+        result = adjuster.resolve_locally(request, DEFAULT_THRESHOLDS)
+        actual = result and (result['feedback_condition'], result['new_threshold'])
+        if actual != expected:
+            failures += 1
+            print(f"FAIL {request!r}: expected {expected}, got {actual}")
+    print(f"{len(LOCAL_CHECKS) - failures}/{len(LOCAL_CHECKS)} local resolution checks passed")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import re
+import threading
+from collections.abc import Mapping
+from types import MappingProxyType
+
+DEFAULT_THRESHOLDS = {
+    'squat_too_deep': 68,
+    'squat_not_deep_enough': 91,
+    'squat_forward_bend_too_little': 19,
+    'squat_forward_bend_too_much': 50,
+    'bicep_curl_not_low_enough': 160,
+    'bicep_curl_not_high_enough': 90,
+    'bicep_curl_elbow_movement': 5,
+    'bicep_curl_body_swing': 10
+}
+
+PROFILE_DIR = "threshold_profiles"
+
+
+def profile_path(user, profile_dir=PROFILE_DIR):
+    # Per-user threshold profiles use the same format as thresholds.json
+    return os.path.join(profile_dir, re.sub(r'[^\w-]', '_', user) + ".json")
+
+
+class ThresholdSnapshot(Mapping):
+    # Read-only view of one threshold version; never mutated after creation
+    __slots__ = ('_values', '_version')
+
+    def __init__(self, values, version=0):
+        self._values = MappingProxyType(dict(values))
+        self._version = version
+
+    @property
+    def version(self):
+        return self._version
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return f"ThresholdSnapshot(version={self._version}, values={dict(self._values)})"
+
+    def as_dict(self):
+        return dict(self._values)
+
+    def replace(self, changes):
+        values = dict(self._values)
+        values.update(changes)
+        return ThresholdSnapshot(values, self._version + 1)
+
+
+class ThresholdStore:
+    # Workers read `current` once per frame without locking; writers build a new
+    # snapshot under a lock and swap the reference in a single assignment
+    def __init__(self, values=None):
+        self._write_lock = threading.Lock()
+        self._snapshot = ThresholdSnapshot(values if values is not None else DEFAULT_THRESHOLDS)
+
+    @property
+    def current(self):
+        return self._snapshot
+
+    def update(self, changes):
+        with self._write_lock:
+            snapshot = self._snapshot
+            changes = {key: value for key, value in changes.items()
+                       if key in snapshot and snapshot[key] != value}
+            if changes:
+                snapshot = snapshot.replace(changes)
+                self._snapshot = snapshot
+            return snapshot
+
+    def load(self, path):
+        try:
+            with open(path, 'r') as f:
+                loaded = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error loading thresholds from {path}: {e}")
+            return self._snapshot
+
+        changes = {}
+        for key, value in loaded.items():
+            if key not in self._snapshot:
+                logging.warning(f"Ignoring unknown threshold key '{key}' in {path}")
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                logging.warning(f"Ignoring non-numeric threshold '{key}': {value!r}")
+                continue
+            changes[key] = value
+        return self.update(changes)
+
+    def save(self, path):
+        # Write to a temporary file and rename so a watcher never sees a partial file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._snapshot.as_dict(), f)
+        os.replace(tmp_path, path)
+
+
+class ThresholdFileWatcher(threading.Thread):
+    def __init__(self, store, path, interval=1.0):
+        super().__init__(daemon=True)
+        self.store = store
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._last_mtime = self._get_mtime()
+
+    def _get_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            mtime = self._get_mtime()
+            if mtime is None or mtime == self._last_mtime:
+                continue
+            self._last_mtime = mtime
+            previous_version = self.store.current.version
+            snapshot = self.store.load(self.path)
+            if snapshot.version != previous_version:
+                logging.info(f"Reloaded thresholds from {self.path} (version {snapshot.version})")
+
+    def stop(self):
+        self._stop_event.set()
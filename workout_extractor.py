@@ -3,6 +3,32 @@ from typing import List, Dict, Union
 import re
 import logging
 import json
+from llm_cache import cached_generate
+
+# Response schema for a plan in the format parse_json_plan reads, for JSON-mode generation calls
+WORKOUT_PLAN_SCHEMA = {
+    'type': 'ARRAY',
+    'items': {
+        'type': 'OBJECT',
+        'properties': {
+            'day': {'type': 'STRING'},
+            'exercises': {
+                'type': 'ARRAY',
+                'items': {
+                    'type': 'OBJECT',
+                    'properties': {
+                        'name': {'type': 'STRING'},
+                        'sets': {'type': 'INTEGER'},
+                        'reps': {'type': 'INTEGER'},
+                        'is_timed': {'type': 'BOOLEAN'},
+                    },
+                    'required': ['name', 'sets', 'reps', 'is_timed'],
+                },
+            },
+        },
+        'required': ['day', 'exercises'],
+    },
+}
 
 class WorkoutExtractor:
     def __init__(self, api_key: str):
@@ -63,38 +89,62 @@ class WorkoutExtractor:
         """
 
         try:
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip('```json').strip('```').strip()
-            
+            response_text = cached_generate(self.model, prompt,
+                                            validate=lambda text: self.parse_json_plan(text) is not None)
             logging.info(f"Raw AI response:\n{response_text}")
 
-            try:
-                workout_plan = json.loads(response_text)
-                if isinstance(workout_plan, list):
-                    return workout_plan
-            except json.JSONDecodeError as e:
-                logging.error(f"Failed to parse JSON: {str(e)}")
-                return self.clean_and_structure_response(response_text)
+            workout_plan = self.parse_json_plan(response_text)
+            if workout_plan is not None:
+                return workout_plan
+            logging.error("Failed to parse JSON workout plan")
+            return self.clean_and_structure_response(response_text)
 
         except Exception as e:
             logging.error(f"Error in extract_workout_plan: {str(e)}")
             return self.clean_and_structure_response(ai_response)
 
-    def clean_and_structure_response(self, response_text: str) -> List[Dict[str, Union[str, List[Dict[str, Union[str, int, bool]]]]]]:
+    def parse_json_plan(self, response_text: str):
+        # The plan if response_text is a JSON array of days with exercises, else None
+        try:
+            workout_plan = json.loads(response_text.strip().strip('```json').strip('```').strip())
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(workout_plan, list) or not workout_plan:
+            return None
+        for day in workout_plan:
+            if not isinstance(day, dict) or not isinstance(day.get("exercises"), list) or "day" not in day:
+                return None
+            for exercise in day["exercises"]:
+                if not isinstance(exercise, dict) or not all(key in exercise for key in ("name", "sets", "reps")):
+                    return None
+                exercise.setdefault("is_timed", False)
+        return workout_plan
+
+    def parse_workout_plan(self, response_text: str) -> List[Dict[str, Union[str, List[Dict[str, Union[str, int, bool]]]]]]:
+        # The plan from a model answer without another model call: JSON first, then the
+        # "Day N: Exercise: 3 x 10" text format. Empty if neither works.
+        if not isinstance(response_text, str):
+            return []
+        workout_plan = self.parse_json_plan(response_text)
+        if workout_plan is not None:
+            return workout_plan
+        return self.clean_and_structure_response(response_text, use_default=False)
+
+    def clean_and_structure_response(self, response_text: str, use_default=True) -> List[Dict[str, Union[str, List[Dict[str, Union[str, int, bool]]]]]]:
         if not isinstance(response_text, str):
             logging.error(f"Invalid response_text type: {type(response_text)}")
-            return self.generate_default_plan()
+            return self.generate_default_plan() if use_default else []
 
         workout_plan = []
         days = re.findall(r'Day \d+:(.*?)(?=Day \d+:|$)', response_text, re.DOTALL)
 
         if not days:
             logging.warning("No day patterns found in the response")
-            return self.generate_default_plan()
+            return self.generate_default_plan() if use_default else []
 
         for i, day_content in enumerate(days, 1):
             exercises = []
-            exercise_matches = re.findall(r'([\w\s]+):\s*(\d+(?:\s*x\s*\d+)?)\s*((?:reps|seconds))', day_content, re.IGNORECASE)
+            exercise_matches = re.findall(r'([\w\s]+):[ \t]*(\d+(?:\s*x\s*\d+)?)[ \t]*((?:reps|seconds)?)', day_content, re.IGNORECASE)
             
             for exercise_name, reps_or_duration, unit in exercise_matches:
                 exercise = {
@@ -117,9 +167,9 @@ class WorkoutExtractor:
                 "exercises": exercises
             })
 
-        if not workout_plan:
+        if not any(day["exercises"] for day in workout_plan):
             logging.warning("Failed to extract exercises from the response")
-            return self.generate_default_plan()
+            return self.generate_default_plan() if use_default else []
 
         return workout_plan
 
@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime
+
+# Append-only journal for writes the database could not take, e.g. while the MySQL server is
+# down. The background writer appends them here in submit order and replays them, still in
+# order, once the database is back; entries survive a restart of the application.
+#
+#   write_journal.jsonl            one {"seq", "method", "args"} object per line, only appended to
+#   write_journal.jsonl.replayed   seq of the last entry written to the database
+#
+# Both files are removed once everything has been replayed.
+
+JOURNAL_PATH = os.environ.get('WORKOUT_JOURNAL_PATH', 'write_journal.jsonl')
+
+
+def _encode(value):
+    # Write arguments are plain values plus dates and times
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if '__datetime__' in value:
+            return datetime.fromisoformat(value['__datetime__'])
+        if '__date__' in value:
+            return date.fromisoformat(value['__date__'])
+    return value
+
+
+class WriteJournal:
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self.progress_path = f"{path}.replayed"
+        self._lock = threading.Lock()
+        self._entries = self._load()  # (seq, method, args) not yet replayed, oldest first
+        self._next_seq = self._entries[-1][0] + 1 if self._entries else self._replayed_seq() + 1
+
+    def _replayed_seq(self):
+        try:
+            with open(self.progress_path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return []
+        replayed = self._replayed_seq()
+        entries = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Only the last line can be cut short, by a crash while appending
+                    logging.warning(f"Skipping unreadable line {line_number} of {self.path}")
+                    continue
+                if record['seq'] > replayed:
+                    entries.append((record['seq'], record['method'], [_decode(arg) for arg in record['args']]))
+        if entries:
+            logging.info(f"{len(entries)} journaled writes waiting to be replayed")
+        return entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def append(self, writes):
+        # writes: (method, args) pairs; returns their sequence numbers once they are on disk
+        with self._lock:
+            records = []
+            for method, args in writes:
+                records.append((self._next_seq, method, list(args)))
+                self._next_seq += 1
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for seq, method, args in records:
+                    f.write(json.dumps({'seq': seq, 'method': method, 'args': [_encode(arg) for arg in args]},
+                                       ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._entries.extend(records)
+            return [seq for seq, _, _ in records]
+
+    def pending(self):
+        with self._lock:
+            return list(self._entries)
+
+    def mark_replayed(self, seq):
+        # Everything up to and including seq is in the database
+        with self._lock:
+            self._entries = [entry for entry in self._entries if entry[0] > seq]
+            if not self._entries:
+                for path in (self.path, self.progress_path):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                return
+            temp_path = f"{self.progress_path}.tmp"
+            with open(temp_path, 'w') as f:
+                f.write(str(seq))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.progress_path)